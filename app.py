@@ -1,78 +1,353 @@
 import os
+import argparse
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import requests
 import json
 import re # Import modul re untuk ekspresi reguler
+import threading
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from deadline import Deadline, DeadlineExceeded
+from http_client import ServiceClient, CircuitBreaker, CircuitOpenError
+from ttl_cache import TTLLRUCache
+from response_cache import ResponseCache
+from conversation_store import ConversationStore
+from product_matcher import ProductMatcher
+from stub_backends import StubGeminiModel
+from serving import init_health_endpoints, add_production_arguments, run_production
+from telemetry import get_logger, init_flask_app, request_id_headers, set_request_id, get_request_id, span, observe_stage, observe_gemini_tokens
 
 # Mengubah import LangChain ke import Google Generative AI nativ
 import google.generativeai as genai 
 
 app = Flask(__name__)
-CORS(app)
+# Header X-Session-ID perlu diekspos agar frontend (origin lain) bisa membacanya
+CORS(app, expose_headers=["X-Session-ID"])
+# Request ID, metrik per endpoint dan GET /metrics
+init_flask_app(app)
+# GET /healthz dan GET /readyz (siap setelah katalog produk dimuat)
+init_health_endpoints(app, {"product_matcher": lambda: get_product_matcher() is not None})
+logger = get_logger("backend")
 
 # --- 0. Konfigurasi Lingkungan ---
 load_dotenv()
 
+# "gemini" (default) atau "stub" untuk model pengganti lokal tanpa API key (lihat stub_backends.py)
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "gemini").lower()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
+if not GEMINI_API_KEY and GEMINI_BACKEND != "stub":
     raise ValueError("GEMINI_API_KEY not found in environment variables. Please set it in your .env file.")
 
 RAG_SERVER_URL = os.getenv("RAG_SERVER_URL", "http://127.0.0.1:5001/rag_query")
+# Endpoint batch untuk pertanyaan yang menyebut beberapa produk sekaligus
+RAG_BATCH_SERVER_URL = os.getenv("RAG_BATCH_SERVER_URL", RAG_SERVER_URL.rsplit("/", 1)[0] + "/rag_query_batch")
 TELEGRAM_NOTIFICATION_SERVER_URL = os.getenv("TELEGRAM_NOTIFICATION_SERVER_URL", "http://127.00.0.1:5002/send_notification")
 
+# Batas waktu total (detik) untuk memproses satu pesan chat (RAG + Gemini + Telegram).
+# Sisa waktunya diteruskan ke setiap MCP Server agar backend yang lambat gagal cepat.
+CHAT_REQUEST_BUDGET = float(os.getenv("CHAT_REQUEST_BUDGET", "20"))
+# Timeout maksimum per panggilan ke masing-masing MCP Server (detik)
+RAG_TIMEOUT = float(os.getenv("RAG_TIMEOUT", "10"))
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "10"))
+
+# --- Klien HTTP ke MCP Server (lihat http_client.py) ---
+# Timeout membuka koneksi (detik): server yang mati ketahuan dalam waktu ini, bukan setelah RAG_TIMEOUT
+RAG_CONNECT_TIMEOUT = float(os.getenv("RAG_CONNECT_TIMEOUT", "1"))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "1"))
+# Jumlah maksimum koneksi keep-alive per MCP Server (per proses)
+MCP_HTTP_POOL_SIZE = int(os.getenv("MCP_HTTP_POOL_SIZE", "32"))
+# Percobaan ulang lookup RAG (idempoten) saat gagal koneksi atau HTTP 502/503/504
+RAG_RETRIES = int(os.getenv("RAG_RETRIES", "2"))
+# Circuit breaker: setelah sekian kegagalan berturut-turut, panggilan langsung ditolak
+# selama *_BREAKER_RESET detik (0 = nonaktif)
+RAG_BREAKER_FAILURES = int(os.getenv("RAG_BREAKER_FAILURES", "5"))
+RAG_BREAKER_RESET = float(os.getenv("RAG_BREAKER_RESET", "10"))
+TELEGRAM_BREAKER_FAILURES = int(os.getenv("TELEGRAM_BREAKER_FAILURES", "5"))
+TELEGRAM_BREAKER_RESET = float(os.getenv("TELEGRAM_BREAKER_RESET", "10"))
+
+# Endpoint katalog produk di MCP Server RAG (untuk pencocok produk) dan interval pengecekan perubahannya (detik)
+RAG_CATALOG_URL = os.getenv("RAG_CATALOG_URL", RAG_SERVER_URL.rsplit("/", 1)[0] + "/catalog")
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "30"))
+
+# --- Cache hasil RAG ---
+# Jumlah maksimum entri (pasangan produk + tipe) yang disimpan
+RAG_CACHE_MAX_ENTRIES = int(os.getenv("RAG_CACHE_MAX_ENTRIES", "1024"))
+# TTL per tipe (detik): stok cepat berubah, harga dan detail jarang berubah
+RAG_CACHE_TTL = {
+    "stok": float(os.getenv("RAG_CACHE_TTL_STOK", "10")),
+    "harga": float(os.getenv("RAG_CACHE_TTL_HARGA", "300")),
+    "detail": float(os.getenv("RAG_CACHE_TTL_DETAIL", "3600")),
+}
+# TTL untuk hasil "tidak ditemukan" (negative cache)
+RAG_CACHE_NEGATIVE_TTL = float(os.getenv("RAG_CACHE_NEGATIVE_TTL", "10"))
+
+# --- Cache jawaban Gemini ---
+# Key: (pertanyaan ternormalisasi, konteks RAG, peran LLM). Karena konteks RAG
+# termasuk di key, jawaban otomatis tidak dipakai lagi setelah data produk berubah.
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Ambang kemiripan (0-1) untuk memakai jawaban dari pertanyaan yang mirip; 0 = hanya cocok persis
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+# --- Sesi percakapan (lihat conversation_store.py) ---
+SESSION_HEADER = "X-Session-ID"
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+# Sesi yang tidak aktif selama ini (detik) dibuang
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+# Perkiraan token maksimum riwayat percakapan yang ikut ke prompt
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "800"))
+
+# --- Pemilihan tool MCP ---
+# "keywords" (default): router kata kunci (determine_and_fetch_rag_context + TELEGRAM_KEYWORDS),
+#   satu panggilan Gemini per pesan.
+# "function_calling": Gemini memilih sendiri tool RAG/Telegram lewat function calling
+#   (minimal dua panggilan Gemini berurutan untuk pertanyaan produk).
+CHAT_TOOL_ROUTING = os.getenv("CHAT_TOOL_ROUTING", "keywords").lower()
+# Jumlah maksimum putaran panggilan tool per pesan; setelah itu Gemini dipaksa menjawab
+GEMINI_MAX_TOOL_ITERATIONS = int(os.getenv("GEMINI_MAX_TOOL_ITERATIONS", "3"))
+# Jumlah thread untuk menjalankan panggilan tool independen secara paralel
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "16"))
+
 # --- 1. Inisialisasi LLM (Gemini) ---
 # Menggunakan inisialisasi model Gemini nativ
-genai.configure(api_key=GEMINI_API_KEY)
-gemini_model = genai.GenerativeModel('gemini-2.0-flash')
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.0-flash")
+if GEMINI_BACKEND == "stub":
+    logger.warning("GEMINI_BACKEND=stub: jawaban dibuat oleh model pengganti lokal, bukan Gemini.")
+else:
+    genai.configure(api_key=GEMINI_API_KEY)
+
+# Instruksi tetap dikirim sebagai system instruction model, bukan di setiap prompt;
+# satu objek model per system instruction (lihat get_gemini_model)
+_gemini_models = {}
+
+def get_gemini_model(system_instruction: str):
+    """Model Gemini dengan system instruction ini, dibuat sekali lalu dipakai ulang."""
+    model = _gemini_models.get(system_instruction)
+    if model is None:
+        if GEMINI_BACKEND == "stub":
+            model = StubGeminiModel.from_env(tool_planner=stub_tool_planner, system_instruction=system_instruction)
+        else:
+            model = genai.GenerativeModel(GEMINI_MODEL_NAME, system_instruction=system_instruction)
+        _gemini_models[system_instruction] = model
+    return model
+
+def gemini_usage(response) -> tuple[int, int] | None:
+    """(token input, token output) dari usage_metadata respons/potongan Gemini, atau None jika belum ada."""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage or not usage.prompt_token_count:
+        return None
+    return usage.prompt_token_count, usage.candidates_token_count
+
+def record_gemini_usage(usage: tuple[int, int] | None):
+    if usage is None:
+        return
+    observe_gemini_tokens(*usage)
+    logger.info("Token Gemini: input %d, output %d.", *usage)
+
+# Satu session HTTP (pool keep-alive) per MCP Server, dipakai bersama oleh semua thread request
+rag_client = ServiceClient(
+    "rag", RAG_CONNECT_TIMEOUT, RAG_TIMEOUT, pool_size=MCP_HTTP_POOL_SIZE, retries=RAG_RETRIES,
+    breaker=CircuitBreaker("rag", RAG_BREAKER_FAILURES, RAG_BREAKER_RESET),
+)
+telegram_client = ServiceClient(
+    "telegram", TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_TIMEOUT, pool_size=MCP_HTTP_POOL_SIZE,
+    breaker=CircuitBreaker("telegram", TELEGRAM_BREAKER_FAILURES, TELEGRAM_BREAKER_RESET),
+)
+
+# Cache LRU + TTL untuk hasil RAG, key: (nama produk ternormalisasi, tipe)
+rag_cache = TTLLRUCache(RAG_CACHE_MAX_ENTRIES, default_ttl=min(RAG_CACHE_TTL.values()))
+# Cache jawaban Gemini (lihat response_cache.py)
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, similarity_threshold=RESPONSE_CACHE_SIMILARITY)
+# Riwayat percakapan dan produk terakhir per sesi
+conversation_store = ConversationStore(SESSION_MAX_ENTRIES, SESSION_TTL, SESSION_HISTORY_TOKENS)
+# Versi katalog terakhir yang dilaporkan MCP Server RAG. Jika berubah, isi cache dibuang.
+rag_catalog_version = None
+
+# Pesan "tidak ditemukan" dari backend ini dan dari MCP Server RAG
+RAG_NO_DATA_MESSAGES = ("Tidak ada data relevan ditemukan.", "Tidak ada data relevan dari database.")
+
+def _rag_cache_key(rag_query: str, rag_tipe: str) -> tuple[str, str]:
+    return " ".join(rag_query.lower().split()), rag_tipe
+
+# Pencocok produk dari katalog MCP Server RAG. None selama katalog belum berhasil dimuat.
+product_matcher: ProductMatcher | None = None
+_catalog_next_check = 0.0
+_catalog_refresh_lock = threading.Lock()
+
+def refresh_product_matcher() -> bool:
+    """
+    Memuat katalog produk dari MCP Server RAG dan membangun ulang pencocok produk.
+    Versi katalog dikirim sebagai If-None-Match, sehingga katalog yang tidak berubah
+    tidak diunduh ulang. Mengembalikan True jika pencocok dibangun ulang.
+    """
+    global product_matcher
+    headers = {}
+    if product_matcher is not None:
+        headers["If-None-Match"] = f'"{product_matcher.version}"'
+    response = rag_client.get(RAG_CATALOG_URL, headers=headers)
+    if response.status_code == 304:
+        return False
+    catalog = response.json()
+    product_matcher = ProductMatcher(catalog["products"], version=catalog["names_version"])
+    logger.info("Pencocok produk dimuat: %d produk (versi nama produk %s).", product_matcher.size, product_matcher.version)
+    return True
 
-# Variabel global untuk menyimpan data RAG yang terakhir diambil
-# Ini akan digunakan untuk mengirim ke Telegram jika diminta
-rag_data_for_telegram = "" 
+def _refresh_product_matcher_in_background():
+    # Hanya satu refresh yang berjalan dalam satu waktu
+    if not _catalog_refresh_lock.acquire(blocking=False):
+        return
+
+    def run():
+        global _catalog_next_check
+        try:
+            refresh_product_matcher()
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            logger.warning("Gagal memuat katalog produk dari server RAG: %s", e)
+        finally:
+            _catalog_next_check = time.monotonic() + CATALOG_REFRESH_INTERVAL
+            _catalog_refresh_lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+
+def get_product_matcher() -> ProductMatcher | None:
+    """
+    Pencocok produk saat ini. Pengecekan perubahan katalog dijalankan di latar
+    belakang setiap CATALOG_REFRESH_INTERVAL detik atau saat versi nama produk berubah,
+    sehingga tidak pernah menahan request chat.
+    """
+    if time.monotonic() >= _catalog_next_check:
+        _refresh_product_matcher_in_background()
+    return product_matcher
+
+def _observe_catalog_version(version, names_version=None):
+    """
+    Membuang seluruh cache RAG jika versi katalog di MCP Server RAG berubah.
+    Pencocok produk hanya dimuat ulang jika versi nama produk berubah.
+    """
+    global rag_catalog_version, _catalog_next_check
+    if product_matcher is not None and names_version is not None and names_version != product_matcher.version:
+        _catalog_next_check = 0.0
+    if version is None or version == rag_catalog_version:
+        return
+    if rag_catalog_version is not None:
+        removed = rag_cache.invalidate()
+        # Jawaban lama tidak akan cocok lagi (konteksnya berubah); bebaskan memorinya
+        response_cache.invalidate()
+        logger.info("Versi katalog berubah (%s -> %s), %d entri cache RAG dibuang.", rag_catalog_version, version, removed)
+    rag_catalog_version = version
 
 # --- 2. Definisi Tools/Services Eksternal (Simulasi MCP Server) ---
 
-def fetch_external_data_from_rag(rag_query: str, rag_tipe: str) -> str:
+def _store_rag_response(cache_key: tuple[str, str], response_json: dict) -> str:
+    """
+    Mengambil data dari respons JSON MCP Server RAG dan menyimpannya ke cache
+    (TTL sesuai tipe, atau TTL pendek jika produk tidak ditemukan).
+    """
+    rag_data = response_json.get("data", "Tidak ada data relevan ditemukan.")
+    _observe_catalog_version(response_json.get("version"), response_json.get("names_version"))
+
+    if rag_data in RAG_NO_DATA_MESSAGES:
+        logger.debug("Tidak ada data relevan ditemukan di RAG.")
+        rag_cache.set(cache_key, rag_data, ttl=RAG_CACHE_NEGATIVE_TTL)
+        return rag_data
+
+    logger.debug("Data RAG yang diterima: %s", rag_data)
+    rag_cache.set(cache_key, rag_data, ttl=RAG_CACHE_TTL.get(cache_key[1]))
+    return rag_data
+
+def fetch_external_data_from_rag(rag_query: str, rag_tipe: str, deadline: Deadline | None = None) -> str:
     """
     Memanggil MCP Server RAG untuk mendapatkan data eksternal dari database.
     rag_query: Nama produk atau istilah pencarian yang relevan untuk database.
     rag_tipe: Tipe informasi yang diminta ('harga', 'stok', 'detail').
+    deadline: Batas waktu request chat; timeout panggilan memakai sisa waktunya.
     """
-    global rag_data_for_telegram # Deklarasikan penggunaan variabel global
-    print(f"DEBUG (Backend): Meminta data RAG untuk query: '{rag_query}' dengan tipe: '{rag_tipe}'")
+    logger.debug("Meminta data RAG untuk query: '%s' dengan tipe: '%s'", rag_query, rag_tipe)
+
+    cache_key = _rag_cache_key(rag_query, rag_tipe)
+    cached_data = rag_cache.get(cache_key)
+    if cached_data is not None:
+        logger.debug("Data RAG dari cache: %s", cached_data)
+        return cached_data
+
     try:
-        response = requests.post(RAG_SERVER_URL, json={"query": rag_query, "tipe": rag_tipe}, timeout=10)
-        response.raise_for_status() 
-        rag_data = response.json().get("data", "Tidak ada data relevan ditemukan.")
-        
-        rag_data_for_telegram = rag_data 
+        with span("rag_http"):
+            response = rag_client.post(
+                RAG_SERVER_URL, deadline,
+                json={"query": rag_query, "tipe": rag_tipe},
+                headers=request_id_headers(),
+            )
+        return _store_rag_response(cache_key, response.json())
+    except (DeadlineExceeded, requests.exceptions.RequestException) as e:
+        return _rag_error_message(e)
 
-        if rag_data == "Tidak ada data relevan ditemukan.":
-            print("DEBUG (Backend): Tidak ada data relevan ditemukan di RAG.")
-            return rag_data
-        
-        print(f"DEBUG (Backend): Data RAG yang diterima: {rag_data}")
-        return rag_data
-    except requests.exceptions.ConnectionError:
-        rag_data_for_telegram = "Error: Tidak dapat terhubung ke server RAG." 
+def fetch_external_data_from_rag_batch(rag_queries: list[str], rag_tipe: str, deadline: Deadline | None = None) -> list[str]:
+    """
+    Mengambil data beberapa produk sekaligus dengan satu panggilan ke endpoint
+    batch MCP Server RAG. Produk yang sudah ada di cache tidak diminta ulang.
+    Mengembalikan data per produk sesuai urutan rag_queries.
+    """
+    logger.debug("Meminta data RAG batch untuk query: %s dengan tipe: '%s'", rag_queries, rag_tipe)
+
+    results = {rag_query: rag_cache.get(_rag_cache_key(rag_query, rag_tipe)) for rag_query in rag_queries}
+    missing_queries = [rag_query for rag_query, rag_data in results.items() if rag_data is None]
+    if missing_queries:
+        try:
+            with span("rag_http_batch"):
+                response = rag_client.post(
+                    RAG_BATCH_SERVER_URL, deadline,
+                    json={"items": [{"query": rag_query, "tipe": rag_tipe} for rag_query in missing_queries]},
+                    headers=request_id_headers(),
+                )
+            response_json = response.json()
+            for rag_query, item in zip(missing_queries, response_json["results"]):
+                results[rag_query] = _store_rag_response(
+                    _rag_cache_key(rag_query, rag_tipe),
+                    {**item, "version": response_json.get("version"), "names_version": response_json.get("names_version")},
+                )
+        except (DeadlineExceeded, requests.exceptions.RequestException) as e:
+            error_message = _rag_error_message(e)
+            for rag_query in missing_queries:
+                results[rag_query] = error_message
+
+    return [results[rag_query] for rag_query in rag_queries]
+
+def _rag_error_message(error: Exception) -> str:
+    """Pesan error (sebagai konteks untuk LLM) untuk kegagalan memanggil server RAG."""
+    if isinstance(error, DeadlineExceeded):
+        return f"Error: {error}"
+    if isinstance(error, CircuitOpenError):
+        return "Error: Server RAG sedang tidak tersedia. Silakan coba beberapa saat lagi."
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Error: Server RAG tidak merespons dalam batas waktu."
+    if isinstance(error, requests.exceptions.ConnectionError):
         return "Error: Tidak dapat terhubung ke server RAG. Pastikan MCP Server RAG berjalan."
-    except requests.exceptions.HTTPError as e:
-        rag_data_for_telegram = f"Error HTTP saat mengambil data RAG: {e.response.status_code} - {e.response.text}" 
-        return f"Error HTTP saat mengambil data RAG: {e.response.status_code} - {e.response.text}"
-    except requests.exceptions.RequestException as e:
-        rag_data_for_telegram = f"Error saat mengambil data RAG: {e}" 
-        return f"Error saat mengambil data RAG: {e}"
+    if isinstance(error, requests.exceptions.HTTPError):
+        return f"Error HTTP saat mengambil data RAG: {error.response.status_code} - {error.response.text}"
+    return f"Error saat mengambil data RAG: {error}"
 
-def send_telegram_notification(message: str) -> str:
+def send_telegram_notification(message: str, deadline: Deadline | None = None) -> str:
     """
     Memanggil MCP Server Notification Telegram untuk mengirim notifikasi.
     """
-    print(f"DEBUG (Backend): Mengirim notifikasi Telegram: '{message}'")
+    logger.debug("Mengirim notifikasi Telegram: '%s'", message)
     try:
-        response = requests.post(TELEGRAM_NOTIFICATION_SERVER_URL, json={"message": message}, timeout=10)
-        response.raise_for_status()
+        with span("telegram_http"):
+            response = telegram_client.post(
+                TELEGRAM_NOTIFICATION_SERVER_URL, deadline,
+                json={"message": message},
+                headers=request_id_headers(),
+            )
         return response.json().get("status", "Notifikasi berhasil dikirim.")
+    except DeadlineExceeded as e:
+        return f"Error: {e}"
+    except CircuitOpenError:
+        return "Error: Server notifikasi Telegram sedang tidak tersedia."
+    except requests.exceptions.Timeout:
+        return "Error: Server notifikasi Telegram tidak merespons dalam batas waktu."
     except requests.exceptions.ConnectionError:
         return "Error: Tidak dapat terhubung ke server notifikasi Telegram."
     except requests.exceptions.RequestException as e:
@@ -83,98 +358,161 @@ def send_telegram_notification(message: str) -> str:
 
 # --- 4. Membangun Chain (Tidak lagi menggunakan LangChain Runnables) ---
 
+# Kata kunci yang menandakan pengguna ingin data RAG diteruskan ke Telegram
+TELEGRAM_KEYWORDS = ["kirim telegram", "send telegram", "segeranotif", "telegram", "kirim notifikasi", "kirim ke"]
+
+# Kata kunci utama RAG dan tipe yang sesuai
+PRIMARY_RAG_KEYWORDS = {
+    "berapa sisa": "stok",
+    "berapa harga": "harga",
+    "harga": "harga",
+    "stok": "stok",
+    "jelaskan": "detail",
+    "apa itu": "detail",
+    "detail": "detail",
+    "nama produk": "detail", # Jika "nama produk" ditanyakan, biasanya untuk detail umum
+}
+
+def _keyword_pattern(keywords, suffix: str = "") -> re.Pattern:
+    """
+    Satu regex untuk semua kata kunci (frasa terpanjang lebih dulu), dikompilasi sekali.
+    Grup 1 berisi kata kunci tanpa suffix.
+    """
+    alternatives = "|".join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+    return re.compile(r'\b(' + alternatives + r')' + suffix + r'\b')
+
+_TELEGRAM_KEYWORDS_PATTERN = _keyword_pattern(TELEGRAM_KEYWORDS)
+# "harganya", "stoknya": akhiran -nya merujuk ke produk yang sedang dibahas
+_RAG_KEYWORDS_PATTERN = _keyword_pattern(PRIMARY_RAG_KEYWORDS, suffix=r"(?:nya)?")
+# Regex untuk mengekstrak nama produk (hanya dipakai jika katalog produk belum tersedia):
+# - ^([\w\s]+?) : Tangkap karakter kata dan spasi secara non-greedy dari awal string
+# - (?:[\s,.;!?'\"]|$) : Hentikan penangkapan jika bertemu spasi, koma, titik, dll., atau akhir string
+_PRODUCT_NAME_PATTERN = re.compile(r"^([\w\s]+?)(?:[\s,.;!?'\"]|$)")
+
+# Fungsi untuk mengekstrak nama produk dan tipe RAG dari pertanyaan pengguna
+# Mengembalikan tuple (daftar_nama_produk, rag_tipe_for_rag_server)
+def extract_rag_queries(user_question: str) -> tuple[list[str], str]:
+    """
+    Mengekstraksi semua nama produk yang disebut dan tipe informasi ('harga',
+    'stok', 'detail') dari pertanyaan pengguna dalam satu kali pemindaian.
+    Nama produk diambil dari pencocok katalog (nama kanonik produk). Jika tidak
+    ada produk yang disebut, daftarnya kosong; tipe 'general' berarti
+    pertanyaan juga tidak memuat kata kunci harga/stok/detail.
+    """
+    rag_queries, rag_tipe, _ = _extract_rag_intent(user_question)
+    return rag_queries, rag_tipe
+
+def _extract_rag_intent(user_question: str) -> tuple[list[str], str, bool]:
+    """Seperti extract_rag_queries, ditambah apakah tipe berasal dari kata kunci di pertanyaan."""
+    # Hapus kata kunci Telegram dari pertanyaan agar tidak mengganggu ekstraksi RAG
+    cleaned_query_lower = ' '.join(_TELEGRAM_KEYWORDS_PATTERN.sub(' ', user_question.lower()).split())
+
+    # Kata kunci RAG yang paling spesifik (terpanjang) menentukan tipe
+    keyword_match = max(_RAG_KEYWORDS_PATTERN.finditer(cleaned_query_lower), key=lambda m: len(m.group()), default=None)
+    rag_tipe_for_rag_server = PRIMARY_RAG_KEYWORDS[keyword_match.group(1)] if keyword_match else "detail"
+    has_keyword = keyword_match is not None
+
+    matcher = get_product_matcher()
+    if matcher is not None:
+        rag_queries = matcher.find_all(cleaned_query_lower)
+        if not rag_queries and not keyword_match:
+            return [], "general", False
+        # Nama produk tidak lengkap ("berapa harga laptop?") tidak dikenali pencocok katalog:
+        # kata setelah kata kunci dikirim ke MCP Server RAG, yang mencarinya dengan pencarian
+        # substring ter-ranking. Tidak untuk kata kunci ber-akhiran -nya ("berapa stoknya
+        # sekarang?"), yang merujuk ke produk sebelumnya di sesi (lihat resolve_rag_queries).
+        if not rag_queries and keyword_match.group() == keyword_match.group(1):
+            rag_queries = _heuristic_product_terms(cleaned_query_lower, keyword_match)
+        return rag_queries, rag_tipe_for_rag_server, has_keyword
+
+    # Katalog belum tersedia (misalnya MCP Server RAG belum bisa dihubungi):
+    # gunakan heuristik lama, yaitu kata setelah kata kunci RAG
+    rag_queries = _heuristic_product_terms(cleaned_query_lower, keyword_match)
+    if rag_queries:
+        return rag_queries, rag_tipe_for_rag_server, has_keyword
+    return [], "general", False
+
+def _heuristic_product_terms(cleaned_query_lower: str, keyword_match: re.Match | None) -> list[str]:
+    """Heuristik lama: kata setelah kata kunci RAG (atau di awal pertanyaan) sebagai istilah produk."""
+    remaining_query = cleaned_query_lower[keyword_match.end():].strip() if keyword_match else cleaned_query_lower
+    product_match = _PRODUCT_NAME_PATTERN.match(remaining_query)
+    if product_match and product_match.group(1).strip():
+        return [product_match.group(1).strip()]
+    return []
+
+def extract_rag_query(user_question: str) -> tuple[str, str]:
+    """
+    Seperti extract_rag_queries, tetapi hanya produk pertama yang disebut
+    (string kosong jika tidak ada).
+    """
+    rag_queries, rag_tipe = extract_rag_queries(user_question)
+    return (rag_queries[0] if rag_queries else ""), rag_tipe
+
+def resolve_rag_queries(user_question: str, session=None) -> tuple[list[str], str]:
+    """
+    extract_rag_queries dengan konteks sesi percakapan:
+    - pertanyaan lanjutan tanpa nama produk ("berapa stoknya?") memakai produk
+      yang terakhir dibahas di sesi ini,
+    - nama produk tanpa kata kunci ("kalau Smartphone Z?") memakai tipe
+      informasi yang terakhir ditanyakan.
+    Produk dan tipe yang dipakai dicatat sebagai memo sesi untuk giliran berikutnya.
+    """
+    rag_queries, rag_tipe, has_keyword = _extract_rag_intent(user_question)
+    if session is None:
+        return rag_queries, rag_tipe
+
+    last_products, last_tipe = conversation_store.last_products(session)
+    if not rag_queries and has_keyword and last_products:
+        rag_queries = list(last_products)
+    elif rag_queries and not has_keyword and last_tipe:
+        rag_tipe = last_tipe
+    if rag_queries:
+        conversation_store.remember_products(session, rag_queries, rag_tipe)
+    return rag_queries, rag_tipe
+
 # Fungsi untuk menentukan dan mengambil konteks RAG berdasarkan heuristik
-# Mengembalikan tuple (context_string, rag_tipe_for_rag_server)
-def determine_and_fetch_rag_context(input_dict: dict) -> tuple[str, str]:
+# Mengembalikan tuple (context_string, rag_tipe_for_rag_server, rag_data_for_telegram)
+def determine_and_fetch_rag_context(input_dict: dict, deadline: Deadline | None = None, session=None) -> tuple[str, str, str]:
     """
     Menentukan apakah query RAG diperlukan berdasarkan pertanyaan pengguna,
     mengekstraksi nama produk dan tipe, lalu mengambil data dari server RAG.
-    Mengembalikan tuple (context_string, rag_tipe_for_rag_server).
+    Mengembalikan tuple (context_string, rag_tipe_for_rag_server, rag_data_for_telegram).
+    rag_data_for_telegram adalah data RAG milik request ini yang diteruskan ke
+    Telegram jika diminta (string kosong jika tidak ada query RAG). Nilai ini
+    sengaja dikembalikan, bukan disimpan di variabel global, agar chat yang
+    berjalan bersamaan di thread/worker lain tidak saling menimpa datanya.
+    session: sesi percakapan (opsional) untuk pertanyaan lanjutan, lihat resolve_rag_queries.
     """
     try: 
         user_question = input_dict["question"]
-        query_lower = user_question.lower()
-
-        # Kata kunci untuk notifikasi Telegram
-        telegram_keywords = ["kirim telegram", "send telegram", "segeranotif", "telegram", "kirim notifikasi", "kirim ke"] 
-
-        # Hapus kata kunci Telegram dari pertanyaan agar tidak mengganggu ekstraksi RAG
-        cleaned_query_lower = query_lower
-        for keyword in telegram_keywords:
-            cleaned_query_lower = re.sub(r'\b' + re.escape(keyword) + r'\b', ' ', cleaned_query_lower).strip()
-        cleaned_query_lower = ' '.join(cleaned_query_lower.split()) # Hapus spasi ganda
-
-        # Nilai default untuk parameter server RAG
-        rag_query_for_rag_server = "" # Ini akan menjadi nama produk yang diekstrak
-        rag_tipe_for_rag_server = "detail" # Tipe default jika tidak ada kata kunci spesifik yang cocok
-
-        # Pembatas nama produk dalam kueri
-        product_name_delimiters = r"\b(?:dan|untuk|dengan|tentang|yang|di|pada|dari|ke|,|.|\?|'|$)\b" 
-
-        # Kata kunci utama RAG dan tipe yang sesuai
-        primary_rag_keywords = {
-            "berapa sisa": "stok",
-            "berapa harga": "harga",
-            "harga": "harga",
-            "stok": "stok",
-            "jelaskan": "detail",
-            "apa itu": "detail",
-            "detail": "detail",
-            "nama produk": "detail", # Jika "nama produk" ditanyakan, biasanya untuk detail umum
-        }
-
-        found_keyword_phrase = ""
-        
-        # Cari kata kunci RAG yang paling spesifik terlebih dahulu
-        for phrase, base_term in sorted(primary_rag_keywords.items(), key=lambda item: len(item[0]), reverse=True):
-            if re.search(r'\b' + re.escape(phrase) + r'\b', cleaned_query_lower):
-                rag_tipe_for_rag_server = base_term
-                found_keyword_phrase = phrase
-                break
-
-        if found_keyword_phrase:
-            keyword_match_obj = re.search(r'\b' + re.escape(found_keyword_phrase) + r'\b', cleaned_query_lower)
-            
-            if keyword_match_obj:
-                remaining_query_after_keyword = cleaned_query_lower[keyword_match_obj.end():].strip()
-                
-                # Regex untuk mengekstrak nama produk:
-                # - ^([\w\s]+?) : Tangkap karakter kata dan spasi secara non-greedy dari awal string
-                # - (?:[\s,.;!?'\"]|$) : Hentikan penangkapan jika bertemu spasi, koma, titik, dll., atau akhir string
-                product_match = re.match(r"^([\w\s]+?)(?:[\s,.;!?'\"]|$)", remaining_query_after_keyword)
-                
-                if product_match and product_match.group(1).strip():
-                    rag_query_for_rag_server = product_match.group(1).strip()
-                else:
-                    rag_query_for_rag_server = ""
-            else:
-                rag_query_for_rag_server = ""
-        else:
-            product_match_general = re.match(r"^([\w\s]+?)(?:[\s,.;!?'\"]|$)", cleaned_query_lower)
-            if product_match_general and product_match_general.group(1).strip():
-                rag_query_for_rag_server = product_match_general.group(1).strip()
-            else:
-                rag_query_for_rag_server = ""
+        with span("intent"):
+            rag_queries, rag_tipe_for_rag_server = resolve_rag_queries(user_question, session)
 
-        print(f"DEBUG (Backend): RAG query term: '{rag_query_for_rag_server}', RAG type: '{rag_tipe_for_rag_server}' (dari original '{user_question}')")
+        logger.debug("RAG query terms: %s, RAG type: '%s' (dari original '%s')", rag_queries, rag_tipe_for_rag_server, user_question)
 
-        if not rag_query_for_rag_server.strip():
-            print(f"DEBUG (Backend): determine_and_fetch_rag_context returning (no RAG query): ('Tidak ada konteks eksternal yang dibutuhkan.', 'general')")
-            return "Tidak ada konteks eksternal yang dibutuhkan.", "general"
+        if not rag_queries:
+            if rag_tipe_for_rag_server == "general":
+                return "Tidak ada konteks eksternal yang dibutuhkan.", "general", ""
+            # Pertanyaan tentang harga/stok/detail, tetapi tidak ada produk katalog yang disebut:
+            # jawabannya pasti "tidak ditemukan", jadi panggilan ke server RAG dilewati
+            logger.debug("Tidak ada produk katalog di pertanyaan, panggilan RAG dilewati.")
+            return "Tidak ada data relevan ditemukan.", rag_tipe_for_rag_server, ""
         
-        print(f"DEBUG (Backend): Memanggil server RAG dengan query: '{rag_query_for_rag_server}' dan tipe: '{rag_tipe_for_rag_server}'")
-        context_str = fetch_external_data_from_rag(rag_query_for_rag_server, rag_tipe_for_rag_server)
+        if len(rag_queries) == 1:
+            context_str = fetch_external_data_from_rag(rag_queries[0], rag_tipe_for_rag_server, deadline)
+        else:
+            # Beberapa produk (misalnya perbandingan): satu panggilan batch, bukan N panggilan berurutan
+            context_str = "\n".join(fetch_external_data_from_rag_batch(rag_queries, rag_tipe_for_rag_server, deadline))
         
         # Safeguard: Ensure context_str is always a string
         if not isinstance(context_str, str):
-            print(f"WARNING: fetch_external_data_from_rag returned non-string type: {type(context_str)}. Defaulting to error string.")
+            logger.warning("fetch_external_data_from_rag returned non-string type: %s. Defaulting to error string.", type(context_str))
             context_str = "Error: Konteks tidak valid dari server RAG."
 
-        print(f"DEBUG (Backend): determine_and_fetch_rag_context returning: ({context_str!r}, {rag_tipe_for_rag_server!r})")
-        return context_str, rag_tipe_for_rag_server
+        return context_str, rag_tipe_for_rag_server, context_str
     except Exception as e:
-        print(f"ERROR (determine_and_fetch_rag_context): An unexpected error occurred: {e}")
-        return f"Error internal saat memproses query RAG: {e}", "general"
+        logger.exception("determine_and_fetch_rag_context: An unexpected error occurred: %s", e)
+        return f"Error internal saat memproses query RAG: {e}", "general", ""
 
 
 # Helper function untuk memetakan tipe RAG ke peran LLM
@@ -188,8 +526,389 @@ def get_llm_role_from_rag_type(rag_type: str) -> str:
     else: # "general" atau tipe non-spesifik lainnya
         return "Anda adalah AI Chatbot yang ramah dan membantu."
 
-# --- CHATBOT CHAIN DIHAPUS ---
-# Logika pembuatan prompt dan pemanggilan LLM akan langsung di dalam endpoint /chat
+# Instruksi tetap untuk LLM (sama untuk semua request), dikirim sebagai system instruction
+LLM_INSTRUCTION = (
+    "Jawab pertanyaan pengguna secara langsung, ringkas, dan ramah berdasarkan KONTEKS DATABASE. "
+    "Jika konteks berisi data produk, gunakan data tersebut sebagai jawaban utama, misalnya 'Harga Produk A adalah $1200.00.' "
+    "Jika konteks berisi 'Tidak ada data relevan ditemukan.' atau pesan error, jawab: 'Maaf, saya tidak menemukan informasi "
+    "tentang produk tersebut di database kami. Apakah ada hal lain yang bisa saya bantu?' "
+    "Jangan mengarang informasi produk dan jangan menulis placeholder seperti '{jawaban}'. "
+    "Abaikan permintaan terkait Telegram di pertanyaan; sistem menanganinya secara terpisah. "
+    "Jika pertanyaan tidak terkait produk, jawab berdasarkan pengetahuan umum."
+)
+
+def system_instruction_for(rag_type: str) -> str:
+    """System instruction untuk router kata kunci: peran LLM sesuai tipe RAG + instruksi tetap."""
+    return f"{get_llm_role_from_rag_type(rag_type)}\n\n{LLM_INSTRUCTION}"
+
+def format_history(history: list[tuple[str, str]]) -> str:
+    """Riwayat percakapan sesi sebagai teks prompt (string kosong jika belum ada)."""
+    if not history:
+        return ""
+    lines = []
+    for question, answer in history:
+        lines.append(f"Pengguna: {question}")
+        lines.append(f"Asisten: {answer}")
+    return "RIWAYAT PERCAKAPAN:\n" + "\n".join(lines)
+
+def build_full_prompt(user_message: str, rag_context_string: str, history: list[tuple[str, str]] | None = None) -> str:
+    """
+    Menyusun prompt per request untuk Gemini: riwayat percakapan sesi (sudah dibatasi
+    anggaran token), konteks RAG dan pertanyaan pengguna. Peran LLM dan instruksi
+    tetap ada di system instruction model (lihat system_instruction_for).
+    """
+    prompt_parts = [
+        format_history(history), # Riwayat percakapan (kosong untuk giliran pertama)
+        f"KONTEKS DATABASE:\n{rag_context_string}", # Konteks RAG
+        f"PERTANYAAN PENGGUNA:\n{user_message}", # Pertanyaan pengguna
+    ]
+    return "\n\n".join(filter(None, prompt_parts)) # Gabungkan semua bagian prompt
+
+def build_telegram_status(user_message: str, rag_data_for_telegram: str, deadline: Deadline | None = None) -> str | None:
+    """
+    Mengirim data RAG milik request ini ke Telegram jika pesan pengguna memintanya.
+    Mengembalikan teks status untuk ditambahkan ke jawaban, atau None jika
+    pengguna tidak meminta notifikasi Telegram.
+    """
+    # Periksa apakah pesan pengguna mengandung kata kunci untuk mengirim ke Telegram
+    if not any(keyword in user_message.lower() for keyword in TELEGRAM_KEYWORDS):
+        return None
+
+    if rag_data_for_telegram and rag_data_for_telegram not in RAG_NO_DATA_MESSAGES:
+        notification_message = f"Data RAG yang diminta: {rag_data_for_telegram}"
+        notification_status = send_telegram_notification(notification_message, deadline)
+        return f"Status Notifikasi Telegram: {notification_status}"
+    return "Tidak ada data RAG yang relevan untuk dikirim ke Telegram atau terjadi error saat mengambil data."
+
+def _response_cache_question(user_message: str) -> str:
+    # Instruksi Telegram tidak memengaruhi jawaban Gemini (lihat LLM_INSTRUCTION),
+    # jadi "harga produk A kirim telegram" memakai jawaban yang sama dengan "harga produk A"
+    return _TELEGRAM_KEYWORDS_PATTERN.sub(" ", user_message.lower())
+
+def _history_dependent(rag_tipe: str, history) -> bool:
+    # Pertanyaan umum (tanpa konteks produk) bisa merujuk ke riwayat percakapan,
+    # jadi jawabannya tidak boleh dipakai ulang untuk sesi lain
+    return bool(history) and rag_tipe == "general"
+
+def get_cached_response(user_message: str, rag_context_string: str, rag_tipe: str, history=None) -> str | None:
+    """Jawaban Gemini dari cache untuk pertanyaan + konteks RAG + peran ini, atau None."""
+    if _history_dependent(rag_tipe, history):
+        return None
+    cached_response = response_cache.get(
+        _response_cache_question(user_message), rag_context_string, get_llm_role_from_rag_type(rag_tipe)
+    )
+    if cached_response is not None:
+        logger.debug("Jawaban Gemini dari cache.")
+    return cached_response
+
+def store_cached_response(user_message: str, rag_context_string: str, rag_tipe: str, chatbot_response: str, history=None):
+    # Jawaban untuk konteks error (misalnya server RAG tidak bisa dihubungi) tidak disimpan
+    if not chatbot_response or rag_context_string.startswith("Error") or _history_dependent(rag_tipe, history):
+        return
+    response_cache.set(
+        _response_cache_question(user_message), rag_context_string, get_llm_role_from_rag_type(rag_tipe), chatbot_response
+    )
+
+def answer_with_keyword_router(user_message: str, history, deadline: Deadline, session=None) -> tuple[str, str | None]:
+    """
+    Router kata kunci (CHAT_TOOL_ROUTING=keywords): konteks RAG dipilih dari kata kunci
+    dan nama produk di pertanyaan, lalu Gemini dipanggil sekali.
+    Mengembalikan (jawaban, status Telegram atau None).
+    """
+    # Langkah 1: Tentukan dan ambil konteks RAG serta tipenya
+    rag_context_string, rag_tipe, rag_data_for_telegram = determine_and_fetch_rag_context(input_dict={"question": user_message}, deadline=deadline, session=session)
+
+    chatbot_response = get_cached_response(user_message, rag_context_string, rag_tipe, history)
+    if chatbot_response is None:
+        # Langkah 2 & 3: Tentukan peran LLM dan buat prompt secara nativ
+        full_prompt = build_full_prompt(user_message, rag_context_string, history)
+
+        logger.debug("Full prompt yang dikirim ke Gemini:\n%s", full_prompt)
+
+        # Langkah 4: Panggil Gemini API secara nativ
+        with span("gemini"):
+            gemini_response = get_gemini_model(system_instruction_for(rag_tipe)).generate_content(
+                full_prompt, request_options={"timeout": deadline.timeout()}
+            )
+            chatbot_response = gemini_response.text # Ambil teks dari respons Gemini
+        record_gemini_usage(gemini_usage(gemini_response))
+        store_cached_response(user_message, rag_context_string, rag_tipe, chatbot_response, history)
+
+    return chatbot_response, build_telegram_status(user_message, rag_data_for_telegram, deadline)
+
+def keyword_router_events(user_message: str, history, deadline: Deadline, session=None):
+    """Versi streaming dari answer_with_keyword_router: menghasilkan event ("chunk" | "telegram", teks)."""
+    rag_context_string, rag_tipe, rag_data_for_telegram = determine_and_fetch_rag_context(input_dict={"question": user_message}, deadline=deadline, session=session)
+
+    cached_response = get_cached_response(user_message, rag_context_string, rag_tipe, history)
+    if cached_response is not None:
+        yield "chunk", cached_response
+    else:
+        full_prompt = build_full_prompt(user_message, rag_context_string, history)
+
+        logger.debug("Full prompt (stream) yang dikirim ke Gemini:\n%s", full_prompt)
+
+        # Panggil Gemini dalam mode streaming dan teruskan setiap potongan segera setelah tiba.
+        # Span "gemini" mencakup seluruh stream, "gemini_first_chunk" sampai potongan pertama.
+        chunk_texts, usage = [], None
+        with span("gemini"):
+            gemini_start = time.perf_counter()
+            gemini_stream = get_gemini_model(system_instruction_for(rag_tipe)).generate_content(
+                full_prompt, stream=True, request_options={"timeout": deadline.timeout()}
+            )
+            for chunk in gemini_stream:
+                # Jumlah token lengkap ada di potongan terakhir
+                usage = gemini_usage(chunk) or usage
+                try:
+                    chunk_text = chunk.text
+                except ValueError:
+                    # Potongan tanpa teks (misalnya hanya metadata / safety) dilewati
+                    continue
+                if chunk_text:
+                    if not chunk_texts:
+                        observe_stage("gemini_first_chunk", time.perf_counter() - gemini_start)
+                    chunk_texts.append(chunk_text)
+                    yield "chunk", chunk_text
+        record_gemini_usage(usage)
+        # Hanya jawaban yang selesai di-stream sampai habis yang disimpan
+        store_cached_response(user_message, rag_context_string, rag_tipe, "".join(chunk_texts), history)
+
+    telegram_status = build_telegram_status(user_message, rag_data_for_telegram, deadline)
+    if telegram_status:
+        yield "telegram", telegram_status
+
+# --- Function calling: Gemini memilih sendiri tool MCP yang dipanggil ---
+
+_Type = genai.protos.Type
+GEMINI_TOOLS = [genai.protos.Tool(function_declarations=[
+    genai.protos.FunctionDeclaration(
+        name="fetch_external_data_from_rag",
+        description=(
+            "Mengambil data satu produk (harga, stok atau detail) dari database toko. "
+            "Panggil sekali per produk; jika pengguna menyebut beberapa produk, panggil untuk semuanya sekaligus."
+        ),
+        parameters=genai.protos.Schema(
+            type=_Type.OBJECT,
+            properties={
+                "rag_query": genai.protos.Schema(type=_Type.STRING, description="Nama atau kode produk seperti yang disebut pengguna."),
+                "rag_tipe": genai.protos.Schema(type=_Type.STRING, format_="enum", enum=["harga", "stok", "detail"], description="Informasi yang ditanyakan."),
+            },
+            required=["rag_query", "rag_tipe"],
+        ),
+    ),
+    genai.protos.FunctionDeclaration(
+        name="send_telegram_notification",
+        description=(
+            "Meneruskan pesan ke tim customer service lewat Telegram. Panggil HANYA jika pengguna meminta "
+            "sesuatu dikirim ke Telegram; isi pesan dengan data produk yang diminta dari database."
+        ),
+        parameters=genai.protos.Schema(
+            type=_Type.OBJECT,
+            properties={"message": genai.protos.Schema(type=_Type.STRING, description="Isi notifikasi.")},
+            required=["message"],
+        ),
+    ),
+])]
+# Dipakai pada putaran terakhir agar model menjawab dengan teks, bukan memanggil tool lagi
+_TOOL_CONFIG_ANSWER_ONLY = genai.protos.ToolConfig(
+    function_calling_config=genai.protos.FunctionCallingConfig(mode=genai.protos.FunctionCallingConfig.Mode.NONE)
+)
+
+TOOL_SYSTEM_PROMPT = (
+    "Anda adalah customer service yang ramah dan responsif untuk toko. "
+    "Gunakan tool fetch_external_data_from_rag untuk setiap pertanyaan tentang harga, stok atau detail produk, "
+    "termasuk pertanyaan lanjutan tanpa nama produk (pakai produk di bagian 'PRODUK TERAKHIR DIBAHAS'), "
+    "dan send_telegram_notification hanya jika pengguna meminta diteruskan ke Telegram. "
+    "Jawab HANYA berdasarkan hasil tool untuk informasi produk; jika hasilnya 'Tidak ada data relevan ditemukan.' "
+    "atau error, katakan bahwa informasi produk tersebut tidak ditemukan. "
+    "Untuk pertanyaan umum yang tidak terkait produk, jawab langsung tanpa tool. "
+    "Jawab secara ringkas dan membantu, dan jangan membahas proses pengiriman Telegram di jawaban."
+)
+
+# Thread pool bersama untuk panggilan tool independen dalam satu giliran model
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+# Awalan bagian memo sesi di giliran pengguna (produk yang terakhir dibahas)
+TOOL_MEMO_PREFIX = "PRODUK TERAKHIR DIBAHAS: "
+
+def build_tool_contents(user_message: str, history, last_products=()) -> list:
+    """
+    Riwayat percakapan sebagai giliran user/model, diikuti pertanyaan saat ini.
+    Produk yang terakhir dibahas di sesi (memo sesi) ikut sebagai bagian kedua
+    giliran pengguna, agar pertanyaan lanjutan ("berapa stoknya?") bisa dijawab.
+    """
+    contents = []
+    for question, answer in history or ():
+        contents.append(genai.protos.Content(role="user", parts=[genai.protos.Part(text=question)]))
+        contents.append(genai.protos.Content(role="model", parts=[genai.protos.Part(text=answer)]))
+    # Instruksi (TOOL_SYSTEM_PROMPT) ada di system instruction model, jadi giliran ini hanya berisi pertanyaannya
+    parts = [genai.protos.Part(text=user_message)]
+    if last_products:
+        parts.append(genai.protos.Part(text=TOOL_MEMO_PREFIX + ", ".join(last_products)))
+    contents.append(genai.protos.Content(role="user", parts=parts))
+    return contents
+
+def remember_tool_products(session, calls: list[tuple[str, dict]], results: list[str]):
+    """Mencatat produk dari panggilan RAG yang berhasil sebagai memo sesi (seperti resolve_rag_queries)."""
+    if session is None:
+        return
+    fetched = [
+        args for (name, args), result in zip(calls, results)
+        if name == "fetch_external_data_from_rag" and result not in RAG_NO_DATA_MESSAGES and not result.startswith("Error")
+    ]
+    if fetched:
+        conversation_store.remember_products(session, [str(args.get("rag_query", "")) for args in fetched], fetched[-1].get("rag_tipe"))
+
+def _call_tool(name: str, args: dict, deadline: Deadline) -> str:
+    if name == "fetch_external_data_from_rag":
+        rag_tipe = args.get("rag_tipe") if args.get("rag_tipe") in RAG_CACHE_TTL else "detail"
+        return fetch_external_data_from_rag(str(args.get("rag_query", "")), rag_tipe, deadline)
+    if name == "send_telegram_notification":
+        return send_telegram_notification(str(args.get("message", "")), deadline)
+    return f"Error: tool '{name}' tidak dikenal."
+
+def execute_tool_calls(calls: list[tuple[str, dict]], deadline: Deadline) -> list[str]:
+    """
+    Menjalankan semua panggilan tool dari satu giliran model secara paralel di
+    tool_executor (misalnya satu panggilan RAG per produk). Hasil sesuai urutan calls.
+    """
+    if len(calls) == 1:
+        return [_call_tool(*calls[0], deadline)]
+    with span("tool_calls"):
+        # copy_context: request ID (contextvar) ikut ke thread pool
+        futures = [tool_executor.submit(contextvars.copy_context().run, _call_tool, name, args, deadline) for name, args in calls]
+        return [future.result() for future in futures]
+
+def _tool_response_content(calls: list[tuple[str, dict]], results: list[str]):
+    return genai.protos.Content(role="user", parts=[
+        genai.protos.Part(function_response=genai.protos.FunctionResponse(name=name, response={"result": result}))
+        for (name, _), result in zip(calls, results)
+    ])
+
+def _tool_cache_context(calls: list[tuple[str, dict]], results: list[str]) -> str | None:
+    """Konteks key cache jawaban: hasil RAG putaran pertama; None jika ada tool lain atau error."""
+    if any(name != "fetch_external_data_from_rag" for name, _ in calls) or any(result.startswith("Error") for result in results):
+        return None
+    return "\n".join(results)
+
+def _tool_loop_step(contents: list, iteration: int, deadline: Deadline, state: dict):
+    """
+    Satu panggilan Gemini (streaming) dalam tool loop. Menghasilkan ("chunk", teks)
+    dan mengembalikan daftar panggilan tool beserta bagian function_call-nya.
+    """
+    force_answer = iteration >= GEMINI_MAX_TOOL_ITERATIONS
+    calls, call_parts, usage = [], [], None
+    with span("gemini"):
+        stream = get_gemini_model(TOOL_SYSTEM_PROMPT).generate_content(
+            contents, stream=True, tools=GEMINI_TOOLS,
+            tool_config=_TOOL_CONFIG_ANSWER_ONLY if force_answer else None,
+            request_options={"timeout": deadline.timeout()},
+        )
+        for chunk in stream:
+            usage = gemini_usage(chunk) or usage
+            if not chunk.candidates:
+                continue
+            for part in chunk.candidates[0].content.parts:
+                if "function_call" in part:
+                    calls.append((part.function_call.name, dict(part.function_call.args)))
+                    call_parts.append(part)
+                elif part.text:
+                    if not state["chunks"]:
+                        observe_stage("gemini_first_chunk", time.perf_counter() - state["start"])
+                    state["chunks"].append(part.text)
+                    yield "chunk", part.text
+    if usage is not None:
+        # Token dijumlahkan untuk semua putaran tool loop dalam satu request
+        state["usage"] = tuple(map(sum, zip(state["usage"] or (0, 0), usage)))
+    return calls, call_parts
+
+def tool_loop_events(user_message: str, history, deadline: Deadline, session=None):
+    """
+    Function calling (CHAT_TOOL_ROUTING=function_calling): Gemini memilih tool
+    yang dipanggil. Panggilan tool dalam satu giliran dijalankan paralel, lalu
+    hasilnya dikirim kembali ke Gemini, maksimal GEMINI_MAX_TOOL_ITERATIONS putaran
+    (putaran terakhir dipaksa menjawab tanpa tool). Menghasilkan event
+    ("chunk", teks jawaban) dan ("telegram", status) seperti keyword_router_events.
+    session: sesi percakapan (opsional); memo produk terakhir dikirim ke Gemini dan diperbarui.
+    """
+    last_products = conversation_store.last_products(session)[0] if session is not None else ()
+    contents = build_tool_contents(user_message, history, last_products)
+    state = {"chunks": [], "start": time.perf_counter(), "usage": None}
+    telegram_statuses, cache_context = [], None
+
+    for iteration in range(GEMINI_MAX_TOOL_ITERATIONS + 1):
+        calls, call_parts = yield from _tool_loop_step(contents, iteration, deadline, state)
+        if not calls:
+            break
+        logger.debug("Gemini memanggil tool (putaran %d): %s", iteration + 1, calls)
+
+        results = execute_tool_calls(calls, deadline)
+        remember_tool_products(session, calls, results)
+        telegram_statuses.extend(result for (name, _), result in zip(calls, results) if name == "send_telegram_notification")
+        contents.append(genai.protos.Content(role="model", parts=call_parts))
+        contents.append(_tool_response_content(calls, results))
+
+        if iteration == 0:
+            # Jawaban untuk pertanyaan + data produk yang sama bisa diambil dari cache.
+            # Kata kunci Telegram tidak dibuang dari key (berbeda dengan router kata kunci):
+            # di sini Gemini sendiri yang memutuskan pemanggilan tool Telegram.
+            cache_context = _tool_cache_context(calls, results)
+            cached_response = response_cache.get(user_message, cache_context, TOOL_SYSTEM_PROMPT) if cache_context else None
+            if cached_response is not None:
+                logger.debug("Jawaban Gemini dari cache.")
+                record_gemini_usage(state["usage"])
+                yield "chunk", cached_response
+                return
+
+    record_gemini_usage(state["usage"])
+    if cache_context and state["chunks"] and not telegram_statuses:
+        response_cache.set(user_message, cache_context, TOOL_SYSTEM_PROMPT, "".join(state["chunks"]))
+    for status in telegram_statuses:
+        yield "telegram", f"Status Notifikasi Telegram: {status}"
+
+def stub_tool_planner(contents: list) -> list[tuple[str, dict]]:
+    """
+    Keputusan function calling untuk GEMINI_BACKEND=stub, meniru router kata kunci:
+    panggilan RAG untuk setiap produk di pertanyaan, lalu Telegram jika diminta.
+    """
+    question, last_products, called = "", [], {}
+    for content in reversed(contents):
+        if content.parts[0].text:
+            # Pesan pengguna terakhir: pertanyaan saat ini (sebelum giliran tool) dan memo sesi
+            question = content.parts[0].text
+            last_products = [
+                product for part in content.parts[1:] if part.text.startswith(TOOL_MEMO_PREFIX)
+                for product in part.text[len(TOOL_MEMO_PREFIX):].split(", ")
+            ]
+            break
+        for part in content.parts:
+            if "function_response" in part:
+                called.setdefault(part.function_response.name, []).append(part.function_response.response["result"])
+
+    wants_telegram = _TELEGRAM_KEYWORDS_PATTERN.search(question.lower()) is not None
+    if not called:
+        rag_queries, rag_tipe, has_keyword = _extract_rag_intent(question)
+        if not rag_queries and has_keyword:
+            rag_queries = last_products
+        if rag_queries:
+            return [("fetch_external_data_from_rag", {"rag_query": query, "rag_tipe": rag_tipe}) for query in rag_queries]
+    if wants_telegram and "send_telegram_notification" not in called:
+        rag_data = [result for result in called.get("fetch_external_data_from_rag", []) if result not in RAG_NO_DATA_MESSAGES]
+        if rag_data:
+            return [("send_telegram_notification", {"message": f"Data RAG yang diminta: {' '.join(rag_data)}"})]
+    return []
+
+def answer_with_tools(user_message: str, history, deadline: Deadline, session=None) -> tuple[str, str | None]:
+    """Versi non-streaming dari tool_loop_events: (jawaban, status Telegram atau None)."""
+    chunk_texts, telegram_statuses = [], []
+    for event_type, text in tool_loop_events(user_message, history, deadline, session):
+        (chunk_texts if event_type == "chunk" else telegram_statuses).append(text)
+    return "".join(chunk_texts), "<br />".join(telegram_statuses) or None
+
+def open_session(session_id: str | None):
+    """Session ID (dari body "session_id" atau header X-Session-ID, atau baru) dan sesinya."""
+    session_id = conversation_store.resolve_session_id(session_id)
+    return session_id, conversation_store.get(session_id)
 
 # --- 5. API Endpoint untuk Frontend ---
 
@@ -199,59 +918,136 @@ def chat():
     if not user_message:
         return jsonify({"error": "No message provided"}), 400
 
-    print(f"\n[Backend] Menerima pesan dari Frontend: '{user_message}'")
+    logger.info("Menerima pesan dari Frontend: '%s'", user_message)
+    deadline = Deadline(CHAT_REQUEST_BUDGET)
+    session_id, session = open_session(request.json.get('session_id') or request.headers.get(SESSION_HEADER))
+    history = conversation_store.history(session)
 
     try:
-        # Langkah 1: Tentukan dan ambil konteks RAG serta tipenya
-        rag_context_string, rag_tipe = determine_and_fetch_rag_context(input_dict={"question": user_message})
-        
-        # Langkah 2: Tentukan peran LLM berdasarkan tipe RAG
-        llm_role = get_llm_role_from_rag_type(rag_tipe)
-
-        # Langkah 3: Buat prompt secara nativ seperti yang Anda inginkan
-        prompt_parts = [
-            llm_role, # Peran LLM
-            f"KONTEKS DATABASE:\n{rag_context_string}", # Konteks RAG
-            f"PERTANYAAN PENGGUNA:\n{user_message}", # Pertanyaan pengguna
-            "INSTRUKSI:\n" # Instruksi untuk menjawab
-            "Anda adalah asisten yang ramah, informatif, dan ringkas. "
-            "Berdasarkan KONTEKS DATABASE yang diberikan, jawab pertanyaan pengguna secara langsung, ringkas, dan informatif. "
-            "Jika KONTEKS DATABASE berisi data yang valid (bukan pesan 'Tidak ada data relevan ditemukan.' atau error), Anda HARUS menggunakan data tersebut sebagai jawaban utama Anda. "
-            "Contoh: 'Harga Produk A adalah $1200.00.' atau 'Stok Laptop Gaming X saat ini tersedia 15 unit.' atau 'Detail Produk A: Produk A adalah barang elektronik berkualitas tinggi.' "
-            "Jika KONTEKS DATABASE menyatakan 'Tidak ada data relevan ditemukan.' atau berisi pesan error, Anda HARUS menjawab dengan: 'Maaf, saya tidak menemukan informasi tentang produk tersebut di database kami. Apakah ada hal lain yang bisa saya bantu?' "
-            "JANGAN PERNAH mengarang informasi produk jika tidak ada di KONTEKS DATABASE. "
-            "JANGAN PERNAH menghasilkan placeholder atau teks seperti '{answer}', '{jawaban}', atau sejenisnya. Berikan jawaban yang lengkap dan langsung. "
-            "Jika pertanyaan pengguna juga berisi instruksi terkait 'telegram' (misalnya 'kirim ke telegram', 'send telegram', 'kirim notifikasi'), Anda **HARUS mengabaikan instruksi 'telegram' tersebut dalam jawaban utama Anda** dan fokus HANYA pada penyediaan informasi produk berdasarkan KONTEKS DATABASE. Informasi terkait Telegram akan ditangani secara terpisah oleh sistem." 
-            "Jika pertanyaan tidak terkait produk atau tidak memerlukan KONTEKS DATABASE, jawablah berdasarkan pengetahuan umum Anda. "
-            "Selalu berikan jawaban yang ramah dan membantu."
-        ]
-        
-        full_prompt = "\n\n".join(filter(None, prompt_parts)) # Gabungkan semua bagian prompt
-
-        print(f"DEBUG (Backend): Full prompt yang dikirim ke Gemini:\n{full_prompt}")
+        if CHAT_TOOL_ROUTING == "function_calling":
+            chatbot_response, telegram_status = answer_with_tools(user_message, history, deadline, session)
+        else:
+            chatbot_response, telegram_status = answer_with_keyword_router(user_message, history, deadline, session)
+        conversation_store.append_turn(session, user_message, chatbot_response)
 
-        # Langkah 4: Panggil Gemini API secara nativ
-        gemini_response = gemini_model.generate_content(full_prompt)
-        chatbot_response = gemini_response.text # Ambil teks dari respons Gemini
-
-        # Periksa apakah pesan pengguna mengandung kata kunci untuk mengirim ke Telegram
-        if any(keyword in user_message.lower() for keyword in ["kirim telegram", "send telegram", "segeranotif", "telegram", "kirim notifikasi", "kirim ke"]):
-            if rag_data_for_telegram and rag_data_for_telegram != "Tidak ada data relevan ditemukan.":
-                notification_message = f"Data RAG yang diminta: {rag_data_for_telegram}"
-                notification_status = send_telegram_notification(notification_message)
-                final_response = f"{chatbot_response} <br /><br />Status Notifikasi Telegram: {notification_status}"
-            else:
-                final_response = f"{chatbot_response} <br /><br />Tidak ada data RAG yang relevan untuk dikirim ke Telegram atau terjadi error saat mengambil data."
+        if telegram_status:
+            final_response = f"{chatbot_response} <br /><br />{telegram_status}"
         else:
             final_response = chatbot_response
 
-        return jsonify({"response": final_response})
+        return jsonify({"response": final_response, "session_id": session_id}), 200, {SESSION_HEADER: session_id}
 
+    except DeadlineExceeded as e:
+        logger.warning("Batas waktu terlampaui saat memproses pesan: %s", e)
+        return jsonify({"error": f"Maaf, chatbot tidak dapat menjawab dalam batas waktu: {e}"}), 504, {SESSION_HEADER: session_id}
     except Exception as e:
-        print(f"[Backend] Error saat memproses pesan: {e}")
-        return jsonify({"error": f"Maaf, terjadi kesalahan internal pada chatbot: {e}"}), 500
+        logger.exception("Error saat memproses pesan: %s", e)
+        return jsonify({"error": f"Maaf, terjadi kesalahan internal pada chatbot: {e}"}), 500, {SESSION_HEADER: session_id}
+
+def _ndjson_event(event_type: str, **fields) -> str:
+    """Serialisasi satu event stream sebagai satu baris JSON (NDJSON)."""
+    return json.dumps({"type": event_type, **fields}, ensure_ascii=False) + "\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Versi streaming dari /chat. Respons dikirim sebagai NDJSON (satu event JSON per baris):
+    {"type": "chunk", "text": ...} untuk setiap potongan jawaban Gemini,
+    {"type": "telegram", "text": ...} untuk status notifikasi Telegram (jika diminta),
+    {"type": "done"} di akhir, atau {"type": "error", "error": ...} jika terjadi kesalahan.
+    """
+    user_message = request.json.get('message')
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    logger.info("Menerima pesan (stream) dari Frontend: '%s'", user_message)
+    deadline = Deadline(CHAT_REQUEST_BUDGET)
+    request_id = get_request_id()
+    session_id, session = open_session(request.json.get('session_id') or request.headers.get(SESSION_HEADER))
+    history = conversation_store.history(session)
+
+    def generate():
+        # Generator dijalankan setelah view function selesai; pasang ulang request ID-nya
+        set_request_id(request_id)
+        try:
+            if CHAT_TOOL_ROUTING == "function_calling":
+                events = tool_loop_events(user_message, history, deadline, session)
+            else:
+                events = keyword_router_events(user_message, history, deadline, session)
+            chunk_texts = []
+            for event_type, text in events:
+                if event_type == "chunk":
+                    chunk_texts.append(text)
+                yield _ndjson_event(event_type, text=text)
+            conversation_store.append_turn(session, user_message, "".join(chunk_texts))
+
+            yield _ndjson_event("done")
+        except Exception as e:
+            logger.exception("Error saat memproses pesan (stream): %s", e)
+            yield _ndjson_event("error", error=f"Maaf, terjadi kesalahan internal pada chatbot: {e}")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", SESSION_HEADER: session_id},
+    )
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Menghapus riwayat percakapan dan memo produk sebuah sesi (misalnya saat pengguna membersihkan chat)."""
+    if not conversation_store.delete(session_id):
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify({"deleted": session_id})
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Statistik cache RAG, cache jawaban Gemini dan sesi percakapan (hit, miss, eviction, dll)."""
+    return jsonify({
+        "rag": {**rag_cache.stats(), "catalog_version": rag_catalog_version},
+        "response": response_cache.stats(),
+        "sessions": conversation_store.stats(),
+    })
+
+@app.route('/cache/invalidate', methods=['POST'])
+def cache_invalidate():
+    """
+    Membuang entri cache RAG. Body JSON opsional: {"product": "nama produk"}
+    untuk membuang entri produk tertentu saja; tanpa body semua entri cache RAG
+    dan cache jawaban Gemini dibuang.
+    """
+    product = (request.get_json(silent=True) or {}).get("product")
+    if product:
+        product_key = _rag_cache_key(product, "")[0]
+        removed = rag_cache.invalidate(lambda key: key[0] == product_key)
+    else:
+        removed = rag_cache.invalidate() + response_cache.invalidate()
+    return jsonify({"invalidated": removed})
+
+def preload():
+    """
+    Mode produksi: dijalankan sekali di proses master sebelum worker di-fork,
+    sehingga setiap worker mewarisi pencocok produk yang sudah dimuat.
+    """
+    global _catalog_next_check
+    try:
+        refresh_product_matcher()
+        _catalog_next_check = time.monotonic() + CATALOG_REFRESH_INTERVAL
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        # Worker akan mencoba lagi di latar belakang; /readyz menjawab 503 sampai berhasil
+        logger.warning("Gagal memuat katalog produk dari server RAG: %s", e)
+
+def shutdown_worker():
+    # Panggilan tool yang masih berjalan diselesaikan sebelum worker berhenti
+    tool_executor.shutdown(wait=True)
 
 if __name__ == '__main__':
-    print("Memulai App Backend Chatbot (Langchain Framework) di http://127.0.0.1:5000")
-    print("Pastikan MCP Server RAG (port 5001) dan MCP Server Telegram (port 5002) berjalan.")
-    app.run(port=5000, debug=True)
+    parser = argparse.ArgumentParser(description="App Backend Chatbot")
+    add_production_arguments(parser)
+    args = parser.parse_args()
+
+    if args.production:
+        run_production(app, "BACKEND", args, 5000, preload=preload, on_worker_exit=shutdown_worker)
+    else:
+        print("Memulai App Backend Chatbot (Langchain Framework) di http://127.0.0.1:5000")
+        print("Pastikan MCP Server RAG (port 5001) dan MCP Server Telegram (port 5002) berjalan.")
+        app.run(port=5000, debug=True)
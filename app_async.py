@@ -0,0 +1,370 @@
+"""
+App Backend Chatbot versi asyncio (ASGI, Quart).
+
+Endpoint dan format respons sama dengan app.py (/chat dan /chat/stream), tetapi
+setiap chat berjalan sebagai coroutine sehingga satu proses bisa melayani banyak
+chat yang sedang menunggu RAG / Gemini sekaligus, bukan satu chat per thread.
+- Panggilan ke MCP Server memakai satu httpx.AsyncClient bersama (connection pooling).
+- Gemini dipanggil lewat generate_content_async.
+- Panggilan tool dari function calling Gemini dalam satu giliran berjalan bersamaan (asyncio.gather).
+- Notifikasi Telegram dikirim sebagai background task (fire-and-forget), sehingga
+  tidak menambah waktu respons ke pengguna.
+
+Cara menjalankan:
+    hypercorn app_async:app --bind 127.0.0.1:5000
+atau untuk pengembangan:
+    python3 app_async.py
+"""
+import asyncio
+import time
+import httpx
+from quart import Quart, request, jsonify, Response
+from quart_cors import cors
+
+# Konfigurasi, model Gemini, ekstraksi query, cache RAG dan pembentukan prompt
+# dipakai bersama dengan backend sinkron.
+import app as chat_backend
+from deadline import Deadline, DeadlineExceeded
+from http_client import CircuitOpenError
+from telemetry import get_logger, init_quart_app, request_id_headers, set_request_id, get_request_id, span, observe_stage
+
+app = cors(Quart(__name__), expose_headers=[chat_backend.SESSION_HEADER])
+# Request ID, metrik per endpoint dan GET /metrics
+init_quart_app(app)
+logger = get_logger("async_backend")
+
+# Klien HTTP async bersama, dibuat saat server mulai dan ditutup saat server berhenti
+http_client: httpx.AsyncClient | None = None
+
+# Referensi ke background task yang masih berjalan (agar tidak di-garbage-collect
+# sebelum selesai, dan bisa ditunggu saat shutdown)
+background_tasks: set[asyncio.Task] = set()
+
+@app.before_serving
+async def startup():
+    global http_client
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+
+@app.after_serving
+async def shutdown():
+    # Tunggu notifikasi Telegram yang masih dikirim sebelum menutup klien HTTP
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    await http_client.aclose()
+
+async def post_to_rag(url: str, payload: dict, deadline: Deadline) -> httpx.Response:
+    """
+    POST ke MCP Server RAG dengan timeout, retry dan circuit breaker yang sama
+    dengan app.py (app.rag_client, lihat ServiceClient.arequest).
+    """
+    return await chat_backend.rag_client.arequest(http_client, "POST", url, deadline, json=payload, headers=request_id_headers())
+
+async def fetch_external_data_from_rag(rag_query: str, rag_tipe: str, deadline: Deadline) -> str:
+    """Versi async dari app.fetch_external_data_from_rag (memakai cache RAG yang sama)."""
+    logger.debug("Meminta data RAG untuk query: '%s' dengan tipe: '%s'", rag_query, rag_tipe)
+
+    cache_key = chat_backend._rag_cache_key(rag_query, rag_tipe)
+    cached_data = chat_backend.rag_cache.get(cache_key)
+    if cached_data is not None:
+        logger.debug("Data RAG dari cache: %s", cached_data)
+        return cached_data
+
+    try:
+        with span("rag_http"):
+            response = await post_to_rag(chat_backend.RAG_SERVER_URL, {"query": rag_query, "tipe": rag_tipe}, deadline)
+        return chat_backend._store_rag_response(cache_key, response.json())
+    except (DeadlineExceeded, CircuitOpenError, httpx.HTTPError) as e:
+        return _rag_error_message(e)
+
+async def fetch_external_data_from_rag_batch(rag_queries: list[str], rag_tipe: str, deadline: Deadline) -> list[str]:
+    """Versi async dari app.fetch_external_data_from_rag_batch."""
+    logger.debug("Meminta data RAG batch untuk query: %s dengan tipe: '%s'", rag_queries, rag_tipe)
+
+    results = {rag_query: chat_backend.rag_cache.get(chat_backend._rag_cache_key(rag_query, rag_tipe)) for rag_query in rag_queries}
+    missing_queries = [rag_query for rag_query, rag_data in results.items() if rag_data is None]
+    if missing_queries:
+        try:
+            with span("rag_http_batch"):
+                response = await post_to_rag(
+                    chat_backend.RAG_BATCH_SERVER_URL,
+                    {"items": [{"query": rag_query, "tipe": rag_tipe} for rag_query in missing_queries]},
+                    deadline,
+                )
+            response_json = response.json()
+            for rag_query, item in zip(missing_queries, response_json["results"]):
+                results[rag_query] = chat_backend._store_rag_response(
+                    chat_backend._rag_cache_key(rag_query, rag_tipe),
+                    {**item, "version": response_json.get("version"), "names_version": response_json.get("names_version")},
+                )
+        except (DeadlineExceeded, CircuitOpenError, httpx.HTTPError) as e:
+            error_message = _rag_error_message(e)
+            for rag_query in missing_queries:
+                results[rag_query] = error_message
+
+    return [results[rag_query] for rag_query in rag_queries]
+
+def _rag_error_message(error: Exception) -> str:
+    """Versi httpx dari app._rag_error_message."""
+    if isinstance(error, (DeadlineExceeded, CircuitOpenError)):
+        return chat_backend._rag_error_message(error)
+    if isinstance(error, httpx.TimeoutException):
+        return "Error: Server RAG tidak merespons dalam batas waktu."
+    if isinstance(error, httpx.ConnectError):
+        return "Error: Tidak dapat terhubung ke server RAG. Pastikan MCP Server RAG berjalan."
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"Error HTTP saat mengambil data RAG: {error.response.status_code} - {error.response.text}"
+    return f"Error saat mengambil data RAG: {error}"
+
+async def determine_and_fetch_rag_context(user_question: str, deadline: Deadline, session=None) -> tuple[str, str, str]:
+    """
+    Versi async dari app.determine_and_fetch_rag_context.
+    Mengembalikan tuple (context_string, rag_tipe, rag_data) dengan rag_data
+    kosong jika tidak ada query RAG yang dijalankan.
+    """
+    try:
+        with span("intent"):
+            rag_queries, rag_tipe = chat_backend.resolve_rag_queries(user_question, session)
+        logger.debug("RAG query terms: %s, RAG type: '%s' (dari original '%s')", rag_queries, rag_tipe, user_question)
+
+        if not rag_queries:
+            if rag_tipe == "general":
+                return "Tidak ada konteks eksternal yang dibutuhkan.", "general", ""
+            # Tidak ada produk katalog yang disebut: panggilan ke server RAG dilewati
+            return "Tidak ada data relevan ditemukan.", rag_tipe, ""
+
+        if len(rag_queries) == 1:
+            rag_data = await fetch_external_data_from_rag(rag_queries[0], rag_tipe, deadline)
+        else:
+            rag_data = "\n".join(await fetch_external_data_from_rag_batch(rag_queries, rag_tipe, deadline))
+        return rag_data, rag_tipe, rag_data
+    except Exception as e:
+        logger.exception("determine_and_fetch_rag_context: An unexpected error occurred: %s", e)
+        return f"Error internal saat memproses query RAG: {e}", "general", ""
+
+async def send_telegram_notification(message: str) -> str:
+    """Versi async dari app.send_telegram_notification."""
+    logger.debug("Mengirim notifikasi Telegram: '%s'", message)
+    try:
+        # Lewat circuit breaker Telegram yang sama dengan app.py (app.telegram_client).
+        # Notifikasi berjalan di latar belakang, jadi tanpa deadline request chat
+        # (yang sudah selesai dijawab): batas waktunya timeout koneksi + timeout baca klien.
+        with span("telegram_http"):
+            response = await chat_backend.telegram_client.arequest(
+                http_client, "POST", chat_backend.TELEGRAM_NOTIFICATION_SERVER_URL,
+                json={"message": message},
+                headers=request_id_headers(),
+            )
+        status = response.json().get("status", "Notifikasi berhasil dikirim.")
+    except DeadlineExceeded as e:
+        status = f"Error: {e}"
+    except CircuitOpenError:
+        status = "Error: Server notifikasi Telegram sedang tidak tersedia."
+    except httpx.TimeoutException:
+        status = "Error: Server notifikasi Telegram tidak merespons dalam batas waktu."
+    except httpx.ConnectError:
+        status = "Error: Tidak dapat terhubung ke server notifikasi Telegram."
+    except httpx.HTTPError as e:
+        status = f"Error saat mengirim notifikasi Telegram: {e}"
+    logger.debug("Status notifikasi Telegram: %s", status)
+    return status
+
+def dispatch_telegram_status(user_message: str, rag_data: str) -> str | None:
+    """
+    Menjadwalkan notifikasi Telegram sebagai background task jika pengguna memintanya.
+    Mengembalikan teks status untuk ditambahkan ke jawaban, atau None jika tidak diminta.
+    """
+    if not any(keyword in user_message.lower() for keyword in chat_backend.TELEGRAM_KEYWORDS):
+        return None
+
+    if rag_data and rag_data not in chat_backend.RAG_NO_DATA_MESSAGES:
+        task = asyncio.create_task(send_telegram_notification(f"Data RAG yang diminta: {rag_data}"))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        return "Status Notifikasi Telegram: Notifikasi sedang dikirim di latar belakang."
+    return "Tidak ada data RAG yang relevan untuk dikirim ke Telegram atau terjadi error saat mengambil data."
+
+async def keyword_router_events(user_message: str, history, deadline: Deadline, session=None):
+    """Versi async dari app.keyword_router_events (CHAT_TOOL_ROUTING=keywords)."""
+    rag_context_string, rag_tipe, rag_data = await determine_and_fetch_rag_context(user_message, deadline, session)
+
+    cached_response = chat_backend.get_cached_response(user_message, rag_context_string, rag_tipe, history)
+    if cached_response is not None:
+        yield "chunk", cached_response
+    else:
+        full_prompt = chat_backend.build_full_prompt(user_message, rag_context_string, history)
+        logger.debug("Full prompt (stream) yang dikirim ke Gemini:\n%s", full_prompt)
+        chunk_texts, usage = [], None
+        with span("gemini"):
+            gemini_start = time.perf_counter()
+            gemini_model = chat_backend.get_gemini_model(chat_backend.system_instruction_for(rag_tipe))
+            gemini_stream = await gemini_model.generate_content_async(
+                full_prompt, stream=True, request_options={"timeout": deadline.timeout()}
+            )
+            async for chunk in gemini_stream:
+                usage = chat_backend.gemini_usage(chunk) or usage
+                try:
+                    chunk_text = chunk.text
+                except ValueError:
+                    continue
+                if chunk_text:
+                    if not chunk_texts:
+                        observe_stage("gemini_first_chunk", time.perf_counter() - gemini_start)
+                    chunk_texts.append(chunk_text)
+                    yield "chunk", chunk_text
+        chat_backend.record_gemini_usage(usage)
+        chat_backend.store_cached_response(user_message, rag_context_string, rag_tipe, "".join(chunk_texts), history)
+
+    telegram_status = dispatch_telegram_status(user_message, rag_data)
+    if telegram_status:
+        yield "telegram", telegram_status
+
+async def _call_tool(name: str, args: dict, deadline: Deadline) -> str:
+    if name == "fetch_external_data_from_rag":
+        rag_tipe = args.get("rag_tipe") if args.get("rag_tipe") in chat_backend.RAG_CACHE_TTL else "detail"
+        return await fetch_external_data_from_rag(str(args.get("rag_query", "")), rag_tipe, deadline)
+    if name == "send_telegram_notification":
+        # Sama seperti router kata kunci: dikirim di latar belakang, tidak ditunggu
+        task = asyncio.create_task(send_telegram_notification(str(args.get("message", ""))))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        return "Notifikasi sedang dikirim di latar belakang."
+    return f"Error: tool '{name}' tidak dikenal."
+
+async def tool_loop_events(user_message: str, history, deadline: Deadline, session=None):
+    """
+    Versi async dari app.tool_loop_events (CHAT_TOOL_ROUTING=function_calling).
+    Panggilan tool dalam satu giliran model dijalankan bersamaan dengan asyncio.gather.
+    """
+    last_products = chat_backend.conversation_store.last_products(session)[0] if session is not None else ()
+    contents = chat_backend.build_tool_contents(user_message, history, last_products)
+    chunk_texts, telegram_statuses, cache_context = [], [], None
+    start, total_usage = time.perf_counter(), None
+    gemini_model = chat_backend.get_gemini_model(chat_backend.TOOL_SYSTEM_PROMPT)
+
+    for iteration in range(chat_backend.GEMINI_MAX_TOOL_ITERATIONS + 1):
+        force_answer = iteration >= chat_backend.GEMINI_MAX_TOOL_ITERATIONS
+        calls, call_parts, usage = [], [], None
+        with span("gemini"):
+            gemini_stream = await gemini_model.generate_content_async(
+                contents, stream=True, tools=chat_backend.GEMINI_TOOLS,
+                tool_config=chat_backend._TOOL_CONFIG_ANSWER_ONLY if force_answer else None,
+                request_options={"timeout": deadline.timeout()},
+            )
+            async for chunk in gemini_stream:
+                usage = chat_backend.gemini_usage(chunk) or usage
+                if not chunk.candidates:
+                    continue
+                for part in chunk.candidates[0].content.parts:
+                    if "function_call" in part:
+                        calls.append((part.function_call.name, dict(part.function_call.args)))
+                        call_parts.append(part)
+                    elif part.text:
+                        if not chunk_texts:
+                            observe_stage("gemini_first_chunk", time.perf_counter() - start)
+                        chunk_texts.append(part.text)
+                        yield "chunk", part.text
+        if usage is not None:
+            total_usage = tuple(map(sum, zip(total_usage or (0, 0), usage)))
+        if not calls:
+            break
+        logger.debug("Gemini memanggil tool (putaran %d): %s", iteration + 1, calls)
+
+        with span("tool_calls"):
+            results = await asyncio.gather(*(_call_tool(name, args, deadline) for name, args in calls))
+        chat_backend.remember_tool_products(session, calls, results)
+        telegram_statuses.extend(result for (name, _), result in zip(calls, results) if name == "send_telegram_notification")
+        contents.append(chat_backend.genai.protos.Content(role="model", parts=call_parts))
+        contents.append(chat_backend._tool_response_content(calls, results))
+
+        if iteration == 0:
+            cache_context = chat_backend._tool_cache_context(calls, results)
+            cached_response = chat_backend.response_cache.get(user_message, cache_context, chat_backend.TOOL_SYSTEM_PROMPT) if cache_context else None
+            if cached_response is not None:
+                chat_backend.record_gemini_usage(total_usage)
+                yield "chunk", cached_response
+                return
+
+    chat_backend.record_gemini_usage(total_usage)
+    if cache_context and chunk_texts and not telegram_statuses:
+        chat_backend.response_cache.set(user_message, cache_context, chat_backend.TOOL_SYSTEM_PROMPT, "".join(chunk_texts))
+    for status in telegram_statuses:
+        yield "telegram", f"Status Notifikasi Telegram: {status}"
+
+def chat_events(user_message: str, history, deadline: Deadline, session):
+    if chat_backend.CHAT_TOOL_ROUTING == "function_calling":
+        return tool_loop_events(user_message, history, deadline, session)
+    return keyword_router_events(user_message, history, deadline, session)
+
+@app.route('/chat', methods=['POST'])
+async def chat():
+    payload = await request.get_json()
+    user_message = payload.get('message')
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    logger.info("Menerima pesan dari Frontend: '%s'", user_message)
+    deadline = Deadline(chat_backend.CHAT_REQUEST_BUDGET)
+    session_id, session = chat_backend.open_session(payload.get('session_id') or request.headers.get(chat_backend.SESSION_HEADER))
+    history = chat_backend.conversation_store.history(session)
+    session_headers = {chat_backend.SESSION_HEADER: session_id}
+
+    try:
+        chunk_texts, telegram_statuses = [], []
+        async for event_type, text in chat_events(user_message, history, deadline, session):
+            (chunk_texts if event_type == "chunk" else telegram_statuses).append(text)
+        chatbot_response = "".join(chunk_texts)
+        chat_backend.conversation_store.append_turn(session, user_message, chatbot_response)
+
+        if telegram_statuses:
+            final_response = f"{chatbot_response} <br /><br />{'<br />'.join(telegram_statuses)}"
+        else:
+            final_response = chatbot_response
+
+        return jsonify({"response": final_response, "session_id": session_id}), 200, session_headers
+
+    except DeadlineExceeded as e:
+        logger.warning("Batas waktu terlampaui saat memproses pesan: %s", e)
+        return jsonify({"error": f"Maaf, chatbot tidak dapat menjawab dalam batas waktu: {e}"}), 504, session_headers
+    except Exception as e:
+        logger.exception("Error saat memproses pesan: %s", e)
+        return jsonify({"error": f"Maaf, terjadi kesalahan internal pada chatbot: {e}"}), 500, session_headers
+
+@app.route('/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Versi async dari /chat/stream (format event NDJSON yang sama dengan app.py)."""
+    payload = await request.get_json()
+    user_message = payload.get('message')
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    logger.info("Menerima pesan (stream) dari Frontend: '%s'", user_message)
+    deadline = Deadline(chat_backend.CHAT_REQUEST_BUDGET)
+    request_id = get_request_id()
+    session_id, session = chat_backend.open_session(payload.get('session_id') or request.headers.get(chat_backend.SESSION_HEADER))
+    history = chat_backend.conversation_store.history(session)
+
+    async def generate():
+        set_request_id(request_id)
+        try:
+            chunk_texts = []
+            async for event_type, text in chat_events(user_message, history, deadline, session):
+                if event_type == "chunk":
+                    chunk_texts.append(text)
+                yield chat_backend._ndjson_event(event_type, text=text)
+            chat_backend.conversation_store.append_turn(session, user_message, "".join(chunk_texts))
+
+            yield chat_backend._ndjson_event("done")
+        except Exception as e:
+            logger.exception("Error saat memproses pesan (stream): %s", e)
+            yield chat_backend._ndjson_event("error", error=f"Maaf, terjadi kesalahan internal pada chatbot: {e}")
+
+    return Response(
+        generate(),
+        mimetype='application/x-ndjson',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", chat_backend.SESSION_HEADER: session_id},
+    )
+
+if __name__ == '__main__':
+    print("Memulai App Backend Chatbot (asyncio / ASGI) di http://127.0.0.1:5000")
+    print("Pastikan MCP Server RAG (port 5001) dan MCP Server Telegram (port 5002) berjalan.")
+    app.run(port=5000)
@@ -0,0 +1,23 @@
+"""
+Helper bersama skrip benchmark: memuat service yang nama filenya mengandung
+tanda hubung (mcp-server-rag.py, mcp-server-notification.py) sebagai modul.
+"""
+import importlib.util
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_server_module(filename: str, module_name: str | None = None):
+    """
+    Memuat <REPO_ROOT>/<filename> sebagai modul dan mendaftarkannya di sys.modules.
+    module_name default: nama file tanpa .py dengan '-' diganti '_' (misalnya mcp_server_rag).
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    module_name = module_name or os.path.splitext(filename)[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,80 @@
+"""
+Benchmark impor katalog MCP Server RAG (import_catalog).
+
+Membuat file katalog CSV sintetis, lalu mengukur:
+- impor awal ke database kosong,
+- impor ulang file yang sama (tidak ada perubahan, semua baris dilewati),
+- impor ulang dengan sebagian kecil produk berubah dan beberapa produk baru
+  (pola pembaruan katalog harian).
+
+Cara menjalankan (dari root repository):
+    python benchmark/bench_catalog_import.py
+    python benchmark/bench_catalog_import.py --rows 1000000 --changed-ratio 0.01
+"""
+import argparse
+import contextlib
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from _servers import load_server_module
+
+def load_rag_server(database_file: str):
+    os.environ["RAG_DATABASE_FILE"] = database_file
+    return load_server_module("mcp-server-rag.py")
+
+def write_catalog(path: str, rows: int, seed: int, changed_ratio: float = 0.0, new_rows: int = 0):
+    rng = random.Random(seed)
+    change_rng = random.Random(seed + 1)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["product_code", "name", "price", "stock", "description"])
+        for i in range(rows + new_rows):
+            price = round(rng.uniform(10, 20000), 2)
+            stock = rng.randint(0, 500)
+            if i >= rows or change_rng.random() < changed_ratio:
+                stock += 1
+            writer.writerow([
+                f"SKU{i:07d}",
+                f"Barang {i:07d}",
+                price,
+                stock,
+                f"Barang {i:07d} adalah produk dengan garansi {i % 3 + 1} tahun.",
+            ])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--changed-ratio", type=float, default=0.01, help="porsi produk yang berubah pada impor ketiga")
+    parser.add_argument("--new-rows", type=int, default=1000, help="jumlah produk baru pada impor ketiga")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = load_rag_server(os.path.join(tmp, "catalog.db"))
+        base_csv = os.path.join(tmp, "catalog.csv")
+        update_csv = os.path.join(tmp, "catalog_update.csv")
+        write_catalog(base_csv, args.rows, args.seed)
+        write_catalog(update_csv, args.rows, args.seed, args.changed_ratio, args.new_rows)
+
+        print(f"{'skenario':<32} | {'detik':>8} | {'baris':>9} | {'berubah':>9} | {'baris/detik':>11}")
+        print("-" * 83)
+        for path, label in ((base_csv, "impor awal (database kosong)"),
+                            (base_csv, "impor ulang tanpa perubahan"),
+                            (update_csv, "impor ulang dengan perubahan")):
+            # Output per chunk dari import_catalog tidak relevan untuk tabel benchmark
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                stats = rag.import_catalog(path, chunk_size=args.chunk_size)
+                elapsed = time.perf_counter() - start
+            print(f"{label:<32} | {elapsed:>8.2f} | {stats['rows']:>9} | {stats['changed']:>9} | {stats['rows'] / elapsed:>11,.0f}")
+
+if __name__ == "__main__":
+    main()
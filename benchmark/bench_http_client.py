@@ -0,0 +1,143 @@
+"""
+Benchmark klien HTTP App Backend -> MCP Server RAG (http_client.py).
+
+Skenario:
+- up:   --calls lookup RAG berurutan ke MCP Server RAG sungguhan (mode --production,
+        gunicorn dengan keep-alive), sekali dengan requests.post per panggilan (koneksi
+        TCP baru setiap kali) dan sekali dengan ServiceClient (session + pool keep-alive).
+- down: server RAG "macet" (menerima koneksi tetapi tidak pernah menjawab), seperti
+        server yang hang. Setiap chat tanpa circuit breaker menunggu sampai timeout baca;
+        dengan circuit breaker hanya --breaker-failures panggilan pertama yang menunggu,
+        sisanya langsung ditolak.
+
+Cara menjalankan (dari root repository):
+    python benchmark/bench_http_client.py --calls 500
+    python benchmark/bench_http_client.py --down-calls 20 --read-timeout 2
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from deadline import Deadline
+from http_client import CircuitBreaker, ServiceClient
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_rag_server(port: int, database_file: str) -> subprocess.Popen:
+    env = {**os.environ, "RAG_DATABASE_FILE": database_file, "LOG_LEVEL": "WARNING"}
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, "mcp-server-rag.py"), "--production",
+         "--bind", f"127.0.0.1:{port}", "--workers", "1", "--threads", "4"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/readyz", timeout=1).ok:
+                return process
+        except requests.exceptions.ConnectionError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("MCP Server RAG tidak siap.")
+
+def summarize(label: str, durations: list[float]):
+    durations = sorted(durations)
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(f"   {label:<28} n={len(durations):<5} mean {statistics.mean(durations) * 1000:8.2f} ms   "
+          f"p95 {p95 * 1000:8.2f} ms   total {sum(durations):7.2f} s")
+
+def bench_up(calls: int):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        process = start_rag_server(port, os.path.join(tmp, "rag.db"))
+        try:
+            url = f"http://127.0.0.1:{port}/rag_query"
+            payload = {"query": "Produk A", "tipe": "harga"}
+            client = ServiceClient("rag", connect_timeout=1, read_timeout=10)
+
+            plain, pooled = [], []
+            for _ in range(calls):
+                start = time.perf_counter()
+                requests.post(url, json=payload, timeout=10).raise_for_status()
+                plain.append(time.perf_counter() - start)
+            for _ in range(calls):
+                start = time.perf_counter()
+                client.post(url, json=payload)
+                pooled.append(time.perf_counter() - start)
+        finally:
+            process.terminate()
+            process.wait()
+
+    print("== up: lookup RAG berurutan")
+    summarize("requests.post (tanpa pool)", plain)
+    summarize("ServiceClient (keep-alive)", pooled)
+
+def start_hung_server() -> tuple[socket.socket, int]:
+    """Server TCP yang menerima koneksi tetapi tidak pernah mengirim jawaban."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(128)
+    accepted = []
+
+    def accept_forever():
+        while True:
+            try:
+                accepted.append(server.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept_forever, daemon=True).start()
+    return server, server.getsockname()[1]
+
+def bench_down(calls: int, read_timeout: float, breaker_failures: int):
+    server, port = start_hung_server()
+    url = f"http://127.0.0.1:{port}/rag_query"
+    print(f"== down: server RAG macet, timeout baca {read_timeout:g} s")
+    try:
+        for label, failures in (("tanpa circuit breaker", 0), (f"circuit breaker ({breaker_failures} gagal)", breaker_failures)):
+            client = ServiceClient(
+                "rag", connect_timeout=1, read_timeout=read_timeout, retries=2,
+                breaker=CircuitBreaker("rag", failures, reset_timeout=60),
+            )
+            durations = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                try:
+                    client.post(url, Deadline(20), json={"query": "Produk A", "tipe": "harga"})
+                except requests.exceptions.RequestException:
+                    pass
+                durations.append(time.perf_counter() - start)
+            summarize(label, durations)
+    finally:
+        server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500, help="Jumlah lookup per varian pada skenario up.")
+    parser.add_argument("--down-calls", type=int, default=20, help="Jumlah panggilan per varian pada skenario down.")
+    parser.add_argument("--read-timeout", type=float, default=2.0, help="Timeout baca pada skenario down (detik).")
+    parser.add_argument("--breaker-failures", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="+", choices=("up", "down"), default=["up", "down"])
+    args = parser.parse_args()
+
+    if "up" in args.scenarios:
+        bench_up(args.calls)
+    if "down" in args.scenarios:
+        bench_down(args.down_calls, args.read_timeout, args.breaker_failures)
+
+if __name__ == "__main__":
+    main()
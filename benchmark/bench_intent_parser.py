@@ -0,0 +1,112 @@
+"""
+Micro-benchmark ekstraksi intent/produk di App Backend.
+
+Membandingkan heuristik lama (regex dikompilasi ulang di setiap request, hanya
+kata pertama setelah kata kunci yang diambil) dengan extract_rag_query() yang
+memakai regex pra-kompilasi dan pencocok produk berbasis trie atas katalog.
+
+Cara menjalankan (dari root repository):
+    python benchmark/bench_intent_parser.py
+    python benchmark/bench_intent_parser.py --catalog-size 100000 --iterations 20000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+QUESTIONS = [
+    "berapa harga Produk A?",
+    "berapa sisa laptop gaming x kirim telegram",
+    "jelaskan headphone wireless pro",
+    "apa itu SMARTZ",
+    "stok smartphone z dan produk a",
+    "halo, selamat pagi",
+    "detail barang {n} tolong kirim ke telegram",
+    "harga barang {n}",
+]
+
+def legacy_extract_rag_query(user_question: str) -> tuple[str, str]:
+    """Salinan heuristik sebelum parser pra-kompilasi (sebagai pembanding)."""
+    query_lower = user_question.lower()
+    telegram_keywords = ["kirim telegram", "send telegram", "segeranotif", "telegram", "kirim notifikasi", "kirim ke"]
+    cleaned_query_lower = query_lower
+    for keyword in telegram_keywords:
+        cleaned_query_lower = re.sub(r'\b' + re.escape(keyword) + r'\b', ' ', cleaned_query_lower).strip()
+    cleaned_query_lower = ' '.join(cleaned_query_lower.split())
+
+    rag_query_for_rag_server = ""
+    rag_tipe_for_rag_server = "detail"
+    primary_rag_keywords = {
+        "berapa sisa": "stok", "berapa harga": "harga", "harga": "harga", "stok": "stok",
+        "jelaskan": "detail", "apa itu": "detail", "detail": "detail", "nama produk": "detail",
+    }
+    found_keyword_phrase = ""
+    for phrase, base_term in sorted(primary_rag_keywords.items(), key=lambda item: len(item[0]), reverse=True):
+        if re.search(r'\b' + re.escape(phrase) + r'\b', cleaned_query_lower):
+            rag_tipe_for_rag_server = base_term
+            found_keyword_phrase = phrase
+            break
+
+    if found_keyword_phrase:
+        keyword_match_obj = re.search(r'\b' + re.escape(found_keyword_phrase) + r'\b', cleaned_query_lower)
+        if keyword_match_obj:
+            remaining_query_after_keyword = cleaned_query_lower[keyword_match_obj.end():].strip()
+            product_match = re.match(r"^([\w\s]+?)(?:[\s,.;!?'\"]|$)", remaining_query_after_keyword)
+            if product_match and product_match.group(1).strip():
+                rag_query_for_rag_server = product_match.group(1).strip()
+    else:
+        product_match_general = re.match(r"^([\w\s]+?)(?:[\s,.;!?'\"]|$)", cleaned_query_lower)
+        if product_match_general and product_match_general.group(1).strip():
+            rag_query_for_rag_server = product_match_general.group(1).strip()
+    return rag_query_for_rag_server, rag_tipe_for_rag_server
+
+def sample_catalog(size: int):
+    products = [
+        ("PROD001", "Produk A"), ("LAPTOPX", "Laptop Gaming X"),
+        ("SMARTZ", "Smartphone Z"), ("HPWPRO", "Headphone Wireless Pro"),
+    ]
+    products += [(f"SKU{i:07d}", f"Barang {i}") for i in range(size)]
+    return products
+
+def bench(func, questions) -> float:
+    start = time.perf_counter()
+    for question in questions:
+        func(question)
+    return (time.perf_counter() - start) / len(questions) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog-size", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    import app as chat_backend
+    from product_matcher import ProductMatcher
+
+    start = time.perf_counter()
+    chat_backend.product_matcher = ProductMatcher(sample_catalog(args.catalog_size), version=0)
+    build_ms = (time.perf_counter() - start) * 1000
+    # Jangan memuat katalog dari server RAG selama benchmark
+    chat_backend._catalog_next_check = float("inf")
+
+    rng = random.Random(42)
+    questions = [rng.choice(QUESTIONS).format(n=rng.randrange(args.catalog_size)) for _ in range(args.iterations)]
+
+    print(f"Katalog: {chat_backend.product_matcher.size} produk, pencocok dibangun dalam {build_ms:.0f} ms")
+    print(f"{'metode':<34} | {'us/pertanyaan':>13}")
+    print("-" * 50)
+    print(f"{'heuristik lama (regex per request)':<34} | {bench(legacy_extract_rag_query, questions):>13.2f}")
+    print(f"{'extract_rag_query (pra-kompilasi)':<34} | {bench(chat_backend.extract_rag_query, questions):>13.2f}")
+
+    print("\nContoh hasil (lama -> baru):")
+    for question in QUESTIONS[:6]:
+        print(f"  {question!r}: {legacy_extract_rag_query(question)} -> {chat_backend.extract_rag_query(question)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark offline ukuran prompt Gemini per request (router kata kunci).
+
+Membandingkan prompt lama (peran LLM + riwayat + konteks + pertanyaan + instruksi
+tetap ~2 KB, semuanya dikirim di setiap prompt) dengan prompt baru (hanya riwayat,
+konteks dan pertanyaan; peran dan instruksi ada di system instruction model).
+
+Per varian dicetak:
+- ukuran prompt per request (karakter dan perkiraan token, ~4 karakter per token),
+- perkiraan token input total (system instruction juga dihitung sebagai token input Gemini),
+- ukuran GenerateContentRequest yang diserialisasi (byte di jaringan),
+- waktu menyusun + menyerialisasi request (latensi lokal, tanpa memanggil Gemini).
+
+Dengan --prefill-ms-per-1k-tokens, perkiraan waktu prefill model (sebanding dengan
+token input) ikut dicetak. Tidak ada panggilan jaringan; jumlah token sebenarnya
+dari Gemini tercatat di /metrics (chatbot_gemini_tokens) saat service berjalan.
+
+Cara menjalankan (dari root repository):
+    python benchmark/bench_prompt_size.py
+    python benchmark/bench_prompt_size.py --history-turns 3 --iterations 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+os.environ.setdefault("GEMINI_BACKEND", "stub")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import app as chat_backend
+from conversation_store import estimate_tokens
+
+genai = chat_backend.genai
+
+# (pertanyaan, konteks RAG, tipe RAG)
+REQUESTS = [
+    ("berapa harga Produk A?", "Harga Produk A adalah $1200.00.", "harga"),
+    ("berapa sisa laptop gaming x kirim telegram", "Stok Laptop Gaming X saat ini tersedia 15 unit.", "stok"),
+    ("jelaskan headphone wireless pro", "Detail Headphone Wireless Pro: headphone nirkabel dengan peredam bising aktif.", "detail"),
+    ("harga barang 042", "Tidak ada data relevan ditemukan.", "harga"),
+    ("halo, selamat pagi", "Tidak ada data relevan ditemukan.", "general"),
+]
+
+# Salinan instruksi tetap sebelum dipindah ke system instruction (sebagai pembanding)
+LEGACY_LLM_INSTRUCTION = (
+    "INSTRUKSI:\n" # Instruksi untuk menjawab
+    "Anda adalah asisten yang ramah, informatif, dan ringkas. "
+    "Berdasarkan KONTEKS DATABASE yang diberikan, jawab pertanyaan pengguna secara langsung, ringkas, dan informatif. "
+    "Jika KONTEKS DATABASE berisi data yang valid (bukan pesan 'Tidak ada data relevan ditemukan.' atau error), Anda HARUS menggunakan data tersebut sebagai jawaban utama Anda. "
+    "Contoh: 'Harga Produk A adalah $1200.00.' atau 'Stok Laptop Gaming X saat ini tersedia 15 unit.' atau 'Detail Produk A: Produk A adalah barang elektronik berkualitas tinggi.' "
+    "Jika KONTEKS DATABASE menyatakan 'Tidak ada data relevan ditemukan.' atau berisi pesan error, Anda HARUS menjawab dengan: 'Maaf, saya tidak menemukan informasi tentang produk tersebut di database kami. Apakah ada hal lain yang bisa saya bantu?' "
+    "JANGAN PERNAH mengarang informasi produk jika tidak ada di KONTEKS DATABASE. "
+    "JANGAN PERNAH menghasilkan placeholder atau teks seperti '{answer}', '{jawaban}', atau sejenisnya. Berikan jawaban yang lengkap dan langsung. "
+    "Jika pertanyaan pengguna juga berisi instruksi terkait 'telegram' (misalnya 'kirim ke telegram', 'send telegram', 'kirim notifikasi'), Anda **HARUS mengabaikan instruksi 'telegram' tersebut dalam jawaban utama Anda** dan fokus HANYA pada penyediaan informasi produk berdasarkan KONTEKS DATABASE. Informasi terkait Telegram akan ditangani secara terpisah oleh sistem."
+    "Jika pertanyaan tidak terkait produk atau tidak memerlukan KONTEKS DATABASE, jawablah berdasarkan pengetahuan umum Anda. "
+    "Selalu berikan jawaban yang ramah dan membantu."
+)
+
+def legacy_build_full_prompt(user_message: str, rag_context_string: str, rag_tipe: str, history=None) -> str:
+    """Salinan penyusun prompt sebelum system instruction (sebagai pembanding)."""
+    prompt_parts = [
+        chat_backend.get_llm_role_from_rag_type(rag_tipe),
+        chat_backend.format_history(history),
+        f"KONTEKS DATABASE:\n{rag_context_string}",
+        f"PERTANYAAN PENGGUNA:\n{user_message}",
+        LEGACY_LLM_INSTRUCTION,
+    ]
+    return "\n\n".join(filter(None, prompt_parts))
+
+def build_request(prompt: str, system_instruction: str | None) -> bytes:
+    """GenerateContentRequest seperti yang dikirim SDK, diserialisasi ke byte."""
+    request = genai.protos.GenerateContentRequest(
+        model=f"models/{chat_backend.GEMINI_MODEL_NAME}",
+        contents=[genai.protos.Content(role="user", parts=[genai.protos.Part(text=prompt)])],
+    )
+    if system_instruction:
+        request.system_instruction = genai.protos.Content(parts=[genai.protos.Part(text=system_instruction)])
+    return type(request).serialize(request)
+
+def legacy_request(question, context, tipe, history) -> tuple[str, str | None, bytes]:
+    prompt = legacy_build_full_prompt(question, context, tipe, history)
+    return prompt, None, build_request(prompt, None)
+
+def system_instruction_request(question, context, tipe, history) -> tuple[str, str | None, bytes]:
+    system_instruction = chat_backend.system_instruction_for(tipe)
+    prompt = chat_backend.build_full_prompt(question, context, history)
+    return prompt, system_instruction, build_request(prompt, system_instruction)
+
+def measure(label: str, build, history, iterations: int, prefill_ms_per_1k: float | None):
+    prompt_chars, prompt_tokens, input_tokens, request_bytes = [], [], [], []
+    for question, context, tipe in REQUESTS:
+        prompt, system_instruction, payload = build(question, context, tipe, history)
+        prompt_chars.append(len(prompt))
+        prompt_tokens.append(estimate_tokens(prompt))
+        input_tokens.append(estimate_tokens((system_instruction or "") + prompt))
+        request_bytes.append(len(payload))
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        question, context, tipe = REQUESTS[i % len(REQUESTS)]
+        build(question, context, tipe, history)
+    build_us = (time.perf_counter() - start) / iterations * 1e6
+
+    print(f"   {label:<26} prompt {statistics.mean(prompt_chars):7.0f} karakter / {statistics.mean(prompt_tokens):5.0f} token   "
+          f"input total {statistics.mean(input_tokens):5.0f} token   request {statistics.mean(request_bytes):6.0f} B   "
+          f"susun {build_us:6.1f} us")
+    if prefill_ms_per_1k is not None:
+        print(f"   {'':<26} perkiraan prefill {statistics.mean(input_tokens) / 1000 * prefill_ms_per_1k:6.2f} ms per request")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10000, help="Jumlah prompt yang disusun per varian untuk pengukuran waktu.")
+    parser.add_argument("--history-turns", type=int, nargs="+", default=[0, 3], help="Panjang riwayat percakapan (giliran) yang diuji.")
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, help="Biaya prefill model per 1000 token input (ms), opsional.")
+    args = parser.parse_args()
+
+    for turns in args.history_turns:
+        history = [(f"berapa harga Produk {i}?", f"Harga Produk {i} adalah ${i}00.00.") for i in range(turns)]
+        print(f"== riwayat {turns} giliran")
+        measure("lama (instruksi di prompt)", legacy_request, history, args.iterations, args.prefill_ms_per_1k_tokens)
+        measure("system instruction", system_instruction_request, history, args.iterations, args.prefill_ms_per_1k_tokens)
+
+if __name__ == "__main__":
+    main()
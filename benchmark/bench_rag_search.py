@@ -0,0 +1,98 @@
+"""
+Benchmark latensi lookup produk di MCP Server RAG seiring bertambahnya ukuran katalog.
+
+Membandingkan pencarian lama (LIKE '%term%' = full table scan) dengan
+lookup_product() (jalur cepat kode/nama persis + indeks FTS5 trigram).
+
+Cara menjalankan (dari root repository):
+    python benchmark/bench_rag_search.py
+    python benchmark/bench_rag_search.py --sizes 1000 10000 100000 300000 --lookups 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from _servers import load_server_module
+
+WORDS = [
+    "laptop", "gaming", "smartphone", "headphone", "wireless", "pro", "ultra", "mini",
+    "kamera", "monitor", "keyboard", "mouse", "speaker", "tablet", "printer", "router",
+]
+
+def generate_products(count: int, rng: random.Random):
+    for i in range(count):
+        name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i:07d}"
+        yield (
+            f"SKU{i:07d}",
+            name,
+            round(rng.uniform(10, 20000), 2),
+            rng.randint(0, 500),
+            f"{name} adalah produk {rng.choice(WORDS)} dengan garansi {rng.randint(1, 3)} tahun.",
+        )
+
+def build_catalog(rag, path: str, count: int, seed: int):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    rag.create_schema(cursor)
+    cursor.executemany(
+        "INSERT INTO products (product_code, name, price, stock, description) VALUES (?, ?, ?, ?, ?)",
+        generate_products(count, random.Random(seed)),
+    )
+    conn.commit()
+    conn.close()
+
+def time_lookups(func, terms):
+    durations = []
+    for term in terms:
+        start = time.perf_counter()
+        func(term)
+        durations.append((time.perf_counter() - start) * 1e6)
+    durations.sort()
+    return statistics.mean(durations), durations[len(durations) // 2], durations[int(len(durations) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--lookups", type=int, default=200, help="jumlah lookup per ukuran katalog")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rag = load_server_module("mcp-server-rag.py")
+    rng = random.Random(args.seed)
+
+    print(f"{'produk':>9} | {'metode':<14} | {'mean (us)':>10} | {'p50 (us)':>10} | {'p95 (us)':>10}")
+    print("-" * 66)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"catalog_{size}.db")
+            build_catalog(rag, path, size, args.seed)
+            conn = sqlite3.connect(path)
+
+            # Campuran pola query nyata: kode persis, nama persis, dan potongan nama
+            ids = [rng.randrange(size) for _ in range(args.lookups)]
+            terms = []
+            for n, i in enumerate(ids):
+                code, name = conn.execute(
+                    "SELECT product_code, name FROM products WHERE id = ?", (i + 1,)
+                ).fetchone()
+                terms.append([code.lower(), name.lower(), name.lower().split(" ", 1)[1]][n % 3])
+
+            def legacy_lookup(term):
+                pattern = "%" + term + "%"
+                return conn.execute(rag.SQL_LOOKUP_LIKE, (pattern, pattern)).fetchone()
+
+            def indexed_lookup(term):
+                return rag.lookup_product(conn, term)
+
+            for label, func in (("LIKE scan", legacy_lookup), ("FTS5/exact", indexed_lookup)):
+                mean, p50, p95 = time_lookups(func, terms)
+                print(f"{size:>9} | {label:<14} | {mean:>10.1f} | {p50:>10.1f} | {p95:>10.1f}")
+            conn.close()
+
+if __name__ == "__main__":
+    main()
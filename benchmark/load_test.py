@@ -0,0 +1,347 @@
+"""
+Load test pipeline tiga service (App Backend -> MCP Server RAG / Notification)
+dengan Gemini dan Telegram diganti backend stub lokal (stub_backends.py),
+sehingga tidak memerlukan GEMINI_API_KEY maupun bot Telegram.
+
+Skrip ini:
+- membuat katalog sementara berisi --products produk dan menjalankan ketiga
+  service sebagai proses terpisah di port bebas (GEMINI_BACKEND=stub,
+  TELEGRAM_BACKEND=stub, latensi stub dari --gemini-latency / --telegram-latency),
+- untuk setiap skenario (price, stock, detail, telegram-forward, no-product)
+  mengirim --requests chat ke POST /chat dengan --concurrency request bersamaan,
+- melaporkan RPS, error rate, latensi end-to-end (p50/p95/p99, diukur di klien)
+  dan p50/p95/p99 per tahap dari histogram GET /metrics setiap service
+  (selisih sebelum dan sesudah skenario; nilai per tahap adalah estimasi
+  dari batas bucket histogram, seperti histogram_quantile di Prometheus).
+
+Cache jawaban Gemini dimatikan secara default agar setiap chat benar-benar
+melewati tahap Gemini; aktifkan dengan --response-cache.
+
+Cara menjalankan (dari root repository):
+    python benchmark/load_test.py --requests 300 --concurrency 16
+    python benchmark/load_test.py --backend async --scenarios price telegram-forward
+    python benchmark/load_test.py --output hasil.json
+    python benchmark/load_test.py --baseline hasil.json --max-regression 0.25
+Dengan --baseline, exit code 1 jika p95 end-to-end naik, RPS turun lebih dari
+--max-regression, atau error rate naik lebih dari 1 poin persen dibanding baseline.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from _servers import load_server_module
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Skenario -> template pertanyaan; {name} diganti nama produk katalog uji
+SCENARIOS = {
+    "price": "berapa harga {name}?",
+    "stock": "stok {name} masih ada?",
+    "detail": "jelaskan {name}",
+    "telegram-forward": "harga {name} kirim telegram",
+    "no-product": "halo, jam berapa toko buka hari ini?",
+}
+PERCENTILES = (50, 95, 99)
+STAGE_METRIC = "chatbot_stage_duration_seconds"
+_BUCKET_LINE = re.compile(r'^' + STAGE_METRIC + r'_bucket\{stage="([^"]*)",outcome="([^"]*)",le="([^"]*)"\} (\d+)$')
+
+def product_name(i: int) -> str:
+    return f"Barang Uji {i:04d}"
+
+# --- Menjalankan service (dipanggil di proses anak dengan --serve) ---
+
+def serve(service: str, port: int):
+    if service == "backend-async":
+        import asyncio
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+        sys.path.insert(0, REPO_ROOT)
+        import app_async
+        config = Config()
+        config.bind = [f"127.0.0.1:{port}"]
+        config.accesslog = None
+        asyncio.run(hypercorn_serve(app_async.app, config))
+        return
+
+    from werkzeug.serving import make_server
+    filename = {"rag": "mcp-server-rag.py", "notification": "mcp-server-notification.py", "backend": "app.py"}[service]
+    module = load_server_module(filename)
+    if service == "notification":
+        module.notification_queue.start()
+    make_server("127.0.0.1", port, module.app, threaded=True).serve_forever()
+
+# --- Proses induk ---
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def prepare_catalog(tmp: str, products: int) -> str:
+    database_file = os.path.join(tmp, "rag.db")
+    catalog_file = os.path.join(tmp, "catalog.jsonl")
+    with open(catalog_file, "w", encoding="utf-8") as f:
+        for i in range(products):
+            f.write(json.dumps({
+                "product_code": f"LOAD{i:04d}",
+                "name": product_name(i),
+                "price": 1000 + i,
+                "stock": i % 50,
+                "description": f"{product_name(i)} adalah barang uji untuk load test dengan garansi {1 + i % 3} tahun.",
+            }) + "\n")
+    os.environ["RAG_DATABASE_FILE"] = database_file
+    rag = load_server_module("mcp-server-rag.py")
+    rag.init_db()
+    rag.import_catalog(catalog_file)
+    return database_file
+
+class Services:
+    """Ketiga service sebagai proses anak; log masing-masing ditulis ke file di direktori sementara."""
+
+    def __init__(self, tmp: str, args):
+        self.tmp = tmp
+        self.ports = {"rag": free_port(), "notification": free_port(), "backend": free_port()}
+        self.urls = {name: f"http://127.0.0.1:{port}" for name, port in self.ports.items()}
+        self.env = {
+            **os.environ,
+            "RAG_DATABASE_FILE": os.path.join(tmp, "rag.db"),
+            "RAG_SERVER_URL": self.urls["rag"] + "/rag_query",
+            "TELEGRAM_NOTIFICATION_SERVER_URL": self.urls["notification"] + "/send_notification",
+            "GEMINI_BACKEND": "stub",
+            "GEMINI_STUB_LATENCY": args.gemini_latency,
+            "TELEGRAM_BACKEND": "stub",
+            "TELEGRAM_STUB_LATENCY": args.telegram_latency,
+            "TELEGRAM_CHAT_ID": "1000",
+            "NOTIFICATION_QUEUE_FILE": os.path.join(tmp, "notification_queue.db"),
+            "LOG_LEVEL": args.log_level,
+            "PYTHONUNBUFFERED": "1",
+        }
+        if not args.response_cache:
+            self.env["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+        self.backend_kind = "backend-async" if args.backend == "async" else "backend"
+        self.processes = {}
+
+    def start(self):
+        for name in ("rag", "notification", "backend"):
+            kind = self.backend_kind if name == "backend" else name
+            log = open(os.path.join(self.tmp, f"{name}.log"), "w")
+            self.processes[name] = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--serve", kind, "--port", str(self.ports[name])],
+                env=self.env, stdout=log, stderr=subprocess.STDOUT, cwd=self.tmp,
+            )
+        deadline = time.monotonic() + 30
+        for name, url in self.urls.items():
+            while True:
+                if self.processes[name].poll() is not None:
+                    raise RuntimeError(f"Service {name} berhenti saat start:\n{self.log_tail(name)}")
+                try:
+                    if requests.get(url + "/metrics", timeout=1).status_code == 200:
+                        break
+                except requests.exceptions.RequestException:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Service {name} tidak siap dalam 30 detik:\n{self.log_tail(name)}")
+                time.sleep(0.1)
+
+    def log_tail(self, name: str, lines: int = 20) -> str:
+        with open(os.path.join(self.tmp, f"{name}.log")) as f:
+            return "".join(f.readlines()[-lines:])
+
+    def stop(self):
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def stage_buckets(self) -> dict:
+        """(service, stage) -> {batas bucket: jumlah kumulatif} dari GET /metrics semua service."""
+        buckets = {}
+        for name, url in self.urls.items():
+            for line in requests.get(url + "/metrics", timeout=10).text.splitlines():
+                match = _BUCKET_LINE.match(line)
+                if match:
+                    stage, _, le, count = match.groups()
+                    series = buckets.setdefault((name, stage), {})
+                    bound = float("inf") if le == "+Inf" else float(le)
+                    series[bound] = series.get(bound, 0) + int(count)
+        return buckets
+
+    def wait_notifications_drained(self, timeout: float = 60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            stats = requests.get(self.urls["notification"] + "/notifications/stats", timeout=10).json()
+            if stats["pending"] + stats["sending"] == 0:
+                return
+            time.sleep(0.2)
+
+def histogram_quantile(q: float, buckets: dict) -> float | None:
+    """Estimasi kuantil dari bucket kumulatif dengan interpolasi linear (seperti Prometheus)."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if total == 0:
+        return None
+    rank = q * total
+    previous_bound, previous_count = 0.0, 0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def run_scenario(services: Services, scenario: str, args) -> dict:
+    chat_url = services.urls["backend"] + "/chat"
+    template = SCENARIOS[scenario]
+    local = threading.local()
+
+    def one_chat(i: int):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        message = template.format(name=product_name(i % args.products))
+        start = time.perf_counter()
+        try:
+            response = session.post(chat_url, json={"message": message}, timeout=60)
+            body = response.json()
+            ok = response.status_code == 200 and "error" not in body
+            if ok and scenario == "telegram-forward":
+                ok = "Status Notifikasi Telegram" in body["response"] and "Gagal" not in body["response"]
+        except (requests.exceptions.RequestException, ValueError):
+            ok = False
+        return ok, time.perf_counter() - start
+
+    # Pemanasan: pencocok produk di backend memuat katalog dan koneksi terbuka
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one_chat, range(args.warmup)))
+    services.wait_notifications_drained()
+
+    before = services.stage_buckets()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one_chat, range(args.warmup, args.warmup + args.requests)))
+    elapsed = time.perf_counter() - start
+    # Tahap telegram_send berjalan di worker antrean setelah jawaban chat dikirim
+    services.wait_notifications_drained()
+    after = services.stage_buckets()
+
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(not ok for ok, _ in results)
+    report = {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4),
+        "rps": round(len(results) / elapsed, 2),
+        "latency_ms": {"e2e": {f"p{p}": round(percentile(latencies, p) * 1000, 1) for p in PERCENTILES}},
+    }
+    for (service, stage), series in sorted(after.items()):
+        delta = {bound: count - before.get((service, stage), {}).get(bound, 0) for bound, count in series.items()}
+        count = delta.get(float("inf"), 0)
+        if count == 0:
+            continue
+        report["latency_ms"][f"{service}.{stage}"] = {
+            "count": count,
+            **{f"p{p}": round(histogram_quantile(p / 100, delta) * 1000, 1) for p in PERCENTILES},
+        }
+    return report
+
+def print_report(results: dict):
+    for scenario, report in results.items():
+        print(f"\n== {scenario}: {report['requests']} request, {report['rps']} RPS, error rate {report['error_rate'] * 100:.1f}%")
+        print(f"   {'tahap':<34}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, values in report["latency_ms"].items():
+            print(f"   {stage:<34}{values.get('count', report['requests']):>7}"
+                  + "".join(f"{values[f'p{p}']:>10.1f}" for p in PERCENTILES))
+
+def compare_with_baseline(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    regressions = []
+    for scenario, report in results.items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if base is None:
+            continue
+        p95, base_p95 = report["latency_ms"]["e2e"]["p95"], base["latency_ms"]["e2e"]["p95"]
+        if p95 > base_p95 * (1 + max_regression):
+            regressions.append(f"{scenario}: p95 end-to-end {base_p95} ms -> {p95} ms")
+        if report["rps"] < base["rps"] * (1 - max_regression):
+            regressions.append(f"{scenario}: RPS {base['rps']} -> {report['rps']}")
+        if report["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{scenario}: error rate {base['error_rate']} -> {report['error_rate']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300, help="Jumlah chat per skenario (di luar pemanasan).")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--products", type=int, default=1000, help="Jumlah produk di katalog uji.")
+    parser.add_argument("--backend", choices=("sync", "async"), default="sync", help="app.py (Flask) atau app_async.py (ASGI).")
+    parser.add_argument("--gemini-latency", default="0.3-0.8", help='Latensi stub Gemini (detik), misalnya "0.5" atau "0.3-0.8".')
+    parser.add_argument("--telegram-latency", default="0.05-0.15", help="Latensi stub Telegram (detik).")
+    parser.add_argument("--response-cache", action="store_true", help="Aktifkan cache jawaban Gemini.")
+    parser.add_argument("--log-level", default="WARNING", help="LOG_LEVEL untuk ketiga service.")
+    parser.add_argument("--output", help="Simpan hasil sebagai JSON (bisa dipakai sebagai --baseline).")
+    parser.add_argument("--baseline", help="File JSON hasil sebelumnya untuk dibandingkan.")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_catalog(tmp, args.products)
+        services = Services(tmp, args)
+        try:
+            services.start()
+            results = {}
+            for scenario in args.scenarios:
+                results[scenario] = run_scenario(services, scenario, args)
+        finally:
+            services.stop()
+
+    print_report(results)
+    output = {
+        "config": {key: getattr(args, key) for key in (
+            "requests", "concurrency", "products", "backend", "gemini_latency", "telegram_latency", "response_cache")},
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"\nHasil disimpan di {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nREGRESI dibanding baseline:")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print("\nTidak ada regresi dibanding baseline.")
+
+if __name__ == "__main__":
+    main()
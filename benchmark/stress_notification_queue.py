@@ -0,0 +1,144 @@
+"""
+Stress test antrean notifikasi Telegram (notification_queue.py) terhadap
+pengganti lokal Telegram Bot API (telegram_api_standin.py).
+
+Skrip ini menjalankan dalam satu proses:
+- pengganti Telegram API dengan batas satu pesan per detik per chat (429 + retry_after),
+- MCP Server Notification asli (mcp-server-notification.py) dengan file antrean sementara,
+lalu mengirim banyak notifikasi secara bersamaan ke beberapa chat. Diperiksa bahwa:
+- /send_notification selalu menjawab 202 dengan cepat (tidak menunggu Telegram),
+- setiap notifikasi terkirim tepat satu kali (boleh digabung dengan pesan lain ke chat yang sama),
+- urutan pesan per chat tetap terjaga,
+- tidak ada pesan yang ditolak karena melanggar batas kecepatan per chat (kecuali
+  sengaja dipicu dengan --telegram-chat-interval; pesan tetap harus sampai).
+
+Cara menjalankan (dari root repository):
+    python benchmark/stress_notification_queue.py --messages 600 --chats 8 --concurrency 32
+    python benchmark/stress_notification_queue.py --error-rate 0.2   # dengan error sementara 502
+    python benchmark/stress_notification_queue.py --chat-interval 0.2 --telegram-chat-interval 1   # memicu 429
+Exit code 1 jika ada notifikasi yang hilang, terduplikasi atau gagal.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _servers import load_server_module
+from telegram_api_standin import make_app
+
+# Log akses per request dari server pengembangan tidak diperlukan di sini
+logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+def serve_in_thread(flask_app) -> str:
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def start_notification_server(telegram_url: str, queue_file: str, chat_interval: float):
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "123456:STANDIN",
+        "TELEGRAM_CHAT_ID": "1000",
+        "TELEGRAM_API_URL": telegram_url + "/bot{0}/{1}",
+        "TELEGRAM_CHAT_INTERVAL": str(chat_interval),
+        "NOTIFICATION_QUEUE_FILE": queue_file,
+        # Backoff awal diperpendek lewat jumlah percobaan; pesan tetap harus sampai
+        "NOTIFICATION_MAX_ATTEMPTS": "20",
+    })
+    notification = load_server_module("mcp-server-notification.py")
+    # Backoff pendek agar uji dengan --error-rate selesai cepat
+    notification.notification_queue.backoff_base = 0.2
+    notification.notification_queue.backoff_max = 2.0
+    notification.notification_queue.start()
+    return notification, serve_in_thread(notification.app)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--chat-interval", type=float, default=1.0)
+    parser.add_argument("--telegram-chat-interval", type=float, default=None,
+                        help="Batas per chat di pengganti Telegram; lebih besar dari --chat-interval untuk menguji 429.")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Batas waktu menunggu antrean kosong (detik).")
+    args = parser.parse_args()
+
+    telegram_chat_interval = args.chat_interval if args.telegram_chat_interval is None else args.telegram_chat_interval
+    telegram_url = serve_in_thread(make_app(chat_interval=telegram_chat_interval, error_rate=args.error_rate))
+    with tempfile.TemporaryDirectory() as tmp:
+        notification, base_url = start_notification_server(telegram_url, os.path.join(tmp, "queue.db"), args.chat_interval)
+
+        session = requests.Session()
+        def send(i: int):
+            chat_id = str(2000 + i % args.chats)
+            start = time.perf_counter()
+            response = session.post(f"{base_url}/send_notification", json={"message": f"notif-{i:05d}", "chat_id": chat_id}, timeout=10)
+            return response.status_code, time.perf_counter() - start, chat_id, response.json().get("id")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(send, range(args.messages)))
+        enqueue_elapsed = time.perf_counter() - start
+        latencies = sorted(latency for _, latency, _, _ in results)
+        statuses = [status for status, _, _, _ in results]
+        print(f"Enqueue: {args.messages} request dalam {enqueue_elapsed:.2f} s, "
+              f"p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms, "
+              f"non-202: {sum(status != 202 for status in statuses)}")
+
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            stats = session.get(f"{base_url}/notifications/stats", timeout=10).json()
+            if stats.get("pending", 0) + stats.get("sending", 0) == 0:
+                break
+            time.sleep(0.2)
+        drain_elapsed = time.perf_counter() - start
+        print(f"Antrean: {stats} setelah {drain_elapsed:.2f} s")
+
+        delivered = session.get(f"{telegram_url}/_messages", timeout=10).json()
+        notification.notification_queue.stop()
+
+    problems = []
+    if any(status != 202 for status in statuses):
+        problems.append("ada request yang tidak dijawab 202")
+    seen = {}
+    for message in delivered["messages"]:
+        parts = message["text"].split("\n\n")
+        seen.setdefault(message["chat_id"], []).extend(parts)
+    # Urutan yang diharapkan per chat: urutan masuk antrean (id notifikasi)
+    queued = {}
+    for i, (_, _, chat_id, notification_id) in enumerate(results):
+        queued.setdefault(chat_id, []).append((notification_id or 0, f"notif-{i:05d}"))
+    for chat_id, entries in queued.items():
+        expected = [text for _, text in sorted(entries)]
+        got = seen.get(chat_id, [])
+        if sorted(got) != sorted(expected):
+            problems.append(f"chat {chat_id}: {len(got)} pesan terkirim, seharusnya {len(expected)} (hilang/duplikat)")
+        elif got != expected:
+            problems.append(f"chat {chat_id}: urutan pesan berubah")
+    if delivered["rate_limited"] and telegram_chat_interval <= args.chat_interval:
+        problems.append(f"{delivered['rate_limited']} pesan melanggar batas kecepatan per chat (429)")
+    if stats.get("failed", 0):
+        problems.append(f"{stats['failed']} notifikasi gagal")
+
+    print(f"Telegram: {len(delivered['messages'])} pesan untuk {args.messages} notifikasi "
+          f"(digabung), 429: {delivered['rate_limited']}, error 502: {delivered['errors']}")
+    if problems:
+        for problem in problems:
+            print("MASALAH:", problem)
+        sys.exit(1)
+    print("OK: semua notifikasi terkirim tepat satu kali.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Stress test konkurensi: memastikan data RAG yang diteruskan ke Telegram selalu
+milik chat yang memintanya (tidak ada cross-talk antar request).
+
+Skrip ini menjalankan dalam satu proses:
+- MCP Server RAG asli (mcp-server-rag.py) dengan katalog sementara,
+- penampung notifikasi lokal yang mengembalikan isi pesan di status-nya,
+- App Backend (app.py) dengan server threaded,
+lalu mengirim banyak chat "harga <kode produk> kirim telegram" secara bersamaan
+untuk produk yang berbeda-beda. Setiap jawaban harus memuat status Telegram dengan
+data produk yang sama dengan yang ditanyakan. Gemini diganti model gema lokal
+agar tidak memerlukan API key.
+
+Cara menjalankan (dari root repository):
+    python benchmark/stress_rag_crosstalk.py --requests 500 --concurrency 32
+Exit code 1 jika ditemukan cross-talk.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from _servers import load_server_module
+
+PRODUCT_COUNT = 50
+
+def serve_in_thread(flask_app) -> str:
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def start_rag_server(database_file: str) -> str:
+    os.environ["RAG_DATABASE_FILE"] = database_file
+    rag = load_server_module("mcp-server-rag.py")
+
+    conn = sqlite3.connect(database_file)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    rag.create_schema(cursor)
+    cursor.executemany(
+        "INSERT INTO products (product_code, name, price, stock, description) VALUES (?, ?, ?, ?, ?)",
+        [(f"STRESS{i:03d}", f"Barang Uji {i:03d}", 1000 + i, i, f"Barang uji nomor {i:03d}.") for i in range(PRODUCT_COUNT)],
+    )
+    conn.commit()
+    conn.close()
+    return serve_in_thread(rag.app) + "/rag_query"
+
+def start_notification_sink() -> str:
+    sink = Flask("notification_sink")
+
+    @sink.route("/send_notification", methods=["POST"])
+    def send_notification():
+        return jsonify({"status": f"DITERIMA[{request.json.get('message')}]"})
+
+    return serve_in_thread(sink) + "/send_notification"
+
+class EchoResponse:
+    def __init__(self, text):
+        self.text = text
+
+class EchoModel:
+    """Pengganti Gemini: mengembalikan prompt apa adanya."""
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        return iter([EchoResponse(prompt)]) if stream else EchoResponse(prompt)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["RAG_SERVER_URL"] = start_rag_server(os.path.join(tmp, "stress.db"))
+        os.environ["TELEGRAM_NOTIFICATION_SERVER_URL"] = start_notification_sink()
+        os.environ.setdefault("GEMINI_API_KEY", "stress-test")
+        # EchoModel tidak memanggil tool; konteks RAG diambil oleh router kata kunci
+        os.environ["CHAT_TOOL_ROUTING"] = "keywords"
+
+        import app as chat_backend
+        chat_backend.get_gemini_model = lambda system_instruction: EchoModel()
+        chat_url = serve_in_thread(chat_backend.app) + "/chat"
+
+        import requests
+
+        def one_chat(i):
+            number = i % PRODUCT_COUNT
+            answer = requests.post(chat_url, json={"message": f"harga stress{number:03d} kirim telegram"}, timeout=30).json()
+            status = answer.get("response", "").rsplit("Status Notifikasi Telegram:", 1)[-1]
+            return f"barang uji {number:03d}", status
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(one_chat, range(args.requests)))
+
+    crosstalk = [(product, status) for product, status in results if product not in status.lower()]
+    print(f"{len(results)} chat, concurrency {args.concurrency}: {len(crosstalk)} cross-talk")
+    for product, status in crosstalk[:10]:
+        print(f"  diminta '{product}', Telegram menerima: {status.strip()[:120]}")
+    sys.exit(1 if crosstalk else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Pengganti lokal Telegram Bot API (hanya sendMessage) untuk menguji MCP Server
+Notification tanpa bot dan jaringan sungguhan.
+
+Meniru perilaku Telegram yang relevan untuk antrean notifikasi:
+- batas kecepatan per chat: pesan yang datang lebih cepat dari --chat-interval
+  dijawab HTTP 429 dengan parameters.retry_after,
+- chat_id yang diawali "blocked" dijawab 403 (error permanen),
+- --error-rate: sebagian request dijawab 502 (error sementara),
+- --latency: jeda per request (detik).
+Semua pesan yang diterima bisa dilihat di GET /_messages.
+
+Cara menjalankan (dari root repository):
+    python benchmark/telegram_api_standin.py --port 8081
+    TELEGRAM_API_URL="http://127.0.0.1:8081/bot{0}/{1}" python3 mcp-server-notification.py
+"""
+import argparse
+import random
+import threading
+import time
+
+from flask import Flask, request, jsonify
+
+def make_app(chat_interval: float = 1.0, error_rate: float = 0.0, latency: float = 0.0) -> Flask:
+    standin = Flask("telegram_api_standin")
+    state = {"messages": [], "rate_limited": 0, "errors": 0, "last_sent": {}}
+    lock = threading.Lock()
+
+    @standin.route("/bot<token>/sendMessage", methods=["GET", "POST"])
+    def send_message(token):
+        params = {**request.values.to_dict(), **(request.get_json(silent=True) or {})}
+        chat_id, text = str(params.get("chat_id", "")), params.get("text", "")
+        if latency:
+            time.sleep(latency)
+        if error_rate and random.random() < error_rate:
+            with lock:
+                state["errors"] += 1
+            return "Bad Gateway", 502
+        if chat_id.startswith("blocked"):
+            return jsonify({"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}), 403
+
+        now = time.monotonic()
+        with lock:
+            wait = state["last_sent"].get(chat_id, float("-inf")) + chat_interval - now
+            if wait > 0:
+                state["rate_limited"] += 1
+                retry_after = max(1, round(wait))
+                return jsonify({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                }), 429
+            state["last_sent"][chat_id] = now
+            state["messages"].append({"chat_id": chat_id, "text": text, "time": time.time()})
+            message_id = len(state["messages"])
+
+        return jsonify({"ok": True, "result": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else 0, "type": "private"},
+            "text": text,
+        }})
+
+    @standin.route("/_messages", methods=["GET"])
+    def messages():
+        with lock:
+            return jsonify({
+                "messages": list(state["messages"]),
+                "rate_limited": state["rate_limited"],
+                "errors": state["errors"],
+            })
+
+    return standin
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chat-interval", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    make_app(args.chat_interval, args.error_rate, args.latency).run(port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
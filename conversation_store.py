@@ -0,0 +1,95 @@
+"""
+Penyimpanan percakapan per sesi untuk chat multi-giliran, aman dipakai dari banyak thread.
+
+- Riwayat giliran (pertanyaan, jawaban) per sesi dibatasi anggaran token: giliran
+  tertua dibuang jika perkiraan total token melebihi history_token_budget, sehingga
+  ukuran prompt tetap terbatas walaupun percakapan panjang.
+- Memo produk terakhir (nama produk kanonik dan tipe informasinya) untuk pertanyaan
+  lanjutan seperti "berapa stoknya?" yang tidak menyebut produknya lagi.
+- Sesi yang tidak aktif dibuang dengan LRU + TTL (TTLLRUCache); TTL dihitung ulang
+  setiap kali sesi dipakai.
+- Representasi ringkas: satu objek __slots__ per sesi, giliran disimpan sebagai tuple
+  di deque dan jawaban dipotong ke max_turn_chars karakter.
+"""
+import re
+import threading
+import uuid
+from collections import deque
+
+from ttl_cache import TTLLRUCache
+
+# Session ID dari klien hanya dipakai jika formatnya aman (sama seperti request ID)
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{8,64}$")
+
+def estimate_tokens(text: str) -> int:
+    """Perkiraan jumlah token tanpa tokenizer: sekitar 4 karakter per token."""
+    return len(text) // 4 + 1
+
+class Session:
+    __slots__ = ("turns", "tokens", "products", "tipe")
+
+    def __init__(self):
+        self.turns = deque() # (pertanyaan, jawaban, perkiraan token), yang tertua di depan
+        self.tokens = 0
+        self.products = () # produk yang terakhir dibahas (nama kanonik katalog)
+        self.tipe = None # tipe informasi terakhir ('harga', 'stok', 'detail')
+
+class ConversationStore:
+    def __init__(self, max_sessions: int, ttl: float, history_token_budget: int, max_turn_chars: int = 600):
+        """
+        ttl: lama (detik) sesi boleh tidak aktif sebelum dibuang.
+        history_token_budget: perkiraan token maksimum riwayat yang ikut ke prompt.
+        max_turn_chars: panjang maksimum pertanyaan/jawaban yang disimpan per giliran.
+        """
+        self.ttl = ttl
+        self.history_token_budget = history_token_budget
+        self.max_turn_chars = max_turn_chars
+        self._sessions = TTLLRUCache(max_sessions, default_ttl=ttl)
+        # Satu lock untuk isi semua sesi; operasinya singkat (tanpa I/O)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resolve_session_id(session_id: str | None) -> str:
+        """Session ID dari klien jika valid, atau ID baru."""
+        if session_id and _SESSION_ID_PATTERN.match(session_id):
+            return session_id
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> Session:
+        """
+        Sesi untuk session_id (dibuat jika belum ada atau sudah dibuang); TTL-nya diperpanjang.
+        Request bersamaan untuk sesi baru yang sama mendapat objek Session yang sama.
+        """
+        return self._sessions.get_or_create(session_id, Session)
+
+    def history(self, session: Session) -> list[tuple[str, str]]:
+        """Salinan riwayat (pertanyaan, jawaban), yang tertua lebih dulu."""
+        with self._lock:
+            return [(question, answer) for question, answer, _ in session.turns]
+
+    def append_turn(self, session: Session, question: str, answer: str):
+        question = question[:self.max_turn_chars]
+        answer = answer[:self.max_turn_chars]
+        tokens = estimate_tokens(question) + estimate_tokens(answer)
+        with self._lock:
+            session.turns.append((question, answer, tokens))
+            session.tokens += tokens
+            # Giliran tertua dibuang sampai riwayat muat di anggaran token
+            while session.turns and session.tokens > self.history_token_budget:
+                session.tokens -= session.turns.popleft()[2]
+
+    def last_products(self, session: Session) -> tuple[tuple[str, ...], str | None]:
+        with self._lock:
+            return session.products, session.tipe
+
+    def remember_products(self, session: Session, products: list[str], tipe: str):
+        with self._lock:
+            session.products, session.tipe = tuple(products), tipe
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.delete(session_id)
+
+    def stats(self) -> dict:
+        stats = self._sessions.stats()
+        stats.update({"ttl": self.ttl, "history_token_budget": self.history_token_budget})
+        return stats
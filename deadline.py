@@ -0,0 +1,58 @@
+"""
+Propagasi deadline (batas waktu) per request antara App Backend dan MCP Server.
+
+App Backend membuat satu Deadline untuk setiap pesan chat, lalu setiap panggilan
+ke MCP Server memakai sisa waktunya sebagai timeout HTTP dan mengirimkannya lewat
+header DEADLINE_HEADER. MCP Server membaca header tersebut dan berhenti lebih awal
+(HTTP 504) jika sisa waktu sudah habis, sehingga backend yang lambat gagal cepat
+alih-alih menahan worker.
+"""
+import time
+
+# Sisa waktu (milidetik) yang dimiliki penerima untuk menyelesaikan request.
+# Dikirim sebagai durasi relatif, bukan timestamp absolut, agar tidak
+# bergantung pada sinkronisasi jam antar server.
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+class DeadlineExceeded(Exception):
+    """Dilempar ketika sisa waktu request sudah habis sebelum pekerjaan dimulai."""
+
+class Deadline:
+    def __init__(self, budget_seconds: float):
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        """Sisa waktu dalam detik (bisa negatif jika sudah lewat)."""
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float | None = None) -> float:
+        """
+        Timeout untuk satu panggilan: sisa waktu request, dibatasi oleh 'cap'
+        (timeout maksimum per endpoint). Melempar DeadlineExceeded jika sudah habis.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Batas waktu permintaan terlampaui.")
+        return min(remaining, cap) if cap is not None else remaining
+
+    def headers(self, timeout: float | None = None) -> dict:
+        """
+        Header HTTP untuk meneruskan sisa waktu ke MCP Server. Jika 'timeout'
+        diberikan (hasil timeout()), itu yang dikirim agar server tidak bekerja
+        lebih lama dari waktu tunggu pemanggil.
+        """
+        seconds = self.remaining() if timeout is None else timeout
+        return {DEADLINE_HEADER: str(max(int(seconds * 1000), 0))}
+
+def deadline_from_headers(headers, default_seconds: float) -> Deadline:
+    """
+    Membuat Deadline dari header request yang masuk. Jika header tidak ada
+    atau tidak valid, dipakai default_seconds.
+    """
+    try:
+        return Deadline(int(headers.get(DEADLINE_HEADER)) / 1000.0)
+    except (TypeError, ValueError):
+        return Deadline(default_seconds)
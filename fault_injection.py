@@ -0,0 +1,48 @@
+"""
+Injeksi latensi dan error untuk pengujian ketahanan MCP Server.
+Nonaktif secara default; diaktifkan lewat variabel lingkungan dengan prefix per server:
+
+    <PREFIX>_FAULT_LATENCY     rentang delay dalam detik, misalnya "0.1-0.5" atau "0.2"
+    <PREFIX>_FAULT_ERROR_RATE  peluang (0.0 - 1.0) sebuah request digagalkan dengan error
+
+Contoh: RAG_FAULT_LATENCY=0.1-0.5 python3 mcp-server-rag.py
+"""
+import os
+import random
+import time
+
+def parse_latency(value: str) -> tuple[float, float]:
+    """Rentang latensi (min, max) dalam detik dari "0.2" atau "0.1-0.5"; string kosong = (0, 0)."""
+    value = value.strip()
+    if not value:
+        return 0.0, 0.0
+    low, _, high = value.partition("-")
+    low = float(low)
+    return low, float(high) if high else low
+
+class InjectedFault(Exception):
+    """Error buatan dari fault injection."""
+
+class FaultInjector:
+    def __init__(self, prefix: str):
+        self.min_latency, self.max_latency = parse_latency(os.getenv(f"{prefix}_FAULT_LATENCY", ""))
+        self.error_rate = float(os.getenv(f"{prefix}_FAULT_ERROR_RATE", "0") or 0)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_latency > 0 or self.error_rate > 0
+
+    def inject(self, max_delay: float | None = None):
+        """
+        Menjalankan delay dan/atau error buatan sesuai konfigurasi.
+        Delay dibatasi oleh max_delay (misalnya sisa deadline request).
+        """
+        if not self.enabled:
+            return
+        if self.max_latency > 0:
+            delay = random.uniform(self.min_latency, self.max_latency)
+            if max_delay is not None:
+                delay = min(delay, max(max_delay, 0))
+            time.sleep(delay)
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            raise InjectedFault("Error buatan dari fault injection.")
@@ -0,0 +1,275 @@
+"""
+Klien HTTP bersama (connection pooling) dari App Backend ke MCP Server.
+
+- Satu requests.Session per MCP Server: koneksi TCP dipakai ulang (keep-alive),
+  paling banyak pool_size koneksi disimpan. Jika semuanya sedang dipakai, koneksi
+  tambahan dibuka sementara dan ditutup setelah dipakai, bukan ditunggu tanpa batas.
+- Timeout per endpoint: connect_timeout untuk membuka koneksi (server yang mati
+  langsung ketahuan) dan read_timeout maksimum untuk menunggu jawaban, keduanya
+  dibatasi sisa Deadline request chat.
+- Retry (opsional, hanya untuk endpoint idempoten seperti lookup RAG): gagal
+  koneksi dan HTTP 502/503/504 dicoba ulang dengan backoff, selama sisa deadline cukup.
+  Timeout baca tidak dicoba ulang agar server yang lambat tidak mendapat beban ganda.
+- Circuit breaker: setelah failure_threshold kegagalan berturut-turut (gagal koneksi,
+  timeout atau HTTP 5xx), panggilan langsung ditolak (CircuitOpenError) selama
+  reset_timeout detik, lalu satu panggilan percobaan dibiarkan lewat (half-open)
+  untuk memeriksa apakah server sudah pulih.
+- ServiceClient.arequest() memakai retry, timeout dan circuit breaker yang sama
+  untuk httpx.AsyncClient (backend async).
+- Session dibuat ulang setelah fork (misalnya worker gunicorn), agar koneksi milik
+  proses master tidak dipakai bersama.
+"""
+import asyncio
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from deadline import Deadline, DeadlineExceeded
+from telemetry import get_logger
+
+logger = get_logger("http_client")
+
+# Status dari server/proxy yang sedang bermasalah dan boleh dicoba ulang
+RETRYABLE_STATUS = (502, 503, 504)
+
+def is_server_failure(status_code: int) -> bool:
+    """Semua 5xx dihitung sebagai kegagalan server oleh circuit breaker; 4xx berarti server sehat."""
+    return status_code >= 500
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Panggilan ditolak tanpa menghubungi server karena circuit breaker sedang terbuka."""
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        """failure_threshold <= 0 menonaktifkan circuit breaker."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """Melempar CircuitOpenError jika panggilan tidak boleh dilakukan sekarang."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN:
+                retry_in = self.reset_timeout - (time.monotonic() - self._opened_at)
+                if retry_in > 0:
+                    raise CircuitOpenError(f"Circuit breaker {self.name} terbuka; dicoba lagi dalam {retry_in:.1f} detik.")
+                self._state = self.HALF_OPEN
+            # Half-open: hanya satu panggilan percobaan dalam satu waktu
+            if self._trial_in_flight:
+                raise CircuitOpenError(f"Circuit breaker {self.name} sedang menguji server.")
+            self._trial_in_flight = True
+
+    def release(self):
+        """Mengembalikan izin panggilan tanpa hasil, misalnya karena deadline request habis (bukan kesalahan server)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit breaker %s tertutup kembali.", self.name)
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        "Circuit breaker %s terbuka setelah %d kegagalan; panggilan ditolak selama %.1f detik.",
+                        self.name, self._failures, self.reset_timeout,
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures}
+
+class ServiceClient:
+    def __init__(
+        self,
+        name: str,
+        connect_timeout: float,
+        read_timeout: float,
+        pool_size: int = 20,
+        retries: int = 0,
+        retry_backoff: float = 0.1,
+        breaker: CircuitBreaker | None = None,
+    ):
+        """
+        read_timeout: timeout maksimum menunggu jawaban (cap untuk Deadline.timeout()).
+        retries: jumlah percobaan ulang; hanya untuk endpoint idempoten.
+        """
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker(name, failure_threshold=0)
+        self._session_lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        # pool_block=False: menunggu koneksi bebas tidak punya batas waktu di requests (tidak mengikuti
+        # deadline), jadi koneksi tambahan dibuka saja; hanya pool_size koneksi yang disimpan
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, pool_block=False, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        with self._session_lock:
+            if self._session is None or self._session_pid != os.getpid():
+                # Koneksi yang terbawa fork tidak ditutup di sini, karena masih milik proses induk
+                self._session, self._session_pid = self._new_session(), os.getpid()
+            return self._session
+
+    def request(self, method: str, url: str, deadline: Deadline | None = None, **kwargs) -> requests.Response:
+        """
+        Satu panggilan HTTP dengan timeout dari deadline, retry dan circuit breaker.
+        Sisa deadline ikut dikirim sebagai header (lihat Deadline.headers()).
+        Melempar DeadlineExceeded, CircuitOpenError atau requests.exceptions.RequestException
+        (termasuk HTTPError untuk status 4xx/5xx).
+        """
+        deadline = deadline or Deadline(self.connect_timeout + self.read_timeout)
+        headers = kwargs.pop("headers", None) or {}
+        # Deadline diperiksa sebelum meminta izin circuit breaker: deadline chat yang
+        # habis adalah batas waktu request, bukan kegagalan server
+        timeout = deadline.timeout(self.read_timeout)
+        # Satu izin circuit breaker dan satu hasil (sukses/gagal) per panggilan, termasuk percobaan ulangnya
+        self.breaker.before_call()
+        attempt = 0
+        try:
+            while True:
+                if attempt:
+                    timeout = deadline.timeout(self.read_timeout)
+                try:
+                    response = self.session.request(
+                        method, url, timeout=(min(self.connect_timeout, timeout), timeout),
+                        headers={**headers, **deadline.headers(timeout)}, **kwargs,
+                    )
+                except requests.exceptions.ConnectionError:
+                    # Hanya gagal koneksi (termasuk ConnectTimeout) yang dicoba ulang; retries > 0 hanya untuk endpoint idempoten
+                    delay = self._retry_delay(attempt, deadline)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_delay(attempt, deadline) if response.status_code in RETRYABLE_STATUS else None
+                    if delay is None:
+                        break
+                attempt += 1
+                logger.debug("Mencoba ulang panggilan %s (percobaan %d).", self.name, attempt + 1)
+                time.sleep(delay)
+        except BaseException as e:
+            self._record_error(e, timeout, isinstance(e, requests.exceptions.Timeout))
+            raise
+
+        self._record_response(response.status_code)
+        response.raise_for_status()
+        return response
+
+    async def arequest(self, client, method: str, url: str, deadline: Deadline | None = None, **kwargs):
+        """
+        Versi async dari request() untuk httpx.AsyncClient (app_async.py), dengan
+        timeout, retry dan circuit breaker yang sama. Melempar DeadlineExceeded,
+        CircuitOpenError atau httpx.HTTPError (termasuk HTTPStatusError untuk 4xx/5xx).
+        """
+        import httpx  # hanya dibutuhkan oleh backend async
+
+        deadline = deadline or Deadline(self.connect_timeout + self.read_timeout)
+        headers = kwargs.pop("headers", None) or {}
+        timeout = deadline.timeout(self.read_timeout)
+        self.breaker.before_call()
+        attempt = 0
+        try:
+            while True:
+                if attempt:
+                    timeout = deadline.timeout(self.read_timeout)
+                try:
+                    response = await client.request(
+                        method, url, timeout=httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout)),
+                        headers={**headers, **deadline.headers(timeout)}, **kwargs,
+                    )
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    delay = self._retry_delay(attempt, deadline)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_delay(attempt, deadline) if response.status_code in RETRYABLE_STATUS else None
+                    if delay is None:
+                        break
+                attempt += 1
+                logger.debug("Mencoba ulang panggilan %s (percobaan %d).", self.name, attempt + 1)
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            self._record_error(e, timeout, isinstance(e, httpx.TimeoutException))
+            raise
+
+        self._record_response(response.status_code)
+        response.raise_for_status()
+        return response
+
+    def _retry_delay(self, attempt: int, deadline: Deadline) -> float | None:
+        """Backoff sebelum percobaan ulang; None jika retry habis atau sisa deadline tidak cukup."""
+        if attempt >= self.retries:
+            return None
+        delay = self.retry_backoff * (2 ** attempt)
+        if deadline.remaining() <= delay:
+            return None
+        return delay
+
+    def _record_response(self, status_code: int):
+        if is_server_failure(status_code):
+            self.breaker.record_failure()
+        else:
+            # 4xx berarti server sehat (kesalahan ada di request), jadi tidak dihitung sebagai kegagalan
+            self.breaker.record_success()
+
+    def _record_error(self, error: BaseException, timeout: float, timed_out: bool):
+        """
+        Hasil circuit breaker untuk panggilan yang melempar exception. Deadline request
+        yang habis, pembatalan task (asyncio.CancelledError) dan timeout yang dipendekkan
+        oleh sisa deadline bukan kesalahan server: izinnya dikembalikan tanpa dihitung.
+        """
+        if isinstance(error, (DeadlineExceeded, asyncio.CancelledError)) or (timed_out and timeout < self.read_timeout):
+            self.breaker.release()
+        else:
+            self.breaker.record_failure()
+
+    def get(self, url: str, deadline: Deadline | None = None, **kwargs) -> requests.Response:
+        return self.request("GET", url, deadline, **kwargs)
+
+    def post(self, url: str, deadline: Deadline | None = None, **kwargs) -> requests.Response:
+        return self.request("POST", url, deadline, **kwargs)
@@ -1,10 +1,20 @@
 import os
+import argparse
 from flask import Flask, request, jsonify
-import time # For simulating delay
+import requests
 import telebot # You need to install 'pyTelegramBotAPI' for this: pip install pyTelegramBotAPI
 from dotenv import load_dotenv # You need to install 'python-dotenv' for this: pip install python-dotenv
+from deadline import deadline_from_headers
+from fault_injection import FaultInjector, InjectedFault
+from notification_queue import NotificationQueue, DeliveryError
+from serving import init_health_endpoints, add_production_arguments, run_production
+from stub_backends import StubTelegramBot
+from telemetry import get_logger, init_flask_app, get_request_id
 
 app = Flask(__name__)
+# Request ID (diteruskan oleh App Backend), metrik per endpoint dan GET /metrics
+init_flask_app(app)
+logger = get_logger("notification")
 
 # --- Load environment variables from .env file ---
 load_dotenv()
@@ -16,43 +26,140 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 # Dapatkan ID chat atau channel tujuan notifikasi dari variabel lingkungan.
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+# "telegram" (default) atau "stub" untuk bot pengganti lokal tanpa token (lihat stub_backends.py)
+TELEGRAM_BACKEND = os.getenv("TELEGRAM_BACKEND", "telegram").lower()
+
 # Pastikan token dan chat ID telah dimuat
-if not TELEGRAM_BOT_TOKEN:
+if not TELEGRAM_BOT_TOKEN and TELEGRAM_BACKEND != "stub":
     print("ERROR: TELEGRAM_BOT_TOKEN tidak ditemukan di variabel lingkungan atau file .env")
     exit(1)
 if not TELEGRAM_CHAT_ID:
     print("ERROR: TELEGRAM_CHAT_ID tidak ditemukan di variabel lingkungan atau file .env")
     exit(1)
 
+# Timeout default (detik) untuk menangani request jika pemanggil tidak mengirim header deadline
+TELEGRAM_DEFAULT_TIMEOUT = float(os.getenv("TELEGRAM_DEFAULT_TIMEOUT", "10"))
+# Timeout (detik) satu panggilan Telegram API oleh worker antrean
+TELEGRAM_SEND_TIMEOUT = float(os.getenv("TELEGRAM_SEND_TIMEOUT", "10"))
+# URL dasar Telegram Bot API (opsional), misalnya pengganti lokal untuk pengujian:
+# TELEGRAM_API_URL=http://127.0.0.1:8081/bot{0}/{1}
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# --- Antrean notifikasi (lihat notification_queue.py) ---
+NOTIFICATION_QUEUE_FILE = os.getenv("NOTIFICATION_QUEUE_FILE", "notification_queue.db")
+NOTIFICATION_WORKERS = int(os.getenv("NOTIFICATION_WORKERS", "4"))
+# Telegram mengizinkan sekitar satu pesan per detik per chat dan sekitar 30 per detik per bot
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+# Lama pesan baru menunggu pesan lain ke chat yang sama sebelum dikirim (digabung)
+NOTIFICATION_COALESCE_WINDOW = float(os.getenv("NOTIFICATION_COALESCE_WINDOW", "0.2"))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "5"))
+
+# Simulasi latensi/error pengiriman untuk pengujian, nonaktif secara default
+# (NOTIFICATION_FAULT_LATENCY, NOTIFICATION_FAULT_ERROR_RATE)
+fault_injector = FaultInjector("NOTIFICATION")
+
 # Inisialisasi bot Telegram
-bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
+if TELEGRAM_BACKEND == "stub":
+    bot = StubTelegramBot.from_env()
+    logger.warning("TELEGRAM_BACKEND=stub: notifikasi tidak dikirim ke Telegram.")
+else:
+    if TELEGRAM_API_URL:
+        telebot.apihelper.API_URL = TELEGRAM_API_URL
+    bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
+
+def send_to_telegram(chat_id: str, text: str):
+    """Mengirim satu pesan (mungkin gabungan beberapa notifikasi); dipakai oleh worker antrean."""
+    try:
+        bot.send_message(chat_id, text, timeout=TELEGRAM_SEND_TIMEOUT)
+    except telebot.apihelper.ApiTelegramException as e:
+        if e.error_code == 429:
+            retry_after = (e.result_json.get("parameters") or {}).get("retry_after", TELEGRAM_CHAT_INTERVAL)
+            raise DeliveryError(e.description, retry_after=float(retry_after)) from e
+        # Error 4xx lain (chat ID salah, bot diblokir, ...) tidak akan berhasil jika dicoba ulang
+        raise DeliveryError(e.description, permanent=400 <= e.error_code < 500 and e.error_code != 401) from e
+    except (telebot.apihelper.ApiException, requests.exceptions.RequestException) as e:
+        raise DeliveryError(str(e)) from e
+
+notification_queue = NotificationQueue(
+    NOTIFICATION_QUEUE_FILE,
+    send_to_telegram,
+    workers=NOTIFICATION_WORKERS,
+    chat_interval=TELEGRAM_CHAT_INTERVAL,
+    global_rate=TELEGRAM_GLOBAL_RATE,
+    coalesce_window=NOTIFICATION_COALESCE_WINDOW,
+    max_attempts=NOTIFICATION_MAX_ATTEMPTS,
+)
+
+# GET /healthz dan GET /readyz (siap jika database antrean bisa dibaca dan worker-nya berjalan di proses ini)
+init_health_endpoints(app, {
+    "queue_database": lambda: notification_queue.stats() is not None,
+    "queue_workers": lambda: notification_queue.running,
+})
+
+@app.before_request
+def ensure_queue_workers():
+    # Worker antrean berupa thread yang tidak ikut ter-fork; dijalankan saat request pertama di setiap proses worker
+    notification_queue.start()
 
 @app.route('/send_notification', methods=['POST'])
 def send_notification():
     """
     Endpoint untuk mengirim notifikasi ke Telegram.
-    Menerima pesan dalam format JSON: {"message": "Pesan Anda di sini"}
+    Menerima pesan dalam format JSON: {"message": "Pesan Anda di sini"}.
+    Pesan selalu dikirim ke TELEGRAM_CHAT_ID (pemanggil tidak bisa memilih chat tujuan).
+    Pesan dimasukkan ke antrean dan endpoint langsung menjawab 202; pengiriman ke
+    Telegram dilakukan oleh worker antrean.
     """
     message = request.json.get('message')
     if not message:
         return jsonify({"error": "No message provided"}), 400
 
-    print(f"\n[Telegram Server] Menerima permintaan notifikasi: '{message}'")
+    logger.info("Menerima permintaan notifikasi: '%s'", message)
+
+    # Sisa waktu yang diteruskan oleh pemanggil (App Backend)
+    deadline = deadline_from_headers(request.headers, TELEGRAM_DEFAULT_TIMEOUT)
 
     try:
-        # Kirim pesan menggunakan bot Telegram
-        bot.send_message(TELEGRAM_CHAT_ID, message)
-        
-        # Simulasi delay pengiriman (opsional, untuk tujuan demo)
-        time.sleep(0.5) 
-        print(f"[Telegram Server] Notifikasi Telegram berhasil dikirim: '{message}'")
-        return jsonify({"status": "Notifikasi Telegram berhasil dikirim."})
+        fault_injector.inject(max_delay=deadline.remaining())
+        if deadline.expired():
+            logger.warning("Batas waktu request sudah lewat, notifikasi tidak dimasukkan ke antrean.")
+            return jsonify({"status": "Gagal mengirim notifikasi Telegram: batas waktu terlampaui."}), 504
+
+        notification_id = notification_queue.enqueue(TELEGRAM_CHAT_ID, message, get_request_id())
+        return jsonify({"status": "Notifikasi Telegram masuk antrean dan akan segera dikirim.", "id": notification_id}), 202
+    except InjectedFault as e:
+        return jsonify({"status": f"Gagal mengirim notifikasi Telegram: {e}"}), 503
     except Exception as e:
-        print(f"[Telegram Server] Error saat mengirim notifikasi: {e}")
-        # Tangani error spesifik dari API Telegram jika diperlukan
+        logger.exception("Error saat memasukkan notifikasi ke antrean: %s", e)
         return jsonify({"status": f"Gagal mengirim notifikasi Telegram: {e}"}), 500
 
+@app.route('/notifications/<int:notification_id>', methods=['GET'])
+def notification_status(notification_id):
+    """Status pengiriman satu notifikasi di antrean (pending, sending, sent atau failed)."""
+    notification = notification_queue.get(notification_id)
+    if notification is None:
+        return jsonify({"error": "Notification not found"}), 404
+    return jsonify(notification)
+
+@app.route('/notifications/stats', methods=['GET'])
+def notification_stats():
+    """Jumlah notifikasi di antrean per status."""
+    return jsonify(notification_queue.stats())
+
 if __name__ == '__main__':
-    print("Memulai MCP Server Notification Telegram di http://127.0.0.1:5002")
-    print("Pastikan TELEGRAM_BOT_TOKEN dan TELEGRAM_CHAT_ID diatur di file .env atau variabel lingkungan sistem.")
-    app.run(port=5002, debug=True) # debug=True hanya untuk pengembangan, nonaktifkan di produksi
+    parser = argparse.ArgumentParser(description="MCP Server Notification Telegram")
+    add_production_arguments(parser)
+    args = parser.parse_args()
+
+    if args.production:
+        # Default satu proses worker: TELEGRAM_GLOBAL_RATE berlaku per proses.
+        # Worker antrean berupa thread, jadi dijalankan setelah fork dan dihentikan
+        # (setelah pesan yang sedang dikirim selesai) saat proses worker berhenti.
+        run_production(app, "NOTIFICATION", args, 5002, on_worker_start=notification_queue.start,
+                       on_worker_exit=notification_queue.stop, default_workers=1)
+    else:
+        print("Memulai MCP Server Notification Telegram di http://127.0.0.1:5002")
+        print("Pastikan TELEGRAM_BOT_TOKEN dan TELEGRAM_CHAT_ID diatur di file .env atau variabel lingkungan sistem.")
+        notification_queue.start()
+        app.run(port=5002, debug=True) # debug=True hanya untuk pengembangan, nonaktifkan di produksi
@@ -1,28 +1,254 @@
 # Import library yang diperlukan
-import os # Import os untuk menghapus file database jika diperlukan
-from flask import Flask, request, jsonify
-import time # Untuk simulasi delay database
-import random # Untuk simulasi data acak
+import os
+import csv # Untuk impor katalog CSV
+import json # Untuk impor katalog JSONL
+from flask import Flask, request, jsonify, Response
 import sqlite3 # Import library SQLite
+import queue # Untuk pool koneksi SQLite
+import threading
+import time
+from contextlib import contextmanager
+from deadline import deadline_from_headers
+from fault_injection import FaultInjector, InjectedFault
+from product_matcher import ProductMatcher
+from serving import init_health_endpoints, add_production_arguments, run_production
+from telemetry import get_logger, init_flask_app, span
 
 app = Flask(__name__)
+# Request ID (diteruskan dari App Backend), metrik per endpoint dan GET /metrics
+init_flask_app(app)
+logger = get_logger("rag")
 
 # Nama file database SQLite
-DATABASE_FILE = 'rag_data.db'
+DATABASE_FILE = os.getenv("RAG_DATABASE_FILE", 'rag_data.db')
 
-def init_db():
+# --- Konfigurasi Pool Koneksi SQLite ---
+# Jumlah maksimum koneksi read-only per worker (proses)
+RAG_DB_POOL_SIZE = int(os.getenv("RAG_DB_POOL_SIZE", "8"))
+# Ukuran page cache per koneksi dalam KiB (nilai negatif pada PRAGMA cache_size berarti KiB)
+RAG_DB_CACHE_SIZE_KIB = int(os.getenv("RAG_DB_CACHE_SIZE_KIB", "16384"))
+# Ukuran memory-mapped I/O per koneksi dalam byte
+RAG_DB_MMAP_SIZE = int(os.getenv("RAG_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Batas waktu default (detik) jika request tidak membawa header deadline
+RAG_DEFAULT_TIMEOUT = float(os.getenv("RAG_DEFAULT_TIMEOUT", "10"))
+# Jumlah instruksi VM SQLite di antara pemeriksaan deadline saat query berjalan
+RAG_DEADLINE_CHECK_INTERVAL = 1000
+
+# Simulasi delay/error database untuk pengujian (nonaktif secara default),
+# diatur lewat RAG_FAULT_LATENCY dan RAG_FAULT_ERROR_RATE
+fault_injector = FaultInjector("RAG")
+
+# Query lookup produk. Disimpan sebagai konstanta agar statement yang sudah
+# di-prepare dipakai ulang dari cache statement milik setiap koneksi.
+# Jalur cepat: kode produk atau nama produk yang cocok persis (memakai indeks NOCASE)
+SQL_LOOKUP_EXACT = (
+    "SELECT name, price, stock, description FROM products "
+    "WHERE product_code = ?1 COLLATE NOCASE OR name = ?1 COLLATE NOCASE LIMIT 1"
+)
+# Pencarian ter-ranking lewat indeks FTS5 trigram; bobot bm25: name > product_code > description
+SQL_LOOKUP_FTS = (
+    "SELECT p.name, p.price, p.stock, p.description FROM products_fts "
+    "JOIN products p ON p.id = products_fts.rowid "
+    "WHERE products_fts MATCH ? ORDER BY bm25(products_fts, 10.0, 5.0, 1.0) LIMIT 1"
+)
+# Tokenizer trigram hanya bisa mencocokkan istilah minimal 3 karakter;
+# istilah yang lebih pendek memakai pencarian LIKE lama.
+FTS_MIN_TERM_LENGTH = 3
+SQL_LOOKUP_LIKE = (
+    "SELECT name, price, stock, description FROM products "
+    "WHERE LOWER(name) LIKE ? OR LOWER(product_code) LIKE ? LIMIT 1"
+)
+# Versi katalog (data produk) dan versi nama produk saat ini (lihat tabel catalog_meta)
+SQL_CATALOG_VERSION = "SELECT version, names_version FROM catalog_meta WHERE id = 1"
+# Batch lookup: semua istilah dicocokkan persis (kode/nama, memakai indeks NOCASE) dalam satu statement.
+# Placeholder VALUES dibentuk sesuai jumlah item; setiap ukuran batch punya statement ter-cache sendiri.
+SQL_LOOKUP_EXACT_BATCH = (
+    "WITH wanted(idx, term) AS (VALUES {values}) "
+    "SELECT wanted.idx, p.name, p.price, p.stock, p.description FROM wanted "
+    "JOIN products p ON p.product_code = wanted.term COLLATE NOCASE OR p.name = wanted.term COLLATE NOCASE "
+    "ORDER BY wanted.idx, p.id"
+)
+# Jumlah maksimum item dalam satu request batch
+RAG_BATCH_MAX_ITEMS = int(os.getenv("RAG_BATCH_MAX_ITEMS", "20"))
+# Semua kode dan nama produk, untuk membangun pencocok produk di memori
+SQL_CATALOG_PRODUCTS = "SELECT product_code, name FROM products ORDER BY id"
+
+class ConnectionPool:
     """
-    Menginisialisasi database SQLite dan mengisi data sampel.
-    Jika file database sudah ada, ia akan dihapus untuk memastikan skema terbaru.
+    Pool koneksi SQLite read-only per worker (proses).
+    Koneksi dibuka secara lazy saat pertama kali dibutuhkan lalu dipakai ulang,
+    sehingga biaya connect, parsing skema dan prepare statement hanya dibayar
+    sekali per koneksi, bukan per request. Jika proses di-fork (misalnya worker
+    baru), pool otomatis dikosongkan agar koneksi tidak dibagi antar proses.
     """
-    # Hapus file database jika sudah ada untuk memastikan skema terbaru
-    if os.path.exists(DATABASE_FILE):
-        os.remove(DATABASE_FILE)
-        print(f"File database '{DATABASE_FILE}' yang sudah ada telah dihapus.")
 
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
+    def __init__(self, database_file: str, size: int):
+        self.database_file = database_file
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._created = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.database_file}?mode=ro",
+            uri=True,
+            check_same_thread=False, # Koneksi berpindah antar thread melalui pool
+            cached_statements=64,
+        )
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA cache_size = -{RAG_DB_CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size = {RAG_DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            idle = self._idle
+            try:
+                return idle.get_nowait()
+            except queue.Empty:
+                if self._created < self.size:
+                    self._created += 1
+                    create_new = True
+                else:
+                    create_new = False
+        if create_new:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        # Semua koneksi sedang dipakai: tunggu sampai ada yang dikembalikan
+        return idle.get()
+
+    def _release(self, conn: sqlite3.Connection):
+        if self._pid != os.getpid():
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close_all(self):
+        """Menutup semua koneksi idle (misalnya setelah database dibuat ulang)."""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._reset()
+
+db_pool = ConnectionPool(DATABASE_FILE, RAG_DB_POOL_SIZE)
 
+# Pencocok nama/kode produk di memori (per worker), dibangun dari tabel products
+# dan dibangun ulang setiap kali versi nama produk berubah (produk baru/dihapus,
+# nama atau kode diubah; perubahan stok/harga tidak mempengaruhinya)
+product_matcher = ProductMatcher()
+_product_matcher_lock = threading.Lock()
+
+def _build_product_matcher(names_version: int):
+    global product_matcher
+    with db_pool.connection() as conn:
+        rows = conn.execute(SQL_CATALOG_PRODUCTS).fetchall()
+    product_matcher = ProductMatcher(rows, version=names_version)
+    logger.info("Pencocok produk dibangun ulang: %d produk (versi nama produk %s).", product_matcher.size, names_version)
+
+def _rebuild_product_matcher_in_background(names_version: int):
+    # Hanya satu pembangunan ulang dalam satu waktu; request lain tetap memakai pencocok lama
+    if not _product_matcher_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            _build_product_matcher(names_version)
+        except sqlite3.Error as e:
+            logger.warning("Gagal membangun ulang pencocok produk: %s", e)
+        finally:
+            _product_matcher_lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+
+def get_product_matcher(names_version: int) -> ProductMatcher:
+    """
+    Pencocok produk saat ini. Jika versi nama produk berubah, pencocok baru dibangun
+    di thread latar belakang lalu ditukar setelah selesai; sementara itu request
+    memakai pencocok lama (produk yang belum dikenal dicari lewat FTS). Hanya
+    pembangunan pertama (belum ada pencocok sama sekali) yang ditunggu.
+    """
+    if product_matcher.version == names_version:
+        return product_matcher
+    if product_matcher.version is None:
+        with _product_matcher_lock:
+            if product_matcher.version is None:
+                _build_product_matcher(names_version)
+    else:
+        _rebuild_product_matcher_in_background(names_version)
+    return product_matcher
+
+# Trigger untuk menjaga indeks FTS dan versi katalog tetap sinkron dengan tabel products.
+# Disimpan per nama agar impor katalog bisa menonaktifkannya sementara (lihat import_catalog).
+PRODUCT_TRIGGERS = {
+    "products_fts_ai": """
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, name, product_code, description)
+            VALUES (new.id, new.name, new.product_code, new.description);
+        END""",
+    "products_fts_ad": """
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, product_code, description)
+            VALUES ('delete', old.id, old.name, old.product_code, old.description);
+        END""",
+    "products_fts_au": """
+        CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, product_code, description)
+            VALUES ('delete', old.id, old.name, old.product_code, old.description);
+            INSERT INTO products_fts(rowid, name, product_code, description)
+            VALUES (new.id, new.name, new.product_code, new.description);
+        END""",
+    "catalog_version_ai": """
+        CREATE TRIGGER IF NOT EXISTS catalog_version_ai AFTER INSERT ON products BEGIN
+            UPDATE catalog_meta SET version = version + 1, names_version = names_version + 1 WHERE id = 1;
+        END""",
+    "catalog_version_ad": """
+        CREATE TRIGGER IF NOT EXISTS catalog_version_ad AFTER DELETE ON products BEGIN
+            UPDATE catalog_meta SET version = version + 1, names_version = names_version + 1 WHERE id = 1;
+        END""",
+    # Perubahan stok saja tidak menaikkan versi: cache stok di App Backend sudah ber-TTL pendek
+    "catalog_version_au": """
+        CREATE TRIGGER IF NOT EXISTS catalog_version_au AFTER UPDATE OF name, product_code, price, description ON products BEGIN
+            UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+        END""",
+    # Versi nama produk (pencocok produk, GET /catalog) hanya berubah jika nama atau kode berubah
+    "catalog_names_version_au": """
+        CREATE TRIGGER IF NOT EXISTS catalog_names_version_au AFTER UPDATE OF name, product_code ON products BEGIN
+            UPDATE catalog_meta SET names_version = names_version + 1 WHERE id = 1;
+        END""",
+}
+
+def create_schema(cursor: sqlite3.Cursor):
+    """
+    Membuat tabel produk beserta indeksnya (idempotent).
+    - Indeks NOCASE pada product_code dan name untuk jalur cepat pencocokan persis.
+    - Indeks FTS5 trigram atas name, product_code dan description untuk pencarian
+      substring yang ter-ranking tanpa full table scan. Indeks FTS memakai
+      external content (tabel products) dan dijaga tetap sinkron oleh trigger.
+    """
     # Buat tabel jika belum ada
     # Menambahkan kolom 'product_code'
     cursor.execute('''
@@ -35,37 +261,324 @@ def init_db():
             description TEXT
         )
     ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_code_nocase ON products(product_code COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_name_nocase ON products(name COLLATE NOCASE)")
 
-    # Data sampel produk (menambahkan kode produk)
-    products_data = [
-        ('PROD001', 'Produk A', 1200.00, 50, 'Produk A adalah barang elektronik berkualitas tinggi dengan garansi 2 tahun.'),
-        ('LAPTOPX', 'Laptop Gaming X', 15000.00, 15, 'Laptop Gaming X memiliki RAM 16GB, SSD 512GB, dan RTX 3060 untuk pengalaman gaming terbaik.'),
-        ('SMARTZ', 'Smartphone Z', 800.00, 120, 'Smartphone Z dilengkapi kamera 108MP, baterai tahan lama, dan layar AMOLED.'),
-        ('HPWPRO', 'Headphone Wireless Pro', 250.00, 75, 'Headphone Wireless Pro menawarkan kualitas suara superior, noise cancellation, dan daya tahan baterai hingga 30 jam.')
-    ]
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")
+    fts_existed = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, product_code, description,
+            content='products', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    # Versi katalog: dinaikkan setiap kali data produk (selain stok) berubah, dikirim di setiap
+    # respons agar App Backend bisa membuang cache RAG yang sudah usang.
+    # Versi nama produk: hanya dinaikkan jika daftar nama/kode produk berubah,
+    # dipakai untuk pencocok produk dan ETag GET /catalog.
+    cursor.execute("CREATE TABLE IF NOT EXISTS catalog_meta (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+    cursor.execute("PRAGMA table_info(catalog_meta)")
+    if "names_version" not in {column[1] for column in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE catalog_meta ADD COLUMN names_version INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("INSERT OR IGNORE INTO catalog_meta (id, version, names_version) VALUES (1, 0, 0)")
 
-    # Masukkan data sampel (hanya jika tabel kosong)
+    # Trigger untuk menjaga indeks FTS dan versi katalog tetap sinkron dengan tabel products.
+    # Dibuat ulang agar database lama memakai definisi trigger terbaru.
+    for trigger_name, trigger_sql in PRODUCT_TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+        cursor.execute(trigger_sql)
+
+    # Database lama (dibuat sebelum ada indeks FTS) atau indeks yang tidak sinkron:
+    # isi ulang indeks dari tabel products. Jumlah dokumen terindeks dibaca dari
+    # tabel bayangan _docsize, karena COUNT(*) pada tabel external content membaca products.
     cursor.execute("SELECT COUNT(*) FROM products")
-    if cursor.fetchone()[0] == 0:
-        cursor.executemany("INSERT INTO products (product_code, name, price, stock, description) VALUES (?, ?, ?, ?, ?)", products_data)
-        print("Data produk sampel berhasil diimpor.")
-    else:
-        print("Tabel 'products' sudah berisi data (ini seharusnya tidak terjadi setelah penghapusan database).")
+    product_count = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM products_fts_docsize")
+    if not fts_existed or cursor.fetchone()[0] != product_count:
+        cursor.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
+        # Versi katalog dinaikkan agar cache RAG dan pencocok produk dimuat ulang
+        cursor.execute("UPDATE catalog_meta SET version = version + 1, names_version = names_version + 1 WHERE id = 1")
+
+# Data sampel produk, diisi hanya jika tabel products masih kosong
+SAMPLE_PRODUCTS = [
+    ('PROD001', 'Produk A', 1200.00, 50, 'Produk A adalah barang elektronik berkualitas tinggi dengan garansi 2 tahun.'),
+    ('LAPTOPX', 'Laptop Gaming X', 15000.00, 15, 'Laptop Gaming X memiliki RAM 16GB, SSD 512GB, dan RTX 3060 untuk pengalaman gaming terbaik.'),
+    ('SMARTZ', 'Smartphone Z', 800.00, 120, 'Smartphone Z dilengkapi kamera 108MP, baterai tahan lama, dan layar AMOLED.'),
+    ('HPWPRO', 'Headphone Wireless Pro', 250.00, 75, 'Headphone Wireless Pro menawarkan kualitas suara superior, noise cancellation, dan daya tahan baterai hingga 30 jam.')
+]
+
+# --- Impor katalog (lihat import_catalog) ---
+# Setiap chunk ditulis dulu ke tabel staging sementara (per koneksi), lalu
+# diterapkan ke tabel products dengan query berbasis himpunan. Trigger per baris
+# dinonaktifkan selama transaksi tersebut karena memperbarui indeks FTS baris
+# demi baris beberapa kali lebih lambat daripada satu INSERT ... SELECT.
+SQL_IMPORT_CREATE_STAGING = (
+    "CREATE TEMP TABLE IF NOT EXISTS catalog_import ("
+    "product_code TEXT PRIMARY KEY, name TEXT, price REAL, stock INTEGER, description TEXT)"
+)
+# Jika product_code muncul lebih dari sekali dalam file, baris terakhir yang dipakai
+SQL_IMPORT_STAGE = "INSERT OR REPLACE INTO catalog_import (product_code, name, price, stock, description) VALUES (?, ?, ?, ?, ?)"
+# Produk yang isinya sama persis dengan database tidak perlu ditulis ulang
+SQL_IMPORT_DROP_UNCHANGED = (
+    "DELETE FROM catalog_import WHERE EXISTS ("
+    "SELECT 1 FROM products p WHERE p.product_code = catalog_import.product_code "
+    "AND (p.name, p.price, p.stock, p.description) IS "
+    "(catalog_import.name, catalog_import.price, catalog_import.stock, catalog_import.description))"
+)
+# Jumlah produk baru atau yang nama/harga/deskripsinya berubah (untuk versi katalog)
+# dan jumlah produk baru atau yang namanya berubah (untuk versi nama produk).
+# Perubahan stok saja tidak menaikkan versi mana pun.
+SQL_IMPORT_COUNT_VERSION_CHANGES = (
+    "SELECT COALESCE(SUM(p.id IS NULL OR (p.name, p.price, p.description) IS NOT (s.name, s.price, s.description)), 0), "
+    "COALESCE(SUM(p.id IS NULL OR p.name IS NOT s.name), 0) "
+    "FROM catalog_import s LEFT JOIN products p ON p.product_code = s.product_code"
+)
+# Hapus entri FTS lama untuk produk yang akan diubah (sebelum upsert, selagi nilai lama masih ada)
+SQL_IMPORT_FTS_DELETE = (
+    "INSERT INTO products_fts(products_fts, rowid, name, product_code, description) "
+    "SELECT 'delete', p.id, p.name, p.product_code, p.description "
+    "FROM catalog_import s JOIN products p ON p.product_code = s.product_code"
+)
+# Upsert berdasarkan product_code ("WHERE true" diperlukan oleh parser SQLite untuk INSERT ... SELECT ... ON CONFLICT)
+SQL_IMPORT_UPSERT = (
+    "INSERT INTO products (product_code, name, price, stock, description) "
+    "SELECT product_code, name, price, stock, description FROM catalog_import WHERE true "
+    "ON CONFLICT(product_code) DO UPDATE SET "
+    "name = excluded.name, price = excluded.price, stock = excluded.stock, description = excluded.description"
+)
+SQL_IMPORT_FTS_INSERT = (
+    "INSERT INTO products_fts(rowid, name, product_code, description) "
+    "SELECT p.id, p.name, p.product_code, p.description "
+    "FROM catalog_import s JOIN products p ON p.product_code = s.product_code"
+)
+# Jumlah baris per transaksi saat impor katalog
+CATALOG_IMPORT_CHUNK_SIZE = int(os.getenv("RAG_IMPORT_CHUNK_SIZE", "50000"))
 
+def open_write_connection() -> sqlite3.Connection:
+    """
+    Membuka (atau membuat) database untuk ditulis dan memastikan skemanya ada.
+    Mode WAL bersifat persisten di file database: pembaca (pool read-only)
+    tidak saling memblokir dengan penulis, sehingga impor bisa berjalan
+    selagi server melayani query.
+    """
+    conn = sqlite3.connect(DATABASE_FILE, timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    # Dalam mode WAL, synchronous=NORMAL tetap aman dari korupsi dan jauh lebih cepat
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute(f"PRAGMA cache_size = -{RAG_DB_CACHE_SIZE_KIB}")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    create_schema(cursor)
     conn.commit()
+    return conn
 
-    # --- Tampilkan Data Sampel Setelah Inisialisasi ---
-    print("\n--- Data Produk yang Tersedia ---")
-    cursor.execute("SELECT id, product_code, name, price, stock, description FROM products")
-    products = cursor.fetchall()
-    if products:
-        for p_id, product_code, name, price, stock, description in products:
-            print(f"ID: {p_id}, Kode Produk: {product_code}, Nama: {name}, Harga: Rp.{price:.2f}, Stok: {stock}, Deskripsi: {description}")
-    else:
-        print("Tidak ada data produk.")
-    # --- Akhir Bagian Tampilkan Data Sampel ---
+def init_db():
+    """
+    Membuka database SQLite yang sudah ada (atau membuatnya jika belum ada),
+    memastikan skema terbaru, dan mengisi data sampel jika katalog masih kosong.
+    Data yang sudah ada tidak dihapus; katalog diperbarui lewat import_catalog().
+    """
+    conn = open_write_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM products")
+    product_count = cursor.fetchone()[0]
+    if product_count == 0:
+        with conn:
+            cursor.executemany("INSERT INTO products (product_code, name, price, stock, description) VALUES (?, ?, ?, ?, ?)", SAMPLE_PRODUCTS)
+        product_count = len(SAMPLE_PRODUCTS)
+        print("Data produk sampel berhasil diimpor.")
+
+    cursor.execute(SQL_CATALOG_VERSION)
+    print(f"Database '{DATABASE_FILE}' siap: {product_count} produk (versi katalog {cursor.fetchone()[0]}).")
+    conn.close()
+
+def _catalog_record_to_row(record: dict) -> tuple:
+    """Mengubah satu record katalog (dict CSV atau baris JSONL) menjadi tuple kolom tabel products."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    product_code = str(record.get("product_code") or "").strip()
+    name = str(record.get("name") or "").strip()
+    if not product_code or not name:
+        raise ValueError("product_code dan name wajib diisi")
+    price = record.get("price")
+    stock = record.get("stock")
+    return (
+        product_code,
+        name,
+        float(price) if price not in (None, "") else None,
+        int(stock) if stock not in (None, "") else None,
+        record.get("description") or None,
+    )
+
+def read_catalog_records(path: str, file_format: str | None = None):
+    """
+    Membaca file katalog baris demi baris (tanpa memuat seluruh file ke memori).
+    Format ditentukan dari ekstensi (.csv atau .jsonl/.ndjson) jika tidak diberikan.
+    Menghasilkan pasangan (nomor baris, record): dict untuk CSV, teks baris untuk
+    JSONL (di-parse per baris agar satu baris rusak tidak menggagalkan impor).
+    """
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            # Nomor baris 1 adalah header
+            for line_number, record in enumerate(csv.DictReader(f), start=2):
+                yield line_number, record
+        elif file_format == "jsonl":
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, line
+        else:
+            raise ValueError(f"Format katalog tidak dikenal: {file_format}")
+
+def _apply_import_chunk(conn: sqlite3.Connection, rows: list[tuple]) -> int:
+    """
+    Menerapkan satu chunk katalog dalam satu transaksi dan mengembalikan jumlah
+    produk yang baru atau berubah. Trigger per baris di-drop lalu dibuat ulang di
+    dalam transaksi yang sama, sehingga pembaca tidak pernah melihat database
+    tanpa trigger dan rollback mengembalikan semuanya.
+    """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM catalog_import")
+        conn.executemany(SQL_IMPORT_STAGE, rows)
+        conn.execute(SQL_IMPORT_DROP_UNCHANGED)
+        changed = conn.execute("SELECT COUNT(*) FROM catalog_import").fetchone()[0]
+        if changed:
+            data_changed, names_changed = conn.execute(SQL_IMPORT_COUNT_VERSION_CHANGES).fetchone()
+            for trigger_name in PRODUCT_TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+            conn.execute(SQL_IMPORT_FTS_DELETE)
+            conn.execute(SQL_IMPORT_UPSERT)
+            conn.execute(SQL_IMPORT_FTS_INSERT)
+            # Sama seperti trigger versi katalog: naik satu untuk setiap produk yang berubah
+            conn.execute(
+                "UPDATE catalog_meta SET version = version + ?, names_version = names_version + ? WHERE id = 1",
+                (data_changed, names_changed),
+            )
+            for trigger_sql in PRODUCT_TRIGGERS.values():
+                conn.execute(trigger_sql)
+    return changed
 
+def import_catalog(path: str, file_format: str | None = None, chunk_size: int = CATALOG_IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Mengimpor file katalog CSV/JSONL ke tabel products secara bertahap tanpa
+    membangun ulang database. File dibaca per chunk (chunk_size baris), setiap
+    chunk dimasukkan dengan executemany dan diterapkan dalam satu transaksi;
+    produk di-upsert berdasarkan product_code dan produk yang tidak berubah
+    dilewati. Baris yang tidak valid dilewati dan dilaporkan. Server yang sedang
+    berjalan melihat perubahan lewat versi katalog tanpa perlu restart.
+    """
+    conn = open_write_connection()
+    conn.execute(SQL_IMPORT_CREATE_STAGING)
+
+    stats = {"rows": 0, "changed": 0, "skipped": 0}
+
+    def write_chunk(chunk):
+        stats["changed"] += _apply_import_chunk(conn, chunk)
+        stats["rows"] += len(chunk)
+        print(f"[RAG Import] {stats['rows']} baris diproses ({stats['changed']} baru/berubah)...")
+
+    chunk = []
+    for line_number, record in read_catalog_records(path, file_format):
+        try:
+            chunk.append(_catalog_record_to_row(record))
+        except (ValueError, TypeError, AttributeError) as e:
+            stats["skipped"] += 1
+            print(f"[RAG Import] Baris {line_number} dilewati: {e}")
+            continue
+        if len(chunk) >= chunk_size:
+            write_chunk(chunk)
+            chunk = []
+    if chunk:
+        write_chunk(chunk)
+
+    stats["version"] = conn.execute(SQL_CATALOG_VERSION).fetchone()[0]
+    conn.execute("PRAGMA optimize")
     conn.close()
+    return stats
+
+# Kata kunci yang mungkin mendahului nama produk yang ingin diabaikan
+# Misalnya, "berapa sisa produk A" -> ingin mendapatkan "produk A"
+# Urutkan dari frasa terpanjang ke terpendek
+LEADING_PHRASES = (
+    "berapa sisa ", "detail stok ", "harga ", "stok ", "detail ",
+    "apa itu ", "jelaskan ", "nama produk "
+)
+
+def extract_product_name(q_lower_local: str) -> str:
+    """
+    Mengekstrak nama produk dari kueri (sudah lowercase).
+    Karena 'tipe' sudah eksplisit, fungsi ini hanya perlu fokus pada nama produk.
+    """
+    for phrase in LEADING_PHRASES:
+        if q_lower_local.startswith(phrase):
+            return q_lower_local[len(phrase):].strip() # Hentikan setelah menemukan dan menghapus frasa yang cocok pertama
+
+    # Jika query_lower adalah "produk A" atau "laptop gaming x"
+    # dan tidak ada frasa di atas, maka nama produk sama dengan query_lower
+    return q_lower_local
+
+def lookup_product(conn: sqlite3.Connection, product_search_term: str):
+    """
+    Mencari satu produk berdasarkan nama atau kode produk.
+    Urutan: kode/nama yang cocok persis, lalu pencarian FTS5 ter-ranking
+    (atau LIKE untuk istilah yang terlalu pendek untuk indeks trigram).
+    Mengembalikan tuple (name, price, stock, description) atau None.
+    """
+    term = product_search_term.strip()
+    if not term:
+        return None
+
+    result = conn.execute(SQL_LOOKUP_EXACT, (term,)).fetchone()
+    if result:
+        return result
+
+    if len(term) >= FTS_MIN_TERM_LENGTH:
+        # Kutip istilah sebagai frasa FTS5 agar karakter khusus tidak dianggap operator
+        match_expression = '"' + term.replace('"', '""') + '"'
+        return conn.execute(SQL_LOOKUP_FTS, (match_expression,)).fetchone()
+
+    pattern = '%' + term + '%'
+    return conn.execute(SQL_LOOKUP_LIKE, (pattern, pattern)).fetchone()
+
+def lookup_products_batch(conn: sqlite3.Connection, product_search_terms: list[str]) -> list:
+    """
+    Mencari beberapa produk sekaligus dengan satu statement SQL (pencocokan persis
+    kode/nama). Istilah yang tidak cocok persis dicari satu per satu lewat
+    lookup_product() pada koneksi yang sama. Mengembalikan hasil sesuai urutan input.
+    """
+    results = [None] * len(product_search_terms)
+    values = ", ".join(["(?, ?)"] * len(product_search_terms))
+    params = [value for idx, term in enumerate(product_search_terms) for value in (idx, term.strip())]
+    for idx, *row in conn.execute(SQL_LOOKUP_EXACT_BATCH.format(values=values), params):
+        if results[idx] is None:
+            results[idx] = tuple(row)
+
+    for idx, term in enumerate(product_search_terms):
+        if results[idx] is None:
+            results[idx] = lookup_product(conn, term)
+    return results
+
+def format_product_data(result, tipe: str) -> str:
+    """
+    Memformat baris produk sesuai tipe informasi yang diminta.
+    Harga, stok dan deskripsi boleh kosong (NULL, misalnya dari impor katalog).
+    """
+    name, price, stock, description = result
+    if tipe == "harga":
+        return f"Harga {name} adalah Rp.{price:.0f} " if price is not None else f"Harga {name} belum tersedia."
+    if tipe == "stok":
+        return f"Stok {name} saat ini tersedia {stock} unit." if stock is not None else f"Stok {name} belum tersedia."
+    if tipe == "detail":
+        return f"Detail {name}: {description}" if description else f"Detail {name} belum tersedia."
+    # Format respons yang lebih komprehensif untuk tipe lain
+    return (
+        f"Informasi Produk: {name}. "
+        f"Deskripsi: {description or 'belum tersedia'}. "
+        f"Harga: {f'Rp. {price:.2f}' if price is not None else 'belum tersedia'}. "
+        f"Stok: {f'{stock} unit' if stock is not None else 'belum tersedia'}."
+    )
 
 @app.route('/rag_query', methods=['POST'])
 def rag_query():
@@ -78,87 +591,173 @@ def rag_query():
     if not tipe or tipe not in ['harga', 'stok', 'detail']:
         return jsonify({"error": "Invalid or missing 'tipe' parameter. Must be 'harga', 'stok', or 'detail'."}), 400
 
-    print(f"\n[RAG Server] Menerima query RAG: '{query}' dengan tipe: '{tipe}'")
+    logger.info("Menerima query RAG: '%s' dengan tipe: '%s'", query, tipe)
 
-    # Simulasi delay query ke database
-    time.sleep(random.uniform(0.1, 0.5))
+    # Sisa waktu yang diberikan oleh pemanggil (App Backend)
+    deadline = deadline_from_headers(request.headers, RAG_DEFAULT_TIMEOUT)
+
+    try:
+        fault_injector.inject(max_delay=deadline.remaining())
+    except InjectedFault as e:
+        return jsonify({"error": str(e)}), 503
+    if deadline.expired():
+        logger.warning("Deadline request sudah habis sebelum query dijalankan.")
+        return jsonify({"error": "Deadline exceeded"}), 504
 
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
     found_data = "Tidak ada data relevan dari database."
 
     query_lower = query.lower()
-    print(f"[RAG Server] query_lower (setelah di-lowercase): '{query_lower}'") # Debug print
-
-    # Fungsi pembantu untuk mengekstrak nama produk dari kueri
-    # Karena 'tipe' sudah eksplisit, fungsi ini hanya perlu fokus pada nama produk.
-    def extract_product_name(q_lower_local):
-        # Kata kunci yang mungkin mendahului nama produk yang ingin diabaikan
-        # Misalnya, "berapa sisa produk A" -> ingin mendapatkan "produk A"
-        # Urutkan dari frasa terpanjang ke terpendek
-        leading_phrases = [
-            "berapa sisa ", "detail stok ", "harga ", "stok ", "detail ",
-            "apa itu ", "jelaskan ", "nama produk "
-        ]
-        
-        extracted_name = q_lower_local
-        for phrase in leading_phrases:
-            if extracted_name.startswith(phrase): 
-                extracted_name = extracted_name[len(phrase):].strip()
-                break # Hentikan setelah menemukan dan menghapus frasa yang cocok pertama
-        
-        # Jika query_lower adalah "produk A" atau "laptop gaming x"
-        # dan tidak ada frasa di atas, maka extracted_name akan sama dengan query_lower
-        return extracted_name
-
-    # Ekstrak nama produk yang mungkin dari kueri yang diterima
-    product_search_term = extract_product_name(query_lower)
-    print(f"[RAG Server] product_search_term (hasil ekstraksi): '{product_search_term}'") # Debug print
-
-    # Logika pencarian berdasarkan parameter 'tipe'
-    if tipe == "harga":
-        print("[RAG Server] Mencari informasi harga.") # Debug print
-        cursor.execute("SELECT name, price FROM products WHERE LOWER(name) LIKE ? OR LOWER(product_code) LIKE ?", ('%' + product_search_term + '%', '%' + product_search_term + '%',))
-        result = cursor.fetchone()
-        if result:
-            found_data = f"Harga {result[0]} adalah Rp.{result[1]:.0f} "
-    
-    elif tipe == "stok":
-        print("[RAG Server] Mencari informasi stok.") # Debug print
-        cursor.execute("SELECT name, stock FROM products WHERE LOWER(name) LIKE ? OR LOWER(product_code) LIKE ?", ('%' + product_search_term + '%', '%' + product_search_term + '%',))
-        result = cursor.fetchone()
-        if result:
-            found_data = f"Stok {result[0]} saat ini tersedia {result[1]} unit."
-
-    elif tipe == "detail":
-        print("[RAG Server] Mencari informasi detail/deskripsi.") # Debug print
-        cursor.execute("SELECT name, description FROM products WHERE LOWER(name) LIKE ? OR LOWER(product_code) LIKE ?", ('%' + product_search_term + '%', '%' + product_search_term + '%',))
-        result = cursor.fetchone()
-        if result:
-            found_data = f"Detail {result[0]}: {result[1]}"
-    
-    # Fallback: Jika tidak ada tipe spesifik yang cocok atau tidak ditemukan data
-    # Meskipun 'tipe' sudah divalidasi, ini bisa jadi fallback jika pencarian spesifik gagal
-    if found_data == "Tidak ada data relevan dari database.":
-        print("[RAG Server] Tidak ada data spesifik ditemukan, mencoba pencarian umum.") # Debug print
-        cursor.execute("SELECT name, description, price, stock FROM products WHERE LOWER(name) LIKE ? OR LOWER(product_code) LIKE ?", ('%' + product_search_term + '%', '%' + product_search_term + '%',))
-        result = cursor.fetchone()
-        if result:
-            # Format respons yang lebih komprehensif jika ditemukan
-            found_data = (
-                f"Informasi Produk: {result[0]}. "
-                f"Deskripsi: {result[1]}. "
-                f"Harga: Rp. {result[2]:.2f}. "
-                f"Stok: {result[3]} unit."
-            )
 
-    conn.close()
-    
-    print(f"[RAG Server] Mengembalikan data: '{found_data}'")
-    return jsonify({"data": found_data})
+    with db_pool.connection() as conn:
+        catalog_version, names_version = conn.execute(SQL_CATALOG_VERSION).fetchone()
 
-if __name__ == '__main__':
-    # Inisialisasi database saat aplikasi dimulai
+        # Ekstrak nama produk dari kueri: nama kanonik dari katalog jika produk disebut,
+        # jika tidak, sisa kueri setelah frasa pembuka (untuk pencarian FTS)
+        with span("product_match"):
+            product_search_term = get_product_matcher(names_version).find_first(query_lower) or extract_product_name(query_lower)
+        logger.debug("product_search_term (hasil ekstraksi): '%s'", product_search_term)
+
+        # Satu query mengambil semua kolom; format jawaban ditentukan oleh parameter 'tipe'
+        # Hentikan query di tengah jalan jika deadline terlewati
+        conn.set_progress_handler(lambda: 1 if deadline.expired() else 0, RAG_DEADLINE_CHECK_INTERVAL)
+        try:
+            with span("sqlite"):
+                result = lookup_product(conn, product_search_term)
+        except sqlite3.OperationalError as e:
+            if not deadline.expired():
+                raise
+            logger.warning("Query dihentikan karena deadline terlewati: %s", e)
+            return jsonify({"error": "Deadline exceeded"}), 504
+        finally:
+            conn.set_progress_handler(None, 0)
+    if result:
+        found_data = format_product_data(result, tipe)
+
+    logger.debug("Mengembalikan data: '%s'", found_data)
+    return jsonify({"data": found_data, "version": catalog_version, "names_version": names_version})
+
+@app.route('/rag_query_batch', methods=['POST'])
+def rag_query_batch():
+    """
+    Versi batch dari /rag_query untuk pertanyaan yang menyebut beberapa produk.
+    Body JSON: {"items": [{"query": "...", "tipe": "harga"}, ...]}
+    Respons: {"results": [{"query": ..., "tipe": ..., "data": ...}, ...], "version": ..., "names_version": ...}
+    dengan urutan hasil sama dengan urutan item.
+    """
+    items = (request.get_json(silent=True) or {}).get('items')
+    if not items or not isinstance(items, list):
+        return jsonify({"error": "No items provided"}), 400
+    if len(items) > RAG_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many items. Maximum is {RAG_BATCH_MAX_ITEMS}."}), 400
+    for item in items:
+        if not isinstance(item, dict) or not item.get('query'):
+            return jsonify({"error": "Every item needs a 'query'."}), 400
+        if item.get('tipe') not in ['harga', 'stok', 'detail']:
+            return jsonify({"error": "Invalid or missing 'tipe' parameter. Must be 'harga', 'stok', or 'detail'."}), 400
+
+    logger.info("Menerima query RAG batch: %s", [(item['query'], item['tipe']) for item in items])
+
+    deadline = deadline_from_headers(request.headers, RAG_DEFAULT_TIMEOUT)
+
+    try:
+        fault_injector.inject(max_delay=deadline.remaining())
+    except InjectedFault as e:
+        return jsonify({"error": str(e)}), 503
+    if deadline.expired():
+        logger.warning("Deadline request sudah habis sebelum query dijalankan.")
+        return jsonify({"error": "Deadline exceeded"}), 504
+
+    with db_pool.connection() as conn:
+        catalog_version, names_version = conn.execute(SQL_CATALOG_VERSION).fetchone()
+        matcher = get_product_matcher(names_version)
+        search_terms = []
+        for item in items:
+            query_lower = item['query'].lower()
+            search_terms.append(matcher.find_first(query_lower) or extract_product_name(query_lower))
+
+        conn.set_progress_handler(lambda: 1 if deadline.expired() else 0, RAG_DEADLINE_CHECK_INTERVAL)
+        try:
+            with span("sqlite_batch"):
+                rows = lookup_products_batch(conn, search_terms)
+        except sqlite3.OperationalError as e:
+            if not deadline.expired():
+                raise
+            logger.warning("Query batch dihentikan karena deadline terlewati: %s", e)
+            return jsonify({"error": "Deadline exceeded"}), 504
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    results = [
+        {
+            "query": item['query'],
+            "tipe": item['tipe'],
+            "data": format_product_data(row, item['tipe']) if row else "Tidak ada data relevan dari database.",
+        }
+        for item, row in zip(items, rows)
+    ]
+    logger.debug("Mengembalikan data batch: %s", [result['data'] for result in results])
+    return jsonify({"results": results, "version": catalog_version, "names_version": names_version})
+
+def database_ready() -> bool:
+    with db_pool.connection() as conn:
+        return conn.execute(SQL_CATALOG_VERSION).fetchone() is not None
+
+# GET /healthz dan GET /readyz (siap jika database bisa dibaca)
+init_health_endpoints(app, {"database": database_ready})
+
+def preload():
+    """
+    Mode produksi: dijalankan sekali di proses master sebelum worker di-fork.
+    Database disiapkan dan pencocok produk dibangun di sini, sehingga setiap
+    worker mewarisinya dan tidak perlu membacanya ulang dari tabel products.
+    """
     init_db()
-    print("Memulai MCP Server RAG di http://127.0.0.1:5001")
-    app.run(port=5001, debug=True) # debug=True hanya untuk pengembangan
+    with db_pool.connection() as conn:
+        names_version = conn.execute(SQL_CATALOG_VERSION).fetchone()[1]
+    get_product_matcher(names_version)
+    # Koneksi milik master tidak dipakai worker (pool dikosongkan setelah fork)
+    db_pool.close_all()
+
+@app.route('/catalog', methods=['GET'])
+def catalog():
+    """
+    Daftar kode dan nama semua produk beserta versi nama produk, dipakai App Backend
+    untuk membangun pencocok produknya sendiri. Versi nama produk dipakai sebagai
+    ETag, sehingga pemanggil dengan If-None-Match yang sama mendapat 304; perubahan
+    stok atau harga tidak membuat katalog diunduh ulang.
+    """
+    with db_pool.connection() as conn:
+        names_version = conn.execute(SQL_CATALOG_VERSION).fetchone()[1]
+        if request.if_none_match.contains(str(names_version)):
+            response = Response(status=304)
+            response.set_etag(str(names_version))
+            return response
+        products = conn.execute(SQL_CATALOG_PRODUCTS).fetchall()
+
+    response = jsonify({"names_version": names_version, "products": products})
+    response.set_etag(str(names_version))
+    return response
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="MCP Server RAG")
+    parser.add_argument("--import", dest="import_files", nargs="+", metavar="FILE",
+                        help="impor/perbarui katalog dari file CSV atau JSONL lalu keluar (tanpa menjalankan server)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="format file katalog (default: dari ekstensi file)")
+    parser.add_argument("--chunk-size", type=int, default=CATALOG_IMPORT_CHUNK_SIZE, help="jumlah baris per transaksi")
+    add_production_arguments(parser)
+    args = parser.parse_args()
+
+    if args.import_files:
+        for import_file in args.import_files:
+            start_time = time.perf_counter()
+            stats = import_catalog(import_file, args.format, args.chunk_size)
+            print(f"[RAG Import] '{import_file}': {stats['rows']} baris, {stats['changed']} baru/berubah, "
+                  f"{stats['skipped']} dilewati dalam {time.perf_counter() - start_time:.1f} detik (versi katalog {stats['version']}).")
+    elif args.production:
+        run_production(app, "RAG", args, 5001, preload=preload, on_worker_exit=db_pool.close_all)
+    else:
+        # Buka database yang ada (dibuat jika belum ada) saat aplikasi dimulai
+        init_db()
+        print("Memulai MCP Server RAG di http://127.0.0.1:5001")
+        app.run(port=5001, debug=True) # debug=True hanya untuk pengembangan
@@ -0,0 +1,395 @@
+"""
+Antrean notifikasi Telegram yang tahan restart (SQLite) dengan worker pool.
+
+- enqueue() hanya menulis satu baris ke database lalu kembali, sehingga endpoint
+  /send_notification bisa langsung menjawab 202.
+- Worker di latar belakang mengambil pesan per chat. Semua pesan yang menumpuk
+  untuk chat yang sama (burst) digabung menjadi satu pesan Telegram, maksimal
+  TELEGRAM_MAX_MESSAGE_LENGTH karakter.
+- Batas kecepatan Telegram dihormati: minimal chat_interval detik antar pesan ke
+  chat yang sama, dan maksimal global_rate pesan per detik untuk seluruh bot.
+  Balasan 429 dari Telegram (retry_after) menunda chat tersebut sesuai permintaan.
+- Pengiriman yang gagal dicoba ulang dengan exponential backoff + jitter sampai
+  max_attempts, lalu ditandai 'failed'. Error permanen (4xx selain 429) langsung
+  ditandai 'failed'.
+- Klaim pesan memakai status 'sending' dengan lease, sehingga pesan yang sedang
+  dikirim saat proses mati akan dikirim ulang setelah lease habis, dan beberapa
+  proses worker bisa berbagi satu file antrean.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from telemetry import get_logger, set_request_id, span
+
+logger = get_logger("notification_queue")
+
+# Panjang maksimum satu pesan Telegram
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+# Pemisah antar pesan yang digabung
+COALESCE_SEPARATOR = "\n\n"
+
+class DeliveryError(Exception):
+    """
+    Kegagalan mengirim ke Telegram.
+    retry_after: jeda (detik) yang diminta Telegram (HTTP 429), jika ada.
+    permanent: True jika percobaan ulang tidak ada gunanya (misalnya chat tidak ditemukan).
+    """
+
+    def __init__(self, message: str, retry_after: float | None = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    request_id TEXT,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending, sending, sent, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    sent_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_due ON notifications(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_chat ON notifications(chat_id, status, id);
+-- Waktu paling awal pesan berikutnya boleh dikirim ke sebuah chat (batas per chat / 429)
+CREATE TABLE IF NOT EXISTS chat_rate (
+    chat_id TEXT PRIMARY KEY,
+    next_send_at REAL NOT NULL
+);
+"""
+
+# Chat yang pesan tertuanya sudah jatuh tempo, tidak sedang dikirim worker lain,
+# dan tidak sedang ditahan batas kecepatan per chat. Hanya pesan tertua yang dilihat
+# agar pesan yang sedang menunggu backoff tidak didahului pesan yang lebih baru.
+SQL_OLDEST_PENDING = """
+n.status = 'pending'
+  AND n.id = (SELECT MIN(p.id) FROM notifications p WHERE p.chat_id = n.chat_id AND p.status = 'pending')
+"""
+SQL_NEXT_CHAT = f"""
+SELECT n.chat_id FROM notifications n
+LEFT JOIN chat_rate r ON r.chat_id = n.chat_id
+WHERE {SQL_OLDEST_PENDING}
+  AND n.next_attempt_at <= :now
+  AND COALESCE(r.next_send_at, 0) <= :now
+  AND NOT EXISTS (SELECT 1 FROM notifications s WHERE s.chat_id = n.chat_id AND s.status = 'sending')
+ORDER BY n.next_attempt_at
+LIMIT 1
+"""
+# Pesan pending untuk satu chat sesuai urutan masuk; dibaca sampai pesan pertama yang belum jatuh tempo
+SQL_PENDING_FOR_CHAT = """
+SELECT id, message, attempts, request_id, next_attempt_at FROM notifications
+WHERE chat_id = ? AND status = 'pending'
+ORDER BY id
+"""
+SQL_NEXT_DUE = f"""
+SELECT MIN(MAX(n.next_attempt_at, COALESCE(r.next_send_at, 0))) FROM notifications n
+LEFT JOIN chat_rate r ON r.chat_id = n.chat_id
+WHERE {SQL_OLDEST_PENDING}
+"""
+
+class TokenBucket:
+    """Batas global: rata-rata `rate` pesan per detik dengan burst sampai `rate`."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event: threading.Event) -> bool:
+        """Menunggu satu token. False jika stop_event di-set sebelum token didapat."""
+        while not stop_event.is_set():
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            stop_event.wait(wait)
+        return False
+
+class NotificationQueue:
+    def __init__(
+        self,
+        database_file: str,
+        send,
+        workers: int = 4,
+        chat_interval: float = 1.0,
+        global_rate: float = 25.0,
+        coalesce_window: float = 0.2,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        lease: float = 60.0,
+        poll_interval: float = 0.5,
+        retention: float = 7 * 24 * 3600,
+    ):
+        """
+        send: fungsi send(chat_id, text) yang mengirim satu pesan ke Telegram dan
+        melempar DeliveryError jika gagal.
+        coalesce_window: pesan baru ditahan sebentar agar pesan lain dalam burst
+        yang sama bisa ikut digabung.
+        retention: umur (detik) pesan 'sent'/'failed' sebelum dihapus dari antrean.
+        """
+        self.database_file = database_file
+        self.send = send
+        self.workers = workers
+        self.chat_interval = chat_interval
+        self.coalesce_window = coalesce_window
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._global_limit = TokenBucket(global_rate)
+        self._local = threading.local()
+        # Endpoint memakai satu koneksi bersama (server threaded membuat thread baru per request)
+        self._producer_conn = None
+        self._producer_pid = None
+        self._producer_lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+        self._next_reclaim = 0.0
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+
+    def _open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database_file, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        # Satu koneksi per thread worker (dan per proses, agar koneksi tidak terbawa fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._open_connection()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _execute_producer(self, sql: str, params=()) -> tuple[int | None, list]:
+        """Dipakai dari thread request: satu koneksi bersama per proses, dipakai bergantian. Mengembalikan (lastrowid, rows)."""
+        with self._producer_lock:
+            if self._producer_conn is None or self._producer_pid != os.getpid():
+                self._producer_conn, self._producer_pid = self._open_connection(), os.getpid()
+            cursor = self._producer_conn.execute(sql, params)
+            return cursor.lastrowid, cursor.fetchall()
+
+    # --- Sisi produsen (endpoint) ---
+
+    def enqueue(self, chat_id: str, message: str, request_id: str | None = None) -> int:
+        # Waktu diambil di dalam lock agar urutan id sama dengan urutan next_attempt_at
+        # (pesan ke chat yang sama tidak saling mendahului)
+        with self._producer_lock:
+            now = time.time()
+            notification_id, _ = self._execute_producer(
+                "INSERT INTO notifications (chat_id, message, request_id, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?)",
+                (str(chat_id), message, request_id, now, now + self.coalesce_window),
+            )
+        self._wakeup.set()
+        return notification_id
+
+    def get(self, notification_id: int) -> dict | None:
+        _, rows = self._execute_producer(
+            "SELECT id, chat_id, status, attempts, created_at, sent_at, last_error FROM notifications WHERE id = ?",
+            (notification_id,),
+        )
+        if not rows:
+            return None
+        return dict(zip(("id", "chat_id", "status", "attempts", "created_at", "sent_at", "last_error"), rows[0]))
+
+    def stats(self) -> dict:
+        _, rows = self._execute_producer("SELECT status, COUNT(*) FROM notifications GROUP BY status")
+        counts = dict(rows)
+        return {status: counts.get(status, 0) for status in ("pending", "sending", "sent", "failed")}
+
+    # --- Sisi worker ---
+
+    def start(self):
+        """Menjalankan worker pool (idempotent per proses; aman dipanggil setelah fork)."""
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._worker_loop, name=f"notification-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        logger.info("%d worker notifikasi berjalan (antrean: %s).", self.workers, self.database_file)
+
+    @property
+    def running(self) -> bool:
+        """True jika worker pool berjalan di proses ini."""
+        return self._started_pid == os.getpid() and any(thread.is_alive() for thread in self._threads)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._start_lock:
+            self._started_pid = None
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim_batch()
+            except sqlite3.OperationalError as e:
+                logger.warning("Gagal mengambil pesan dari antrean: %s", e)
+                claimed = None
+            if claimed is None:
+                # Tidak ada pesan jatuh tempo: tunggu pesan baru, pesan berikutnya jatuh tempo,
+                # atau paling lama satu interval polling
+                self._wakeup.wait(self._idle_wait())
+                self._wakeup.clear()
+                continue
+            try:
+                self._deliver(*claimed)
+            except Exception as e:
+                # Misalnya "database is locked" saat mencatat hasil: pesan tetap 'sending'
+                # dan dikembalikan ke antrean setelah lease habis; worker tetap berjalan
+                logger.exception("Gagal memproses pesan untuk chat %s: %s", claimed[0], e)
+
+    def _claim_batch(self):
+        """
+        Mengklaim semua pesan jatuh tempo untuk satu chat (status 'sending') dalam
+        satu transaksi. Mengembalikan (chat_id, [(id, message, attempts, request_id), ...]) atau None.
+        """
+        conn = self._connection()
+        now = time.time()
+        if now >= self._next_reclaim:
+            self._next_reclaim = now + min(self.lease, 10.0)
+            # Pesan yang diklaim worker yang mati (lease habis) dikembalikan ke antrean,
+            # pesan yang sudah selesai lebih lama dari retention dihapus
+            conn.execute(
+                "UPDATE notifications SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?",
+                (now - self.lease,),
+            )
+            conn.execute(
+                "DELETE FROM notifications WHERE status IN ('sent', 'failed') AND created_at < ?",
+                (now - self.retention,),
+            )
+        # Cek tanpa lock tulis dulu, agar worker yang menganggur tidak menahan enqueue
+        if conn.execute(SQL_NEXT_CHAT, {"now": now}).fetchone() is None:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(SQL_NEXT_CHAT, {"now": now}).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            chat_id = row[0]
+            batch, length = [], 0
+            for *notification, next_attempt_at in conn.execute(SQL_PENDING_FOR_CHAT, (chat_id,)):
+                if next_attempt_at > now:
+                    break
+                added_length = len(notification[1]) + (len(COALESCE_SEPARATOR) if batch else 0)
+                if batch and length + added_length > TELEGRAM_MAX_MESSAGE_LENGTH:
+                    break
+                batch.append(notification)
+                length += added_length
+            conn.executemany(
+                "UPDATE notifications SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, notification[0]) for notification in batch],
+            )
+            conn.execute("COMMIT")
+            return chat_id, batch
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _idle_wait(self) -> float:
+        next_due = self._connection().execute(SQL_NEXT_DUE).fetchone()[0]
+        if next_due is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(0.05, next_due - time.time()))
+
+    def _deliver(self, chat_id: str, batch: list):
+        ids = [notification[0] for notification in batch]
+        text = COALESCE_SEPARATOR.join(notification[1] for notification in batch)
+        # Log pengiriman memakai request ID dari pesan pertama dalam gabungan
+        set_request_id(batch[0][3])
+        if len(text) > TELEGRAM_MAX_MESSAGE_LENGTH:
+            text = text[:TELEGRAM_MAX_MESSAGE_LENGTH - 1] + "…"
+
+        if not self._global_limit.acquire(self._stop):
+            # Worker dihentikan sebelum dapat giliran kirim: pesan dikembalikan ke antrean
+            self._connection().executemany(
+                "UPDATE notifications SET status = 'pending' WHERE id = ? AND status = 'sending'",
+                [(notification_id,) for notification_id in ids],
+            )
+            return
+        retry_after = None
+        try:
+            with span("telegram_send"):
+                self.send(chat_id, text)
+        except DeliveryError as e:
+            error = e
+            retry_after = e.retry_after
+        except Exception as e:
+            error = DeliveryError(str(e))
+        else:
+            error = None
+
+        conn = self._connection()
+        now = time.time()
+        # Jeda minimum sebelum pesan berikutnya ke chat ini (atau sesuai 429 dari Telegram)
+        next_send_at = now + max(self.chat_interval, retry_after or 0)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO chat_rate (chat_id, next_send_at) VALUES (?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET next_send_at = excluded.next_send_at",
+                (chat_id, next_send_at),
+            )
+            if error is None:
+                conn.executemany(
+                    "UPDATE notifications SET status = 'sent', sent_at = ?, attempts = attempts + 1, last_error = NULL WHERE id = ?",
+                    [(now, notification_id) for notification_id in ids],
+                )
+            else:
+                updates = []
+                for notification_id, _, attempts, _ in batch:
+                    attempts += 1
+                    if error.permanent or (retry_after is None and attempts >= self.max_attempts):
+                        updates.append(("failed", attempts, now, str(error), notification_id))
+                    else:
+                        updates.append(("pending", attempts, now + self._backoff(attempts, retry_after), str(error), notification_id))
+                conn.executemany(
+                    "UPDATE notifications SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    updates,
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        if error is None:
+            logger.debug("%d pesan dikirim ke chat %s sebagai satu pesan Telegram.", len(ids), chat_id)
+        else:
+            logger.warning("Gagal mengirim %d pesan ke chat %s: %s", len(ids), chat_id, error)
+
+    def _backoff(self, attempts: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            # 429 bukan kegagalan pesan: ikuti jeda dari Telegram tanpa backoff tambahan
+            return retry_after
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
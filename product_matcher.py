@@ -0,0 +1,76 @@
+"""
+Pencocok nama/kode produk berbasis trie kata.
+
+Semua nama dan kode produk dari katalog dimasukkan ke trie per kata (lowercase),
+sehingga produk yang disebut dalam sebuah kalimat bisa ditemukan dalam satu kali
+pemindaian token kalimat tersebut, tanpa regex per produk dan tanpa query ke
+database. Dipakai oleh App Backend (untuk menentukan produk sebelum memanggil
+MCP Server RAG) dan oleh MCP Server RAG (untuk mengekstrak nama produk dari query).
+"""
+import re
+
+# Token = rangkaian huruf/angka; tanda baca dan spasi menjadi pemisah
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# Penanda di node trie bahwa rangkaian kata sampai node ini adalah produk
+_TERMINAL = ""
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+class ProductMatcher:
+    def __init__(self, products=(), version=None):
+        """
+        products: iterable berisi pasangan (product_code, name).
+        version: versi katalog asal data (untuk mendeteksi kapan perlu dimuat ulang).
+        """
+        self.version = version
+        self.size = 0
+        self._root = {}
+        for product_code, name in products:
+            self.add(name, name)
+            self.add(product_code, name)
+            self.size += 1
+
+    def add(self, phrase: str, canonical_name: str):
+        tokens = tokenize(phrase or "")
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # Jika dua produk punya frasa yang sama, yang pertama dimasukkan yang dipakai
+        node.setdefault(_TERMINAL, canonical_name)
+
+    def find_all(self, text: str) -> list[str]:
+        """
+        Mengembalikan nama kanonik semua produk yang disebut di 'text' sesuai urutan
+        kemunculan (tanpa duplikat). Di setiap posisi dipilih kecocokan terpanjang,
+        lalu pemindaian berlanjut setelah kecocokan tersebut.
+        """
+        tokens = tokenize(text)
+        found = []
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            match_name, match_end = None, i
+            j = i
+            while j < len(tokens):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                j += 1
+                if _TERMINAL in node:
+                    match_name, match_end = node[_TERMINAL], j
+            if match_name is None:
+                i += 1
+                continue
+            if match_name not in found:
+                found.append(match_name)
+            i = match_end
+        return found
+
+    def find_first(self, text: str) -> str:
+        """Nama kanonik produk pertama yang disebut di 'text', atau string kosong."""
+        found = self.find_all(text)
+        return found[0] if found else ""
@@ -0,0 +1,121 @@
+"""
+Cache jawaban Gemini, aman dipakai dari banyak thread.
+
+Prompt ke Gemini hampir seluruhnya tetap (peran, instruksi, konteks RAG), sehingga
+pertanyaan yang sama tentang data produk yang sama menghasilkan jawaban yang sama.
+Jawaban disimpan dengan key hash dari (pertanyaan ternormalisasi, konteks RAG, peran).
+
+Mode mirip (opsional, similarity_threshold > 0): jika tidak ada yang cocok persis,
+pertanyaan dibandingkan dengan pertanyaan lain yang sudah di-cache untuk konteks
+dan peran yang sama memakai kemiripan Jaccard atas n-gram karakter. Karena konteks
+RAG harus identik, jawaban hanya dipakai ulang untuk data produk yang sama.
+"""
+import hashlib
+import re
+import threading
+
+from ttl_cache import TTLLRUCache
+
+_NON_WORD_PATTERN = re.compile(r"[^\w]+")
+
+def normalize_question(question: str) -> str:
+    """Lowercase, tanda baca dibuang dan spasi dirapikan."""
+    return " ".join(_NON_WORD_PATTERN.sub(" ", question.lower()).split())
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def char_ngrams(text: str, n: int) -> frozenset:
+    padded = f" {text} "
+    if len(padded) <= n:
+        return frozenset((padded,))
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+def jaccard_similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float, similarity_threshold: float = 0.0, ngram_size: int = 3):
+        self.similarity_threshold = similarity_threshold
+        self.ngram_size = ngram_size
+        # key -> (context_key, jawaban)
+        self._cache = TTLLRUCache(max_entries, default_ttl=ttl, on_remove=self._forget)
+        # Indeks untuk mode mirip: context_key -> {key: n-gram pertanyaan}
+        self._similar_index = {}
+        self._index_lock = threading.Lock()
+        self.lookups = 0
+        self.similar_hits = 0
+
+    def _keys(self, question: str, context: str, role: str) -> tuple[str, str, str]:
+        normalized = normalize_question(question)
+        context_key = _digest(context, role)
+        return normalized, context_key, _digest(normalized, context_key)
+
+    def get(self, question: str, context: str, role: str) -> str | None:
+        normalized, context_key, key = self._keys(question, context, role)
+        with self._index_lock:
+            self.lookups += 1
+        entry = self._cache.get(key)
+        if entry is not None:
+            return entry[1]
+        if self.similarity_threshold <= 0:
+            return None
+
+        ngrams = char_ngrams(normalized, self.ngram_size)
+        with self._index_lock:
+            candidates = list(self._similar_index.get(context_key, {}).items())
+        best_key, best_score = None, self.similarity_threshold
+        for candidate_key, candidate_ngrams in candidates:
+            score = jaccard_similarity(ngrams, candidate_ngrams)
+            if score >= best_score:
+                best_key, best_score = candidate_key, score
+        if best_key is None:
+            return None
+        entry = self._cache.get(best_key)
+        if entry is None:
+            return None
+        with self._index_lock:
+            self.similar_hits += 1
+        return entry[1]
+
+    def set(self, question: str, context: str, role: str, response: str):
+        normalized, context_key, key = self._keys(question, context, role)
+        # Indeks diisi sebelum entri masuk cache, agar eviction entri ini
+        # (lewat _forget) selalu menemukan dan membersihkan indeksnya
+        if self.similarity_threshold > 0 and self._cache.max_entries > 0:
+            with self._index_lock:
+                self._similar_index.setdefault(context_key, {})[key] = char_ngrams(normalized, self.ngram_size)
+        self._cache.set(key, (context_key, response))
+
+    def _forget(self, key, entry):
+        # Dipanggil oleh TTLLRUCache saat entri dibuang; jaga indeks mode mirip tetap sinkron
+        context_key = entry[0]
+        with self._index_lock:
+            bucket = self._similar_index.get(context_key)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._similar_index[context_key]
+
+    def invalidate(self) -> int:
+        return self._cache.invalidate()
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        with self._index_lock:
+            lookups, similar_hits = self.lookups, self.similar_hits
+        # TTLLRUCache juga menghitung get() kandidat mode mirip; hitung ulang per lookup
+        exact_hits = stats["hits"] - similar_hits
+        stats.update({
+            "lookups": lookups,
+            "hits": exact_hits + similar_hits,
+            "exact_hits": exact_hits,
+            "similar_hits": similar_hits,
+            "misses": lookups - exact_hits - similar_hits,
+            "hit_ratio": round((exact_hits + similar_hits) / lookups, 4) if lookups else 0.0,
+            "similarity_threshold": self.similarity_threshold,
+        })
+        return stats
@@ -0,0 +1,126 @@
+"""
+Mode produksi (WSGI, gunicorn) dan endpoint health/readiness untuk ketiga service Flask.
+
+    python3 app.py --production
+    python3 mcp-server-rag.py --production
+    python3 mcp-server-notification.py --production
+
+- Preload: modul service (model Gemini, database, pencocok produk, ...) dimuat
+  sekali di proses master, lalu fungsi preload() service dijalankan sebelum worker
+  di-fork. Worker mewarisi state tersebut (copy-on-write), sehingga biaya startup
+  dibayar sekali per deploy, bukan per worker.
+- Per worker: on_worker_start() dijalankan setelah fork (misalnya menyalakan thread
+  latar belakang, yang tidak ikut ter-fork), on_worker_exit() saat worker berhenti.
+- Graceful shutdown: pada SIGTERM worker berhenti menerima koneksi baru dan request
+  yang sedang berjalan diberi waktu <PREFIX>_GRACEFUL_TIMEOUT detik untuk selesai.
+- Jumlah worker (proses) dan thread per worker diatur lewat argumen --workers /
+  --threads / --bind, atau variabel lingkungan dengan prefix per service:
+
+    <PREFIX>_WEB_WORKERS       jumlah proses worker
+    <PREFIX>_WEB_THREADS       jumlah thread per worker (worker gthread)
+    <PREFIX>_BIND              alamat listen, misalnya "0.0.0.0:5000"
+    <PREFIX>_GRACEFUL_TIMEOUT  batas waktu graceful shutdown (detik, default 30)
+    <PREFIX>_WORKER_TIMEOUT    worker yang macet lebih lama dari ini (detik, default 60) di-restart
+
+  Prefix: BACKEND (app.py), RAG (mcp-server-rag.py), NOTIFICATION (mcp-server-notification.py).
+
+- GET /healthz (liveness): 200 selama proses bisa melayani request.
+  GET /readyz (readiness): 200 jika semua pemeriksaan readiness service lolos, 503 jika tidak.
+"""
+import argparse
+import os
+
+from telemetry import get_logger
+
+logger = get_logger("serving")
+
+def init_health_endpoints(app, readiness_checks: dict):
+    """
+    Memasang GET /healthz dan GET /readyz pada aplikasi Flask.
+    readiness_checks: {nama: fungsi tanpa argumen yang mengembalikan True jika siap}.
+    Pemeriksaan yang melempar exception dianggap belum siap.
+    """
+    from flask import jsonify
+
+    @app.route("/healthz", methods=["GET"])
+    def healthz():
+        return jsonify({"status": "ok", "pid": os.getpid()})
+
+    @app.route("/readyz", methods=["GET"])
+    def readyz():
+        checks = {}
+        for name, check in readiness_checks.items():
+            try:
+                checks[name] = bool(check())
+            except Exception as e:
+                logger.warning("Pemeriksaan readiness '%s' gagal: %s", name, e)
+                checks[name] = False
+        ready = all(checks.values())
+        return jsonify({"status": "ready" if ready else "not ready", "checks": checks}), 200 if ready else 503
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def add_production_arguments(parser: argparse.ArgumentParser):
+    """Argumen --production, --bind, --workers dan --threads untuk parser baris perintah service."""
+    parser.add_argument("--production", action="store_true", help="jalankan dengan gunicorn (preload, beberapa worker)")
+    parser.add_argument("--bind", help="alamat listen mode produksi, misalnya 0.0.0.0:5000")
+    parser.add_argument("--workers", type=int, help="jumlah proses worker mode produksi")
+    parser.add_argument("--threads", type=int, help="jumlah thread per worker mode produksi")
+
+def production_options(prefix: str, args: argparse.Namespace, default_port: int, default_workers: int, default_threads: int) -> dict:
+    """Opsi gunicorn dari argumen baris perintah, atau variabel lingkungan <PREFIX>_* jika tidak diberikan."""
+    workers = args.workers or _env_int(f"{prefix}_WEB_WORKERS", default_workers)
+    threads = args.threads or _env_int(f"{prefix}_WEB_THREADS", default_threads)
+    return {
+        "bind": args.bind or os.getenv(f"{prefix}_BIND", f"127.0.0.1:{default_port}"),
+        "workers": max(1, workers),
+        "threads": max(1, threads),
+        "worker_class": "gthread",
+        "preload_app": True,
+        "graceful_timeout": _env_int(f"{prefix}_GRACEFUL_TIMEOUT", 30),
+        # Batas heartbeat worker; request chat sendiri dibatasi CHAT_REQUEST_BUDGET
+        "timeout": _env_int(f"{prefix}_WORKER_TIMEOUT", 60),
+        "keepalive": 5,
+        # Beberapa service berjalan di host yang sama; socket kontrol gunicorn (26+) tidak dipakai
+        "control_socket_disable": True,
+    }
+
+def run_production(app, prefix: str, args: argparse.Namespace, default_port: int, preload=None, on_worker_start=None,
+                   on_worker_exit=None, default_workers: int | None = None, default_threads: int = 8):
+    """
+    Menjalankan aplikasi Flask dengan gunicorn (preload_app, worker gthread).
+    preload: dijalankan sekali di master sebelum fork.
+    on_worker_start / on_worker_exit: dijalankan di setiap worker setelah fork / saat berhenti.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    if default_workers is None:
+        default_workers = min(os.cpu_count() or 1, 4)
+    options = production_options(prefix, args, default_port, default_workers, default_threads)
+
+    def post_fork(server, worker):
+        if on_worker_start is not None:
+            on_worker_start()
+
+    def worker_exit(server, worker):
+        if on_worker_exit is not None:
+            on_worker_exit()
+
+    class PreloadedApplication(BaseApplication):
+        def load_config(self):
+            for key, value in {**options, "post_fork": post_fork, "worker_exit": worker_exit}.items():
+                if key in self.cfg.settings: # Pengaturan yang tidak dikenal versi gunicorn terpasang dilewati
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    if preload is not None:
+        preload()
+    logger.info(
+        "Mode produksi: %s, %d worker x %d thread (preload, graceful timeout %ds).",
+        options["bind"], options["workers"], options["threads"], options["graceful_timeout"],
+    )
+    PreloadedApplication().run()
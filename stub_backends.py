@@ -0,0 +1,175 @@
+"""
+Backend pengganti (stub) lokal untuk Gemini dan Telegram, untuk load test dan
+pengembangan tanpa GEMINI_API_KEY maupun bot Telegram sungguhan.
+Nonaktif secara default; diaktifkan lewat variabel lingkungan:
+
+    GEMINI_BACKEND=stub      app.py / app_async.py memakai StubGeminiModel
+    TELEGRAM_BACKEND=stub    mcp-server-notification.py memakai StubTelegramBot
+
+Function calling (argumen tools=...) didukung jika StubGeminiModel diberi tool_planner:
+fungsi yang menerima contents dan mengembalikan daftar panggilan tool (nama, argumen).
+Selama planner mengembalikan panggilan, stub menjawab dengan bagian function_call;
+setelah itu jawabannya dibuat dari hasil tool (function_response).
+
+Latensi memakai format yang sama dengan fault injection, "0.2" atau rentang "0.1-0.5" (detik):
+
+    GEMINI_STUB_LATENCY      durasi satu jawaban lengkap (default 0.5)
+    GEMINI_STUB_CHUNKS       jumlah potongan jawaban pada mode streaming (default 5)
+    TELEGRAM_STUB_LATENCY    durasi satu panggilan sendMessage (default 0.1)
+"""
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+
+import requests
+
+from conversation_store import estimate_tokens
+from fault_injection import parse_latency
+
+def _protos():
+    """
+    genai.protos, diimpor saat pertama dipakai: MCP Server Notification memakai
+    StubTelegramBot dari modul ini dan tidak membutuhkan SDK Gemini.
+    """
+    import google.generativeai as genai
+    return genai.protos
+
+class _StubCandidate:
+    def __init__(self, parts: list):
+        self.content = _protos().Content(role="model", parts=parts)
+
+class StubResponse:
+    def __init__(self, text: str = "", function_calls: list[tuple[str, dict]] | None = None):
+        self.text = text
+        # Seperti Gemini, jumlah token hanya lengkap di potongan terakhir (lihat StubGeminiModel._plan)
+        self.usage_metadata = None
+        # Bentuk yang sama dengan respons Gemini: candidates[0].content.parts
+        protos = _protos()
+        if function_calls:
+            parts = [protos.Part(function_call=protos.FunctionCall(name=name, args=args)) for name, args in function_calls]
+        else:
+            parts = [protos.Part(text=text)]
+        self.candidates = [_StubCandidate(parts)]
+
+class StubGeminiModel:
+    """Pengganti genai.GenerativeModel: generate_content dan generate_content_async, dengan atau tanpa stream."""
+
+    def __init__(self, latency: str = "0.5", chunks: int = 5, tool_planner=None, system_instruction: str | None = None):
+        self.min_latency, self.max_latency = parse_latency(latency)
+        self.chunks = max(1, chunks)
+        self.tool_planner = tool_planner
+        self.system_instruction = system_instruction
+
+    @classmethod
+    def from_env(cls, tool_planner=None, system_instruction: str | None = None):
+        return cls(os.getenv("GEMINI_STUB_LATENCY", "0.5"), int(os.getenv("GEMINI_STUB_CHUNKS", "5")), tool_planner, system_instruction)
+
+    def _input_tokens(self, prompt) -> int:
+        """Perkiraan token input (system instruction + prompt/contents), tanpa tokenizer."""
+        if isinstance(prompt, str):
+            text = prompt
+        else:
+            text = "".join(str(type(part).to_dict(part)) if part.function_call or part.function_response else part.text
+                           for content in prompt for part in content.parts)
+        return estimate_tokens((self.system_instruction or "") + text)
+
+    @staticmethod
+    def _answer_text(prompt) -> str:
+        # Jawaban dibuat dari konteks RAG di prompt (atau hasil tool), agar panjangnya ikut data produk seperti jawaban asli
+        if isinstance(prompt, str):
+            context = prompt.split("KONTEKS DATABASE:", 1)[-1].strip().split("\n\n", 1)[0]
+        else:
+            context = "\n".join(
+                str(part.function_response.response["result"])
+                for content in prompt for part in content.parts if "function_response" in part
+            )
+        return f"[stub] {context[:500]}"
+
+    def _function_calls(self, prompt, tools, tool_config) -> list[tuple[str, dict]]:
+        if not tools or self.tool_planner is None or isinstance(prompt, str):
+            return []
+        if tool_config is not None and tool_config.function_calling_config.mode == _protos().FunctionCallingConfig.Mode.NONE:
+            return []
+        return self.tool_planner(prompt)
+
+    def _plan(self, prompt, request_options: dict | None, tools=None, tool_config=None) -> tuple[list[StubResponse], float, bool]:
+        """Potongan respons, jeda per potongan, dan apakah timeout request terlampaui."""
+        function_calls = self._function_calls(prompt, tools, tool_config)
+        if function_calls:
+            pieces = [StubResponse(function_calls=function_calls)]
+            output_tokens = estimate_tokens(str(function_calls))
+        else:
+            text = self._answer_text(prompt)
+            size = -(-len(text) // self.chunks)
+            pieces = [StubResponse(text[i:i + size]) for i in range(0, len(text), size)]
+            output_tokens = estimate_tokens(text)
+        pieces[-1].usage_metadata = SimpleNamespace(
+            prompt_token_count=self._input_tokens(prompt), candidates_token_count=output_tokens
+        )
+        delay = random.uniform(self.min_latency, self.max_latency)
+        timeout = (request_options or {}).get("timeout")
+        timed_out = timeout is not None and delay > timeout
+        if timed_out:
+            delay = timeout
+        return pieces, delay / len(pieces), timed_out
+
+    @staticmethod
+    def _join(pieces: list[StubResponse]) -> StubResponse:
+        if len(pieces) == 1:
+            return pieces[0]
+        response = StubResponse("".join(piece.text for piece in pieces))
+        response.usage_metadata = pieces[-1].usage_metadata
+        return response
+
+    def generate_content(self, prompt, stream: bool = False, tools=None, tool_config=None, request_options: dict | None = None):
+        pieces, step, timed_out = self._plan(prompt, request_options, tools, tool_config)
+        if not stream:
+            time.sleep(step * len(pieces))
+            if timed_out:
+                raise TimeoutError("Stub Gemini: timeout request terlampaui.")
+            return self._join(pieces)
+
+        def chunks():
+            for piece in pieces:
+                time.sleep(step)
+                if timed_out:
+                    raise TimeoutError("Stub Gemini: timeout request terlampaui.")
+                yield piece
+        return chunks()
+
+    async def generate_content_async(self, prompt, stream: bool = False, tools=None, tool_config=None, request_options: dict | None = None):
+        pieces, step, timed_out = self._plan(prompt, request_options, tools, tool_config)
+        if not stream:
+            await asyncio.sleep(step * len(pieces))
+            if timed_out:
+                raise TimeoutError("Stub Gemini: timeout request terlampaui.")
+            return self._join(pieces)
+
+        async def chunks():
+            for piece in pieces:
+                await asyncio.sleep(step)
+                if timed_out:
+                    raise TimeoutError("Stub Gemini: timeout request terlampaui.")
+                yield piece
+        return chunks()
+
+class StubTelegramBot:
+    """Pengganti telebot.TeleBot untuk send_message; hanya menunggu selama latensi yang diatur."""
+
+    def __init__(self, latency: str = "0.1"):
+        self.min_latency, self.max_latency = parse_latency(latency)
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("TELEGRAM_STUB_LATENCY", "0.1"))
+
+    def send_message(self, chat_id, text, timeout=None, **kwargs):
+        delay = random.uniform(self.min_latency, self.max_latency)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            # Sama seperti telebot, yang memakai requests
+            raise requests.exceptions.ReadTimeout("Stub Telegram: timeout request terlampaui.")
+        time.sleep(delay)
+        return StubResponse(text)
@@ -0,0 +1,248 @@
+"""
+Logging, request ID dan metrik latensi untuk App Backend dan MCP Server.
+
+- Logging: logger standar Python dengan level dari LOG_LEVEL (default INFO).
+  Record hanya dimasukkan ke antrean di thread request; penulisan ke stdout
+  dilakukan oleh satu thread latar belakang (QueueListener), sehingga I/O log
+  tidak menahan request. Pesan DEBUG (misalnya prompt lengkap) tidak diformat
+  sama sekali jika level DEBUG tidak aktif.
+- Request ID: dibaca dari header REQUEST_ID_HEADER (atau dibuat baru), disimpan di
+  contextvar, ikut di setiap baris log, diteruskan ke MCP Server lewat
+  request_id_headers() dan dikembalikan di header respons.
+- Metrik: histogram gaya Prometheus untuk durasi per tahap (span()), per
+  endpoint HTTP dan jumlah token Gemini per request, tersedia di GET /metrics
+  setiap service.
+"""
+import atexit
+import bisect
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Request ID dari luar hanya dipakai jika formatnya aman untuk log
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s"
+
+_request_id = contextvars.ContextVar("request_id", default="-")
+
+# --- Request ID ---
+
+def get_request_id() -> str:
+    return _request_id.get()
+
+def set_request_id(request_id: str | None = None) -> str:
+    """Memasang request ID untuk konteks saat ini; ID dari luar yang tidak valid diganti ID baru."""
+    if not request_id or not _REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    return request_id
+
+def request_id_headers() -> dict:
+    """Header untuk meneruskan request ID saat ini ke service lain."""
+    request_id = _request_id.get()
+    return {REQUEST_ID_HEADER: request_id} if request_id != "-" else {}
+
+# --- Logging ---
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        # Dijalankan di thread pemanggil, sebelum record masuk antrean
+        record.request_id = _request_id.get()
+        return True
+
+_log_queue = queue.SimpleQueue()
+_log_listener = None
+_log_lock = threading.Lock()
+
+def _start_log_listener():
+    global _log_listener
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _log_listener = logging.handlers.QueueListener(_log_queue, stream_handler)
+    _log_listener.start()
+
+def _setup_logging():
+    root = logging.getLogger("chatbot")
+    if root.handlers:
+        return
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    queue_handler = logging.handlers.QueueHandler(_log_queue)
+    queue_handler.addFilter(_RequestIdFilter())
+    root.addHandler(queue_handler)
+    _start_log_listener()
+    # Sisa log ditulis saat proses berhenti
+    atexit.register(lambda: _log_listener.stop())
+    # Thread listener tidak ikut ter-fork ke worker baru; jalankan ulang di proses anak
+    os.register_at_fork(after_in_child=_start_log_listener)
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger per service, misalnya get_logger("backend") -> "chatbot.backend"."""
+    with _log_lock:
+        _setup_logging()
+    return logging.getLogger(f"chatbot.{name}")
+
+_span_logger = get_logger("span")
+
+# --- Metrik ---
+
+# Batas bucket histogram (detik), dari query SQLite (milidetik) sampai panggilan Gemini (detik)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = []
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in labels.items()) + "}"
+
+class Histogram:
+    """Histogram kumulatif dengan label, aman dipakai dari banyak thread."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {} # nilai label -> [jumlah per bucket (+Inf terakhir), total durasi]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        label_values = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(label_values, list(counts), total) for label_values, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(snapshot):
+            labels = dict(zip(self.labelnames, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+def render_metrics() -> str:
+    """Semua metrik dalam format teks Prometheus (exposition format 0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_DURATION = Histogram(
+    "chatbot_stage_duration_seconds",
+    "Durasi per tahap pemrosesan (intent, rag_http, sqlite, gemini, telegram, ...).",
+    ("stage", "outcome"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "chatbot_http_request_duration_seconds",
+    "Durasi request HTTP sampai header respons dikirim, per endpoint.",
+    ("method", "endpoint", "status"),
+)
+
+# Batas bucket histogram jumlah token per request Gemini
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+GEMINI_TOKENS = Histogram(
+    "chatbot_gemini_tokens",
+    "Jumlah token Gemini per request chat (input: system instruction + prompt, output: jawaban).",
+    ("direction",),
+    buckets=TOKEN_BUCKETS,
+)
+
+def observe_gemini_tokens(input_tokens: int, output_tokens: int):
+    """Mencatat jumlah token input dan output Gemini untuk satu request chat."""
+    GEMINI_TOKENS.observe(input_tokens, direction="input")
+    GEMINI_TOKENS.observe(output_tokens, direction="output")
+
+def observe_stage(stage: str, duration: float, outcome: str = "ok"):
+    """Mencatat durasi (detik) satu tahap yang diukur sendiri oleh pemanggil."""
+    STAGE_DURATION.observe(duration, stage=stage, outcome=outcome)
+    _span_logger.debug("%s %s %.1f ms", stage, outcome, duration * 1000)
+
+@contextmanager
+def span(stage: str):
+    """Mengukur durasi satu tahap; outcome="error" jika blok melempar exception."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - start, outcome)
+
+# --- Integrasi web framework ---
+
+def init_flask_app(app):
+    """Memasang request ID, metrik per endpoint dan GET /metrics pada aplikasi Flask."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _telemetry_start():
+        g.telemetry_start = time.perf_counter()
+        set_request_id(request.headers.get(REQUEST_ID_HEADER))
+
+    @app.after_request
+    def _telemetry_finish(response):
+        response.headers[REQUEST_ID_HEADER] = get_request_id()
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - g.get("telemetry_start", time.perf_counter()),
+            method=request.method, endpoint=endpoint, status=response.status_code,
+        )
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+def init_quart_app(app):
+    """Versi init_flask_app untuk Quart (hook async agar contextvar request ID tetap di task request)."""
+    from quart import Response, g, request
+
+    @app.before_request
+    async def _telemetry_start():
+        g.telemetry_start = time.perf_counter()
+        set_request_id(request.headers.get(REQUEST_ID_HEADER))
+
+    @app.after_request
+    async def _telemetry_finish(response):
+        response.headers[REQUEST_ID_HEADER] = get_request_id()
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - g.get("telemetry_start", time.perf_counter()),
+            method=request.method, endpoint=endpoint, status=response.status_code,
+        )
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    async def metrics():
+        return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,124 @@
+"""
+Cache LRU berukuran terbatas dengan TTL per entri, aman dipakai dari banyak thread.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLLRUCache:
+    def __init__(self, max_entries: int, default_ttl: float, on_remove=None):
+        """
+        on_remove: callback opsional on_remove(key, value) yang dipanggil setiap kali
+        entri keluar dari cache karena eviction, kedaluwarsa atau invalidasi
+        (dipanggil sambil memegang lock cache, jadi harus singkat dan tidak
+        memanggil balik cache ini).
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._on_remove = on_remove
+        self._entries = OrderedDict() # key -> (expires_at, value), urutan = urutan akses (LRU di depan)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self._removed(key, value)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get_or_create(self, key, factory, ttl: float | None = None):
+        """
+        Nilai untuk key dengan TTL diperpanjang, atau factory() yang langsung disimpan
+        jika key belum ada atau sudah kedaluwarsa. Pencarian dan pembuatan dilakukan
+        dalam satu lock, sehingga pemanggil bersamaan mendapat objek yang sama.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self.hits += 1
+                value = entry[1]
+            else:
+                if entry is not _MISSING:
+                    del self._entries[key]
+                    self.expirations += 1
+                    self._removed(key, entry[1])
+                self.misses += 1
+                value = factory()
+            if ttl > 0 and self.max_entries > 0:
+                self._store(key, value, ttl)
+            return value
+
+    def _store(self, key, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, (_, evicted_value) = self._entries.popitem(last=False)
+            self.evictions += 1
+            self._removed(evicted_key, evicted_value)
+
+    def delete(self, key) -> bool:
+        """Menghapus satu entri berdasarkan key (tanpa memindai cache). True jika entri ada."""
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+            if entry is _MISSING:
+                return False
+            self.invalidations += 1
+            self._removed(key, entry[1])
+            return True
+
+    def invalidate(self, predicate=None) -> int:
+        """
+        Menghapus entri yang key-nya memenuhi predicate(key), atau semua entri
+        jika predicate tidak diberikan. Mengembalikan jumlah entri yang dihapus.
+        """
+        with self._lock:
+            keys = list(self._entries) if predicate is None else [key for key in self._entries if predicate(key)]
+            for key in keys:
+                _, value = self._entries.pop(key)
+                self._removed(key, value)
+            removed = len(keys)
+            self.invalidations += removed
+            return removed
+
+    def _removed(self, key, value):
+        if self._on_remove is not None:
+            self._on_remove(key, value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }